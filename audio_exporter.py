@@ -1,7 +1,109 @@
+import json
 import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import numpy as np
 from pydub import AudioSegment
 import webbrowser
+from waveform_sidecar import build_sidecar, read_sidecar, sidecar_path_for, write_sidecar
+
+# 默认导出阶梯：名称 → (文件后缀, ffmpeg 编码参数)
+DEFAULT_LADDER = {
+    "mp3_128k": (".mp3", ["-codec:a", "libmp3lame", "-b:a", "128k"]),
+    "mp3_192k": (".mp3", ["-codec:a", "libmp3lame", "-b:a", "192k"]),
+    "mp3_320k": (".mp3", ["-codec:a", "libmp3lame", "-b:a", "320k"]),
+    "opus_96k": (".opus", ["-codec:a", "libopus", "-b:a", "96k"]),
+    "aac_160k": (".m4a", ["-codec:a", "aac", "-b:a", "160k"]),
+}
+
+# 播放器里绘制预计算波形/频谱图的脚本（普通字符串，不参与 f-string 格式化）
+_OVERVIEW_SCRIPT = """
+(function () {
+    const node = document.getElementById('sidecar');
+    const sidecar = node && node.textContent.trim() ? JSON.parse(node.textContent) : null;
+    const waveCanvas = document.getElementById('waveform');
+    const specCanvas = document.getElementById('spectrogram');
+    const player = document.getElementById('audioPlayer');
+    if (!sidecar) { waveCanvas.style.display = specCanvas.style.display = 'none'; return; }
+
+    const bytes = (b64) => Uint8Array.from(atob(b64), (c) => c.charCodeAt(0));
+    const peaks = sidecar.peaks.map((level) => ({ ...level, data: new Int8Array(bytes(level.data).buffer) }));
+    const spec = sidecar.spectrogram;
+    const specData = bytes(spec.data);
+
+    // 频谱图只需要栅格化一次：每帧一列、每个频带一行（低频在下），之后按画布大小缩放
+    const specImage = document.createElement('canvas');
+    specImage.width = spec.frames; specImage.height = spec.bands;
+    const sctx = specImage.getContext('2d');
+    const img = sctx.createImageData(spec.frames, spec.bands);
+    for (let f = 0; f < spec.frames; f++) {
+        for (let b = 0; b < spec.bands; b++) {
+            const v = specData[f * spec.bands + b] / 255;
+            const o = ((spec.bands - 1 - b) * spec.frames + f) * 4;
+            img.data[o] = 255 * Math.min(1, v * 1.8);
+            img.data[o + 1] = 255 * Math.max(0, v * 1.6 - 0.6);
+            img.data[o + 2] = 255 * Math.min(1, 0.35 + v) * (1 - v * 0.6);
+            img.data[o + 3] = 255;
+        }
+    }
+    sctx.putImageData(img, 0, 0);
+
+    function fit(canvas) {
+        const dpr = window.devicePixelRatio || 1;
+        const rect = canvas.getBoundingClientRect();
+        canvas.width = Math.max(1, Math.round(rect.width * dpr));
+        canvas.height = Math.max(1, Math.round(rect.height * dpr));
+    }
+
+    function drawWave() {
+        const ctx = waveCanvas.getContext('2d');
+        const w = waveCanvas.width, h = waveCanvas.height;
+        // 选列数不少于像素宽度的最粗一级，每个像素只合并少量列
+        let level = peaks[0];
+        for (const l of peaks) { if (l.bins >= w) level = l; }
+        ctx.clearRect(0, 0, w, h);
+        const played = sidecar.duration ? player.currentTime / sidecar.duration : 0;
+        for (let x = 0; x < w; x++) {
+            const start = Math.floor(x * level.bins / w);
+            const end = Math.max(start + 1, Math.floor((x + 1) * level.bins / w));
+            let lo = 127, hi = -127;
+            for (let i = start; i < end && i < level.bins; i++) {
+                lo = Math.min(lo, level.data[2 * i]); hi = Math.max(hi, level.data[2 * i + 1]);
+            }
+            ctx.fillStyle = x / w < played ? 'rgba(255, 115, 0, 0.9)' : 'rgba(255, 255, 255, 0.7)';
+            const top = (0.5 - hi / 254) * h, bottom = (0.5 - lo / 254) * h;
+            ctx.fillRect(x, top, 1, Math.max(1, bottom - top));
+        }
+    }
+
+    function drawSpec() {
+        const ctx = specCanvas.getContext('2d');
+        ctx.imageSmoothingEnabled = true;
+        ctx.drawImage(specImage, 0, 0, specCanvas.width, specCanvas.height);
+        const x = sidecar.duration ? player.currentTime / sidecar.duration * specCanvas.width : 0;
+        ctx.fillStyle = 'rgba(255, 255, 255, 0.9)';
+        ctx.fillRect(x, 0, 2, specCanvas.height);
+    }
+
+    function redraw() { drawWave(); drawSpec(); }
+    function resize() { fit(waveCanvas); fit(specCanvas); redraw(); }
+
+    // 点击概览图直接跳转，不需要浏览器先解码到那个位置
+    for (const canvas of [waveCanvas, specCanvas]) {
+        canvas.addEventListener('click', (e) => {
+            const rect = canvas.getBoundingClientRect();
+            player.currentTime = (e.clientX - rect.left) / rect.width * sidecar.duration;
+            redraw();
+        });
+    }
+    player.addEventListener('timeupdate', redraw);
+    window.addEventListener('resize', resize);
+    resize();
+})();
+"""
 
 class AudioExporter:
     def __init__(self, output_dir="output_audio"):
@@ -13,8 +115,8 @@ class AudioExporter:
         self._ensure_dir()
 
     def _ensure_dir(self):
-        if not self.output_dir.exists():
-            self.output_dir.mkdir(parents=True)
+        # exist_ok：批处理的多个工作进程可能同时创建同一个输出子目录
+        self.output_dir.mkdir(parents=True, exist_ok=True)
 
     def export_to_mp3(self, wav_path, bitrate="192k"):
         """
@@ -34,6 +136,180 @@ class AudioExporter:
         audio.export(str(output_path), format="mp3", bitrate=bitrate)
         return str(output_path.absolute())
 
+    def export_array_to_mp3(self, audio, samplerate, name, bitrate="192k", sidecar=True):
+        """
+        直接把流水线输出的数组编码为 MP3（不经过中间 WAV 文件）
+        PCM 数据通过管道送进 ffmpeg 的标准输入
+        :param audio: 浮点音频，shape=(通道数, 采样点数) 或 (采样点数,)
+        :param samplerate: 抽样率（Hz）
+        :param name: 输出文件名（不含后缀），生成 <name>_processed.mp3
+        :param bitrate: 比特率
+        :param sidecar: 是否同时生成播放器用的波形/频谱图 sidecar（<name>_processed.peaks.json）
+        :return: 导出的 mp3 绝对路径
+        """
+        if audio.ndim == 1:
+            audio = audio[np.newaxis, :]
+
+        mp3_path = self.export_blocks_to_mp3([audio], samplerate, audio.shape[0], name, bitrate=bitrate)
+        if sidecar:
+            self.export_sidecar(audio, samplerate, mp3_path)
+        return mp3_path
+
+    def export_sidecar(self, audio, samplerate, audio_path):
+        """为导出的音频文件生成波形峰值 + 频谱图 sidecar，放在音频文件旁边"""
+        path = write_sidecar(sidecar_path_for(audio_path), build_sidecar(audio, samplerate))
+        print(f"📈 波形/频谱 sidecar 已生成: {path}")
+        return path
+
+    def export_blocks_to_mp3(self, blocks, samplerate, num_channels, name, bitrate="192k"):
+        """
+        流式编码：逐块把音频送进 ffmpeg，上游边解码边处理时内存占用只与块大小有关
+        :param blocks: 可迭代的音频块，每块 shape=(通道数, 块长度)
+        :param num_channels: 声道数（编码器启动时就要知道）
+        :return: 导出的 mp3 绝对路径
+        """
+        print(f"正在进行 MP3 编码 (比特率 {bitrate})...")
+        output_path = self.output_dir / f"{name}_processed.mp3"
+        self._encode_with_ffmpeg(blocks, samplerate, num_channels, output_path,
+                                 ["-codec:a", "libmp3lame", "-b:a", bitrate])
+        return str(output_path.absolute())
+
+    def export_progressive(self, blocks, samplerate, num_channels, name, segment_seconds=4.0, bitrate="192k",
+                           open_browser=False):
+        """
+        渐进式导出：处理好的块直接送进同一个 ffmpeg 编码进程，由 hls 封装器切段并维护播放列表，
+        配合 AudioPipeline.process_blocks 使用时，第一段渲染完即可开始播放
+        :param open_browser: 在本机起一个静态文件服务，第一段写好时自动在浏览器打开播放器；
+                             渲染结束后服务继续运行，按回车键关闭
+        :return: 分段目录下 playlist.m3u8 的绝对路径
+        """
+        from progressive_output import ProgressiveSegmentWriter, serve_directory
+
+        segment_dir = self.output_dir / f"{name}_segments"
+        server = on_segment = None
+        if open_browser:
+            # 先起服务、拿到 URL，再创建写入器：监视线程触发回调时 URL 一定已经就绪
+            server, player_url = serve_directory(segment_dir)
+
+            def open_player(index, path):
+                if index == 0:
+                    print(f"▶️  第一段已就绪，打开播放器: {player_url}")
+                    webbrowser.open(player_url)
+            on_segment = open_player
+
+        print(f"正在渐进式导出 (每段 {segment_seconds} 秒, 比特率 {bitrate}) → {segment_dir}")
+        try:
+            with ProgressiveSegmentWriter(segment_dir, samplerate, num_channels, segment_seconds, bitrate,
+                                          on_segment=on_segment) as writer:
+                for block in blocks:
+                    writer.write(block)
+            print(f"✅ 渐进式导出完成: {len(writer.segments)} 段")
+
+            if server is not None:
+                # 播放器通过本地 HTTP 读取分段，进程退出后就无法继续播放
+                try:
+                    input(f"🎧 播放器: {player_url}，播放结束后按回车键关闭本地服务...")
+                except EOFError:
+                    pass
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        return str(writer.playlist_path.absolute())
+
+    def export_ladder(self, audio, samplerate, name, renditions=None, max_workers=None):
+        """
+        导出阶梯：同一份处理结果一次性编码成多种码率/格式
+        PCM 只交织一次，各编码器子进程共享同一块只读内存并同时运行，并发数有上限。
+        :param audio: 浮点音频，shape=(通道数, 采样点数) 或 (采样点数,)
+        :param name: 输出文件名前缀，生成 <name>_<阶梯名><后缀>
+        :param renditions: {阶梯名: (后缀, ffmpeg 编码参数)}，默认 DEFAULT_LADDER
+        :param max_workers: 同时运行的编码器进程数，默认 min(阶梯数, CPU 核数)
+        :return: {阶梯名: {"status", "path", "seconds", "bytes"}}，失败的条目带 "error"，不影响其他条目
+        """
+        if renditions is None:
+            renditions = DEFAULT_LADDER
+        if audio.ndim == 1:
+            audio = audio[np.newaxis, :]
+        max_workers = max_workers or min(len(renditions), os.cpu_count() or 1)
+
+        # (通道数, 采样点数) → 交织的 (采样点数, 通道数)，所有编码器共用
+        pcm = memoryview(np.ascontiguousarray(audio.T, dtype='<f4')).cast('B')
+
+        def encode(item):
+            rendition, (suffix, codec_args) = item
+            output_path = self.output_dir / f"{name}_{rendition}{suffix}"
+            report = {"status": "ok", "path": str(output_path.absolute())}
+            start = time.perf_counter()
+            try:
+                self._run_ffmpeg([pcm], samplerate, audio.shape[0], output_path, codec_args)
+                report["bytes"] = output_path.stat().st_size
+            except Exception as e:
+                report["status"] = "failed"
+                report["error"] = f"{type(e).__name__}: {e}"
+            report["seconds"] = round(time.perf_counter() - start, 3)
+            return rendition, report
+
+        print(f"正在导出 {len(renditions)} 种格式 (并发 {max_workers})...")
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = dict(pool.map(encode, renditions.items()))
+
+        for rendition, report in results.items():
+            mark = "✅" if report["status"] == "ok" else "❌"
+            print(f"   {mark} {rendition}: {report['seconds']}s")
+        return results
+
+    def export_ladder_from_file(self, input_path, renditions=None, max_workers=None):
+        """从已处理好的文件导出阶梯：只解码一次，再分发给各个编码器"""
+        from audio_loader import AudioHandler
+
+        audio, samplerate = AudioHandler().load(input_path)
+        return self.export_ladder(audio, samplerate, Path(input_path).stem, renditions, max_workers)
+
+    @staticmethod
+    def _interleave(block):
+        """(通道数, 采样点数) 的浮点块 → 交织的 32bit 浮点 PCM 字节 (采样点数, 通道数)"""
+        if block.ndim == 1:
+            block = block[np.newaxis, :]
+        return memoryview(np.ascontiguousarray(block.T, dtype='<f4')).cast('B')
+
+    @staticmethod
+    def _ffmpeg_command(samplerate, num_channels, output_path, codec_args):
+        """从标准输入读取交织 f32le PCM 的 ffmpeg 编码命令"""
+        return [
+            AudioSegment.converter, "-y", "-loglevel", "error",
+            "-f", "f32le", "-ar", str(samplerate), "-ac", str(num_channels), "-i", "pipe:0",
+            *codec_args, str(output_path),
+        ]
+
+    @classmethod
+    def _encode_with_ffmpeg(cls, blocks, samplerate, num_channels, output_path, codec_args):
+        """把 (通道数, 采样点数) 的浮点块以交织的 32bit 浮点 PCM 依次写进 ffmpeg 的标准输入"""
+        cls._run_ffmpeg((cls._interleave(block) for block in blocks), samplerate, num_channels, output_path,
+                        codec_args)
+
+    @classmethod
+    def _run_ffmpeg(cls, chunks, samplerate, num_channels, output_path, codec_args):
+        """启动一个 ffmpeg 编码进程，把已交织的 f32le 字节块依次写进它的标准输入"""
+        command = cls._ffmpeg_command(samplerate, num_channels, output_path, codec_args)
+        # stderr 写临时文件而不是管道，避免管道写满后 ffmpeg 阻塞
+        with tempfile.TemporaryFile() as stderr:
+            proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+            try:
+                for chunk in chunks:
+                    proc.stdin.write(chunk)
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass  # ffmpeg 提前退出，下面根据返回码报告错误
+            except BaseException:
+                proc.kill()
+                raise
+            finally:
+                proc.wait()
+            if proc.returncode != 0:
+                stderr.seek(0)
+                raise RuntimeError(f"ffmpeg 编码失败: {stderr.read().decode(errors='replace').strip()}")
+
     def regex_browser_playback(self, audio_path):
         """
         生成一个临时的 HTML 页面并在浏览器打开，
@@ -89,9 +365,15 @@ class AudioExporter:
     def generate_visualizer_html(self, audio_path):
         """
         生成一个包含实时频谱可视化的 HTML 播放器
+        音频旁边有 sidecar（见 export_sidecar）时嵌入页面：打开即显示整首歌的波形和频谱图，点击即可跳转
         """
         # 获取文件名用于标题，确保路径对浏览器友好
         filename = os.path.basename(audio_path)
+
+        sidecar_json = ""
+        if os.path.exists(sidecar_path_for(audio_path)):
+            sidecar_json = json.dumps(read_sidecar(sidecar_path_for(audio_path)), separators=(",", ":"))
+            sidecar_json = sidecar_json.replace("</", "<\\/")
         
         # HTML 模板字符串 (包含 CSS 和 JS)
         html_content = f"""
@@ -190,6 +472,15 @@ class AudioExporter:
                     border-radius: 50%;
                 }}
 
+                canvas.overview {{
+                    height: 70px;
+                    margin-bottom: 12px;
+                    cursor: pointer;
+                }}
+                canvas.overview.spectrogram {{
+                    height: 110px;
+                }}
+
                 .tip {{
                     margin-top: 15px;
                     font-size: 0.75rem;
@@ -202,13 +493,18 @@ class AudioExporter:
                 <h1>Audio DSP Result</h1>
                 <div class="file-name">{filename}</div>
                 
+                <canvas id="waveform" class="overview"></canvas>
+                <canvas id="spectrogram" class="overview spectrogram"></canvas>
                 <canvas id="visualizer"></canvas>
                 
                 <audio id="audioPlayer" src="{filename}" controls crossorigin="anonymous"></audio>
                 
-                <div class="tip">Analysis requires playback to start</div>
+                <div class="tip">Live analysis requires playback to start · click the overview to seek</div>
             </div>
 
+            <script id="sidecar" type="application/json">{sidecar_json}</script>
+            <script>{_OVERVIEW_SCRIPT}</script>
+
             <script>
                 const audio = document.getElementById('audioPlayer');
                 const canvas = document.getElementById('visualizer');
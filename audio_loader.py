@@ -1,45 +1,325 @@
 import os
+import struct
+import subprocess
+import tempfile
 from pathlib import Path
+import numpy as np
+from pedalboard.io import AudioFile
 from pydub import AudioSegment
 import time
+from abc import ABC, abstractmethod
+from effects.precision import float_dtype
+from effects.resampling import PolyphaseResampler, output_length, rate_ratio, resample_to
+from wav_reader import MemmapWavReader
+
+# Pedalboard 原生支持分块读取的格式；其余格式走 ffmpeg 管道
+PEDALBOARD_FORMATS = ('.mp3', '.flac', '.ogg', '.wav', '.aif', '.aiff')
+FFMPEG_FORMATS = ('.m4a', '.aac', '.opus', '.webm')
+SUPPORTED_FORMATS = PEDALBOARD_FORMATS + FFMPEG_FORMATS
+
+
+def segment_to_array(segment):
+    """
+    pydub AudioSegment → 浮点数组，shape=(通道数, 采样点数)，幅度范围 [-1, 1)
+    整数 PCM 只做一次类型转换 + 一次原地缩放，不经过 float64
+    """
+    width = segment.sample_width
+    # pydub 内部统一为有符号小端整数（8bit WAV 载入时已去掉 128 偏置，24bit 已扩展为 32bit）
+    pcm = np.frombuffer(segment.raw_data, dtype=f"<i{width}").reshape(-1, segment.channels)
+    audio = np.array(pcm.T, dtype=float_dtype(), order='C')
+    audio *= 1.0 / (1 << (8 * width - 1))
+    return audio
+
+
+class AudioStream(ABC):
+    """
+    分块解码的音频流：迭代得到 float32 块，shape=(通道数, 块长度)
+    解码内存只与块大小有关；下游可以在解码结束之前就开始处理。
+    用法:
+        with handler.open_stream("song.flac") as stream:
+            for block in stream: ...
+    """
+    def __init__(self, samplerate, num_channels, frames=None):
+        self.samplerate = samplerate
+        self.num_channels = num_channels
+        self.frames = frames  # 总采样点数；ffmpeg 管道事先不知道时为 None
+
+    @abstractmethod
+    def __iter__(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _PedalboardStream(AudioStream):
+    """用 Pedalboard AudioFile 的分块读取解码"""
+    def __init__(self, path, block_size):
+        self._file = AudioFile(str(path))
+        super().__init__(self._file.samplerate, self._file.num_channels, self._file.frames)
+        self.block_size = block_size
+
+    def __iter__(self):
+        while self._file.tell() < self._file.frames:
+            block = self._file.read(self.block_size)
+            if block.shape[-1] == 0:  # MP3 的总帧数是估算值，可能提前读完
+                break
+            yield np.asarray(block, dtype=float_dtype())
+
+    def close(self):
+        self._file.close()
+
+
+class _ArrayStream(AudioStream):
+    """把已经解码好的数组（如解码缓存里内存映射的 PCM）按块切出来"""
+    def __init__(self, audio, samplerate, block_size):
+        super().__init__(samplerate, audio.shape[0], audio.shape[-1])
+        self._audio = audio
+        self.block_size = block_size
+
+    def __iter__(self):
+        for start in range(0, self.frames, self.block_size):
+            # 复制出一个块：只读的内存映射不会被下游原地修改
+            yield np.array(self._audio[:, start:start + self.block_size], dtype=float_dtype())
+
+
+class _FFmpegStream(AudioStream):
+    """
+    ffmpeg 把任意格式解码成 32bit 浮点 WAV 写到标准输出，这里边读边切块
+    声道数/抽样率从流开头的 WAV 头里解析（不依赖 ffprobe）
+    """
+    def __init__(self, path, block_size):
+        command = [AudioSegment.converter, "-loglevel", "error", "-i", str(path),
+                   "-vn", "-acodec", "pcm_f32le", "-f", "wav", "pipe:1"]
+        # stderr 写临时文件而不是管道，避免管道写满后 ffmpeg 阻塞
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self._proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=self._stderr)
+        except OSError as e:
+            self._stderr.close()
+            raise RuntimeError(f"ffmpeg 解码失败: 无法启动 {AudioSegment.converter} ({e})")
+        samplerate, num_channels = self._read_header()
+        super().__init__(samplerate, num_channels)
+        self.block_size = block_size
+
+    def _read_exact(self, size):
+        data = self._proc.stdout.read(size)
+        if len(data) < size:
+            self._raise_if_failed()
+        return data
+
+    def _read_header(self):
+        """跳过 RIFF 头，解析 fmt 块，停在 data 块的开头"""
+        if self._read_exact(12)[:4] != b"RIFF":
+            self._raise_if_failed()
+            raise RuntimeError("ffmpeg 输出不是 WAV 流")
+        samplerate = num_channels = None
+        while True:
+            chunk_id, chunk_size = struct.unpack("<4sI", self._read_exact(8))
+            if chunk_id == b"data":
+                if num_channels is None:
+                    raise RuntimeError("ffmpeg 输出缺少 fmt 块")
+                return samplerate, num_channels
+            body = self._read_exact(chunk_size + chunk_size % 2)
+            if chunk_id == b"fmt ":
+                num_channels, samplerate = struct.unpack("<HI", body[2:8])
+
+    def _raise_if_failed(self):
+        if self._proc.poll() is None:
+            self._proc.wait()
+        if self._proc.returncode:
+            self._stderr.seek(0)
+            message = self._stderr.read().decode(errors="replace").strip()
+            raise RuntimeError(f"ffmpeg 解码失败: {message}")
+
+    def __iter__(self):
+        frame_bytes = 4 * self.num_channels
+        while True:
+            data = self._proc.stdout.read(self.block_size * frame_bytes)
+            usable = len(data) - len(data) % frame_bytes
+            if usable:
+                interleaved = np.frombuffer(data[:usable], dtype="<f4").reshape(-1, self.num_channels)
+                yield np.array(interleaved.T, dtype=float_dtype(), order='C')
+            if len(data) < self.block_size * frame_bytes:
+                break
+        self._raise_if_failed()
+
+    def close(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.stdout.close()
+        self._proc.wait()
+        self._stderr.close()
+
+
+class _ResampledStream(AudioStream):
+    """包在另一个流外面，逐块重采样到目标抽样率（多相滤波器的状态跨块保留）"""
+    def __init__(self, stream, samplerate, quality="default"):
+        up, down = rate_ratio(stream.samplerate, samplerate)
+        frames = None if stream.frames is None else output_length(stream.frames, up, down)
+        super().__init__(samplerate, stream.num_channels, frames)
+        self._stream = stream
+        self._resampler = PolyphaseResampler(up, down, quality)
+
+    def __iter__(self):
+        for block in self._stream:
+            out = self._resampler.process(block)
+            if out.shape[-1]:
+                yield out
+        tail = self._resampler.flush()
+        if tail is not None:
+            yield tail
+
+    def close(self):
+        self._stream.close()
+
 
 class AudioHandler:
-    def __init__(self, temp_dir="temp_audio"):
+    def __init__(self, temp_dir="temp_audio", decode_cache=None, target_samplerate=None,
+                 resample_quality="default"):
         """
         初始化音频处理器
-        :param temp_dir: 用于存放转换后的临时 WAV 文件的目录
+        :param temp_dir: 用于存放转换后的临时 WAV 文件的目录（只有调试用的 convert_mp3_to_wav 会用到）
+        :param decode_cache: 可选的 DecodeCache；同一源文件再次载入时直接内存映射缓存的 PCM，跳过 ffmpeg
+        :param target_samplerate: 可选的会话抽样率；解码结果与之不同时用多相重采样器转换
+                                  （解码缓存保存的仍是原始抽样率的 PCM）
+        :param resample_quality: 重采样质量档位，见 effects.resampling.QUALITY
         """
         self.temp_dir = Path(temp_dir)
-        self._ensure_dir()
+        self.decode_cache = decode_cache
+        self.target_samplerate = target_samplerate
+        self.resample_quality = resample_quality
+
+    def _needs_resample(self, samplerate):
+        return self.target_samplerate is not None and int(samplerate) != int(self.target_samplerate)
+
+    def _resample_stream(self, stream):
+        if not self._needs_resample(stream.samplerate):
+            return stream
+        print(f"   重采样: {stream.samplerate} Hz → {self.target_samplerate} Hz")
+        return _ResampledStream(stream, self.target_samplerate, self.resample_quality)
+
+    def _resample_array(self, audio, samplerate):
+        if not self._needs_resample(samplerate):
+            return audio, samplerate
+        print(f"   重采样: {samplerate} Hz → {self.target_samplerate} Hz")
+        return resample_to(audio, samplerate, self.target_samplerate, self.resample_quality), self.target_samplerate
 
     def _ensure_dir(self):
         """确保临时目录存在"""
         if not self.temp_dir.exists():
             self.temp_dir.mkdir(parents=True)
 
+    @staticmethod
+    def _check_input(input_path):
+        """
+        基础校验：文件必须存在；扩展名不在 SUPPORTED_FORMATS 里只警告，照样交给 ffmpeg 解码
+        （ffmpeg 能读的格式远不止这些，真正解码失败时再报错）
+        """
+        input_path = Path(input_path)
+        if not input_path.exists():
+            raise FileNotFoundError(f"找不到文件: {input_path}")
+        if input_path.suffix.lower() not in SUPPORTED_FORMATS:
+            print(f"警告: 未识别的音频格式 {input_path.name}，尝试用 ffmpeg 解码...")
+        return input_path
+
+    def open_stream(self, input_path, block_size=65536):
+        """
+        打开分块解码流：MP3/FLAC/OGG/WAV/AIFF 用 Pedalboard 分块读取，其余格式（包括未识别的扩展名）走 ffmpeg 管道
+        :param block_size: 每块的采样点数
+        :return: AudioStream（上下文管理器，迭代得到 float32 块）
+        """
+        input_path = self._check_input(input_path)
+
+        if self.decode_cache is not None:
+            cached = self.decode_cache.load(self.decode_cache.make_key(input_path))
+            if cached is not None:
+                print(f"⚡ 命中解码缓存: {input_path.name}")
+                return self._resample_stream(_ArrayStream(*cached, block_size))
+
+        print(f"正在流式解码: {input_path.name} (块大小 {block_size})")
+
+        if input_path.suffix.lower() in PEDALBOARD_FORMATS:
+            try:
+                return self._resample_stream(_PedalboardStream(input_path, block_size))
+            except Exception as e:
+                print(f"   Pedalboard 无法读取 ({e})，改用 ffmpeg 解码")
+        return self._resample_stream(_FFmpegStream(input_path, block_size))
+
+    def open_wav(self, input_path):
+        """
+        以内存映射方式打开 WAV（包括 convert_mp3_to_wav 生成的文件），可以随机读取任意时间窗口
+        而不载入整个文件，如 handler.open_wav(path).read_seconds(3600, 3630)
+        :return: MemmapWavReader
+        """
+        input_path = self._check_input(input_path)
+        if input_path.suffix.lower() != '.wav':
+            raise ValueError(f"只有 WAV 文件可以内存映射: {input_path.name}")
+        return MemmapWavReader(input_path)
+
+    def iter_blocks(self, input_path, block_size=65536):
+        """
+        逐块产出 float32 音频块的生成器（不关心抽样率时的简便写法）
+        """
+        with self.open_stream(input_path, block_size) as stream:
+            yield from stream
+
+    def load(self, input_path):
+        """
+        解码音频文件，直接返回内存中的浮点数组（不写临时 WAV）
+
+        :param input_path: 输入文件的路径 (str 或 Path)
+        :return: (audio, samplerate)，audio 为 float32 数组，shape=(通道数, 采样点数)；
+                 命中解码缓存（且不需要重采样）时 audio 是只读的内存映射
+        """
+        input_path = self._check_input(input_path)
+
+        key = None
+        if self.decode_cache is not None:
+            key = self.decode_cache.make_key(input_path)
+            cached = self.decode_cache.load(key)
+            if cached is not None:
+                print(f"⚡ 命中解码缓存: {input_path.name}")
+                return self._resample_array(*cached)
+
+        print(f"正在解码: {input_path.name} ...")
+
+        try:
+            # Pydub 调用 ffmpeg 解码，PCM 数据直接在内存里转换成数组
+            segment = AudioSegment.from_file(str(input_path))
+        except Exception as e:
+            raise RuntimeError(f"音频解码失败: {str(e)}")
+
+        audio = segment_to_array(segment)
+        if key is not None:
+            self.decode_cache.save(key, audio, segment.frame_rate)
+        return self._resample_array(audio, segment.frame_rate)
+
     def convert_mp3_to_wav(self, input_path):
         """
         接收 MP3 文件路径，将其转换为 WAV 格式
+        （调试模式使用：需要检查中间 WAV 时才走这条落盘路径，正常流程用 load）
         
         :param input_path: 输入文件的路径 (str 或 Path)
         :return: 转换后的 wav 文件绝对路径 (str)
         """
-        input_path = Path(input_path)
-        
         # 1. 基础校验
-        if not input_path.exists():
-            raise FileNotFoundError(f"找不到文件: {input_path}")
-        
-        if input_path.suffix.lower() != '.mp3':
-            # 可以在这里扩展支持其他格式，目前仅针对需求
-            print(f"警告: 输入文件 {input_path.name} 可能不是 MP3，尝试强制读取...")
+        input_path = self._check_input(input_path)
 
         print(f"正在处理: {input_path.name} ...")
 
+        self._ensure_dir()
+
         try:
             # 2. 使用 pydub 加载音频
             # Pydub 会调用底层的 ffmpeg 进行解码
-            audio = AudioSegment.from_mp3(str(input_path))
+            audio = AudioSegment.from_file(str(input_path))
             
             # 3. 准备输出路径
             # 使用时间戳防止文件名冲突 (为未来 Web 多用户并发做准备)
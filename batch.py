@@ -0,0 +1,237 @@
+"""
+批处理入口：把同一条效果链并行地应用到大量输入文件上
+
+用法示例:
+    python batch.py "songs/*.mp3" "more/**/*.mp3" --jobs 8
+    python batch.py --manifest todo.txt --output-dir output_audio --summary summary.json
+
+每个文件独立走一遍 解码 → 流水线 → MP3 编码，
+文件之间互不依赖，所以用进程池铺满所有 CPU 核。
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from audio_loader import AudioHandler
+from audio_exporter import AudioExporter
+from decode_cache import DecodeCache
+from pipeline import AudioPipeline
+from effects import ir_library
+from effects.channel_scheduler import set_max_workers
+
+
+def collect_inputs(patterns=None, manifest=None):
+    """
+    展开 glob 模式 + 读取清单文件，返回去重后的输入文件列表（保持出现顺序）
+    :param patterns: glob 模式列表，支持 ** 递归
+    :param manifest: 清单文件路径，每行一个文件路径，# 开头为注释
+    """
+    paths = []
+    for pattern in patterns or []:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches and os.path.exists(pattern):
+            matches = [pattern]
+        if not matches:
+            print(f"⚠️  没有匹配的文件: {pattern}")
+        paths.extend(matches)
+
+    if manifest is not None:
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    paths.append(line)
+
+    seen = set()
+    unique = []
+    for path in paths:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+
+def plan_output_dirs(inputs, output_dir):
+    """
+    每个输入文件的输出目录：在 output_dir 下镜像输入文件相对于所有输入的公共目录的子目录，
+    a/song.mp3 与 b/song.mp3 分别输出到 <output_dir>/a/ 与 <output_dir>/b/，不会互相覆盖。
+    同一目录下仍然同名的输出（如 song.mp3 与 song.flac）在开始处理前直接报错。
+    :return: 与 inputs 一一对应的输出目录列表
+    :raises ValueError: 存在会写到同一路径的输入
+    """
+    if not inputs:
+        return []
+    parents = [os.path.dirname(os.path.abspath(path)) for path in inputs]
+    common = os.path.commonpath(parents)
+    dirs = [Path(output_dir) / os.path.relpath(parent, common) for parent in parents]
+
+    owners = {}
+    conflicts = []
+    for path, out_dir in zip(inputs, dirs):
+        # 按不区分大小写比较，大小写不敏感的文件系统上同样会冲突
+        key = (os.path.normcase(str(out_dir)).casefold(), Path(path).stem.casefold())
+        if key in owners:
+            conflicts.append(f"{owners[key]} 与 {path}")
+        else:
+            owners[key] = path
+    if conflicts:
+        raise ValueError("以下输入会写到同一个输出文件: " + "; ".join(conflicts))
+    return dirs
+
+
+def init_worker(channel_workers, ir_cache_dir=None):
+    """工作进程初始化：声道线程数 + IR 频谱磁盘缓存（各进程内存映射同一份频谱文件）"""
+    set_max_workers(channel_workers)
+    if ir_cache_dir:
+        ir_library.set_cache_dir(ir_cache_dir)
+
+
+def process_one(index, input_path, temp_dir, output_dir, bitrate="192k", block_size=None,
+                keep_temp_files=False, decode_cache_dir=None, target_samplerate=None):
+    """
+    工作进程中执行的单个任务：解码 → 效果链 → 导出 MP3（默认全程在内存中，不写临时 WAV）
+    效果链在进程内构建（效果器带有内部状态，不在进程之间共享）。
+    异常不会抛出，而是记录在返回的摘要里，避免一个坏文件拖垮整个批次。
+    """
+    from main import build_clean_chain, build_style_chain, render_to_mp3
+
+    start = time.perf_counter()
+    summary = {"index": index, "input": str(input_path), "status": "ok"}
+    try:
+        # 每个任务使用独立的临时子目录，避免同名文件在同一秒内互相覆盖
+        decode_cache = DecodeCache(decode_cache_dir) if decode_cache_dir else None
+        loader = AudioHandler(temp_dir=Path(temp_dir) / f"job_{index:05d}", decode_cache=decode_cache,
+                              target_samplerate=target_samplerate)
+        exporter = AudioExporter(output_dir=output_dir)
+        pipeline = AudioPipeline()
+
+        summary["output"] = render_to_mp3(
+            input_path, loader, exporter, pipeline,
+            pre_processors=build_clean_chain(),
+            main_effects=build_style_chain(),
+            bitrate=bitrate,
+            block_size=block_size,
+            keep_temp_files=keep_temp_files,
+        )
+    except Exception as e:
+        summary["status"] = "failed"
+        summary["error"] = f"{type(e).__name__}: {e}"
+        summary["traceback"] = traceback.format_exc()
+
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def run_batch(inputs, jobs=None, temp_dir="temp_audio", output_dir="output_audio",
+              bitrate="192k", block_size=None, keep_temp_files=False, decode_cache_dir=None,
+              ir_cache_dir=None, target_samplerate=None):
+    """
+    用进程池并行处理所有输入文件
+    :param jobs: 并行进程数，默认等于 CPU 核数
+    :param ir_cache_dir: IR 频谱缓存目录，卷积混响的 IR 频谱只在第一个进程里计算一次
+    :param target_samplerate: 统一的输出抽样率（默认保留每个文件的原抽样率）
+    :return: 按输入顺序排列的逐文件摘要列表
+    :raises ValueError: 有输入会写到同一个输出文件（见 plan_output_dirs）
+    """
+    # 先确定每个文件的输出目录：同名冲突在启动进程池之前就报错
+    output_dirs = plan_output_dirs(inputs, output_dir)
+    jobs = jobs or os.cpu_count() or 1
+    print(f"📦 批处理 {len(inputs)} 个文件，并行进程数 {jobs}")
+
+    # 进程间已经铺满 CPU，每个进程内的声道线程数相应缩小，避免超额订阅
+    channel_workers = max(1, (os.cpu_count() or 1) // jobs)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(channel_workers, ir_cache_dir)) as pool:
+        futures = [
+            pool.submit(process_one, i, path, temp_dir, job_output_dir, bitrate, block_size, keep_temp_files,
+                        decode_cache_dir, target_samplerate)
+            for i, (path, job_output_dir) in enumerate(zip(inputs, output_dirs))
+        ]
+        for future in as_completed(futures):
+            summary = future.result()
+            mark = "✅" if summary["status"] == "ok" else "❌"
+            print(f"   {mark} [{summary['index'] + 1}/{len(inputs)}] {summary['input']} ({summary['seconds']}s)")
+            results.append(summary)
+
+    results.sort(key=lambda s: s["index"])
+    return results
+
+
+def write_summary(results, summary_path):
+    """把逐文件摘要写成 JSON，并打印汇总"""
+    failed = [r for r in results if r["status"] != "ok"]
+    report = {
+        "total": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "files": results,
+    }
+    summary_path = Path(summary_path)
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"📋 成功 {report['succeeded']} / 失败 {report['failed']}，摘要: {summary_path}")
+    for r in failed:
+        print(f"   ❌ {r['input']}: {r['error']}")
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量音频风格化处理")
+    parser.add_argument("inputs", nargs="*", help="输入文件或 glob 模式（如 'songs/**/*.mp3'）")
+    parser.add_argument("--manifest", help="清单文件，每行一个输入路径")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="并行进程数（默认 CPU 核数）")
+    parser.add_argument("--temp-dir", default="temp_audio", help="临时 WAV 目录（仅 --keep-temp 时使用）")
+    parser.add_argument("--keep-temp", action="store_true", help="调试用：保留解码后/处理后的中间 WAV 文件")
+    parser.add_argument("--decode-cache", default=None,
+                        help="解码缓存目录；同一源文件再次出现时内存映射缓存的 PCM，跳过 ffmpeg 解码")
+    parser.add_argument("--ir-cache", default=None,
+                        help="IR 频谱缓存目录；工作进程之间共享卷积混响的 IR 频谱")
+    parser.add_argument("--output-dir", default="output_audio", help="MP3 输出目录")
+    parser.add_argument("--samplerate", type=int, default=None,
+                        help="统一重采样到该抽样率（多相重采样，默认保留原抽样率）")
+    parser.add_argument("--bitrate", default="192k", help="MP3 比特率")
+    parser.add_argument("--block-size", type=int, default=None, help="流式处理块大小（默认整段处理）")
+    parser.add_argument("--summary", default=None, help="摘要 JSON 路径（默认 <output-dir>/batch_summary.json）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    inputs = collect_inputs(args.inputs, args.manifest)
+    if not inputs:
+        print("没有需要处理的文件。")
+        return 1
+
+    try:
+        results = run_batch(
+            inputs,
+            jobs=args.jobs,
+            temp_dir=args.temp_dir,
+            output_dir=args.output_dir,
+            bitrate=args.bitrate,
+            block_size=args.block_size,
+            keep_temp_files=args.keep_temp,
+            decode_cache_dir=args.decode_cache,
+            ir_cache_dir=args.ir_cache,
+            target_samplerate=args.samplerate,
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    summary_path = args.summary or os.path.join(args.output_dir, "batch_summary.json")
+    report = write_summary(results, summary_path)
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
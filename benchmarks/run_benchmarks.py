@@ -0,0 +1,327 @@
+"""
+基准测试：在不同时长 / 抽样率 / 声道数的合成信号上测量每个效果器、整条流水线和编解码往返
+
+用法（在项目根目录执行）:
+    python -m benchmarks.run_benchmarks                          # 默认快速档
+    python -m benchmarks.run_benchmarks --durations 1 10 60 --channels 1 2 6
+    python -m benchmarks.run_benchmarks --save-baseline          # 结果另存为基线
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/baseline.json
+
+每个用例报告中位耗时、每秒处理的采样点数、峰值内存，
+并按时长拟合 耗时/内存 的增长指数（≈1 为线性，≈2 说明出现了平方复杂度）。
+与基线比较时，中位耗时变慢超过阈值的用例会被标记为回归，进程返回码为 1。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from effects.tape import TapeStyle
+from effects.vinyl import VinylStyle
+from effects.radio import RadioStyle
+from effects.normalizer import Normalizer
+from effects.pcm import PCMBitcrusherStyle
+from effects.doppler import DopplerEffect
+from effects.enhanced_am import EnhancedAMEffect
+from effects.fsk import FSKEffect
+from effects.convolution_reverb import ConvolutionReverb
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# 效果器用例：名称 → 构造函数（每次测量都新建实例，避免状态串扰）
+EFFECT_CASES = {
+    "TapeStyle": TapeStyle,
+    "VinylStyle": VinylStyle,
+    "RadioStyle": RadioStyle,
+    "Normalizer": Normalizer,
+    "PCMBitcrusherStyle": PCMBitcrusherStyle,
+    "DopplerEffect": DopplerEffect,
+    "EnhancedAMEffect(standard)": EnhancedAMEffect,
+    "FSKEffect": FSKEffect,
+    "ConvolutionReverb(spring)": lambda: ConvolutionReverb("spring"),
+    "ConvolutionReverb(old_radio)": lambda: ConvolutionReverb("old_radio"),
+}
+
+
+def _fsk_modulate_case(audio, samplerate):
+    """热点：FSK 调制（比特切分 + CPFSK 相位累加）"""
+    effect = FSKEffect()
+    bits, bit_lengths = effect._audio_to_bits(audio[0], samplerate)
+    return effect._fsk_modulate(bits, bit_lengths, samplerate)
+
+
+def _carrier_recovery_case(audio, samplerate):
+    """热点：DSB-SC 载波恢复（平方律 + FFT 谱线搜索 + 分段相关）"""
+    effect = EnhancedAMEffect(am_mode="dsb-sc")
+    effect.sample_rate = samplerate
+    modulated = effect._am_modulate(effect._preprocess_audio(audio[0]))
+    return effect._carrier_recovery(modulated)
+
+
+# 热点函数用例：名称 → 函数 (audio, samplerate)
+HOT_PATH_CASES = {
+    "FSKEffect._fsk_modulate": _fsk_modulate_case,
+    "EnhancedAMEffect._carrier_recovery": _carrier_recovery_case,
+}
+
+
+def make_signal(kind, duration, samplerate, channels, seed=0):
+    """
+    生成合成测试信号，shape=(声道数, 采样点数)，float32
+    :param kind: 'sine'（各声道不同频率的正弦）/ 'noise'（高斯白噪声）/ 'silence'（全零）
+    """
+    frames = int(duration * samplerate)
+    if kind == "silence":
+        return np.zeros((channels, frames), dtype=np.float32)
+    if kind == "noise":
+        rng = np.random.default_rng(seed)
+        return (0.3 * rng.standard_normal((channels, frames))).astype(np.float32)
+    if kind == "sine":
+        t = np.arange(frames) / samplerate
+        freqs = 220.0 * (1 + np.arange(channels))[:, np.newaxis]
+        return (0.5 * np.sin(2 * np.pi * freqs * t)).astype(np.float32)
+    raise ValueError(f"未知信号类型: {kind}")
+
+
+def measure(func, repeats):
+    """
+    先跑 repeats 次计时（取中位数），再单独跑一次统计峰值内存，
+    避免 tracemalloc 的开销污染计时结果；被测代码的控制台输出被屏蔽
+    """
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"median_s": statistics.median(timings), "min_s": min(timings), "peak_bytes": peak}
+
+
+def _ffmpeg_available():
+    # pydub 解码 MP3 时还需要 ffprobe 读取流信息
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def _write_wav(path, audio, samplerate):
+    from pedalboard.io import AudioFile
+    with AudioFile(str(path), "w", samplerate, audio.shape[0]) as f:
+        f.write(audio)
+
+
+def _pipeline_case(audio, samplerate, workdir):
+    """整条流水线：写临时 WAV → main.build_style_chain() → 输出 WAV"""
+    from main import build_clean_chain, build_style_chain
+    from pipeline import AudioPipeline
+
+    input_path = Path(workdir) / "bench_in.wav"
+    output_path = Path(workdir) / "bench_out.wav"
+    _write_wav(input_path, audio, samplerate)
+    pipeline = AudioPipeline()
+    return lambda: pipeline.run(str(input_path), str(output_path),
+                                pre_processors=build_clean_chain(), main_effects=build_style_chain())
+
+
+def _roundtrip_case(audio, samplerate, workdir):
+    """编解码往返：MP3 → AudioHandler 内存解码 → AudioExporter 编码（不经过临时 WAV）"""
+    from pydub import AudioSegment
+    from audio_loader import AudioHandler
+    from audio_exporter import AudioExporter
+
+    wav_path = Path(workdir) / "bench_src.wav"
+    mp3_path = Path(workdir) / "bench_src.mp3"
+    _write_wav(wav_path, audio, samplerate)
+    AudioSegment.from_wav(str(wav_path)).export(str(mp3_path), format="mp3")
+    loader = AudioHandler(temp_dir=Path(workdir) / "temp")
+    exporter = AudioExporter(output_dir=Path(workdir) / "out")
+    return lambda: exporter.export_array_to_mp3(*loader.load(mp3_path), name="bench_src")
+
+
+def run_suite(durations, samplerates, channel_counts, kinds, repeats=3, only=None,
+              include_pipeline=True, include_roundtrip=True):
+    """
+    执行所有用例，返回结果列表
+    :param only: 只运行名称中包含这些子串的用例
+    """
+    def selected(name):
+        return not only or any(pattern in name for pattern in only)
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix="audio_bench_")
+    try:
+        for samplerate in samplerates:
+            for channels in channel_counts:
+                for kind in kinds:
+                    for duration in durations:
+                        audio = make_signal(kind, duration, samplerate, channels)
+                        frames = audio.shape[1]
+                        cases = []
+                        for name, factory in EFFECT_CASES.items():
+                            cases.append((f"effect/{name}",
+                                          lambda f=factory: f().process(audio, samplerate)))
+                        for name, func in HOT_PATH_CASES.items():
+                            cases.append((f"hot/{name}", lambda f=func: f(audio, samplerate)))
+                        if include_pipeline and selected("pipeline/main.build_style_chain"):
+                            cases.append(("pipeline/main.build_style_chain",
+                                          _pipeline_case(audio, samplerate, workdir)))
+                        if include_roundtrip and selected("io/mp3_roundtrip") and _ffmpeg_available():
+                            cases.append(("io/mp3_roundtrip", _roundtrip_case(audio, samplerate, workdir)))
+
+                        for name, func in cases:
+                            if not selected(name):
+                                continue
+                            stats = measure(func, repeats)
+                            result = {
+                                "case": name,
+                                "signal": kind,
+                                "duration_s": duration,
+                                "samplerate": samplerate,
+                                "channels": channels,
+                                "frames": frames,
+                                **stats,
+                                "samples_per_s": frames / stats["median_s"] if stats["median_s"] > 0 else None,
+                                "realtime_factor": duration / stats["median_s"] if stats["median_s"] > 0 else None,
+                            }
+                            results.append(result)
+                            print(f"   {name:<42} {kind:<7} {duration:>6}s {samplerate:>6}Hz {channels}ch  "
+                                  f"{stats['median_s']:>8.4f}s  {result['samples_per_s'] or 0:>12.0f} 采样点/s  "
+                                  f"峰值 {stats['peak_bytes'] / 1024 ** 2:>8.1f}MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _case_key(r):
+    return (r["case"], r["signal"], r["duration_s"], r["samplerate"], r["channels"])
+
+
+def scaling_report(results):
+    """
+    按 (用例, 信号, 抽样率, 声道数) 分组，用对数线性拟合估计 耗时/内存 随时长的增长指数
+    """
+    groups = {}
+    for r in results:
+        groups.setdefault((r["case"], r["signal"], r["samplerate"], r["channels"]), []).append(r)
+
+    report = []
+    for (case, kind, samplerate, channels), rows in groups.items():
+        rows = sorted(rows, key=lambda r: r["frames"])
+        if len(rows) < 2:
+            continue
+        log_n = np.log([r["frames"] for r in rows])
+        entry = {"case": case, "signal": kind, "samplerate": samplerate, "channels": channels}
+        for metric, field in (("time_exponent", "median_s"), ("memory_exponent", "peak_bytes")):
+            values = [max(r[field], 1e-12) for r in rows]
+            entry[metric] = float(np.polyfit(log_n, np.log(values), 1)[0])
+        entry["bytes_per_sample"] = rows[-1]["peak_bytes"] / (rows[-1]["frames"] * channels)
+        report.append(entry)
+    return report
+
+
+def compare(results, baseline, threshold=1.25):
+    """
+    与基线比较中位耗时；变慢超过 threshold 倍的用例视为回归
+    :return: 回归用例列表
+    """
+    baseline_index = {_case_key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        base = baseline_index.get(_case_key(r))
+        if base is None or base["median_s"] <= 0:
+            continue
+        ratio = r["median_s"] / base["median_s"]
+        if ratio > threshold:
+            regressions.append({"key": list(_case_key(r)), "baseline_s": base["median_s"],
+                                "current_s": r["median_s"], "ratio": ratio})
+    return regressions
+
+
+def save_results(results, scaling, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+        "scaling": scaling,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="音频效果器基准测试")
+    parser.add_argument("--durations", type=float, nargs="+", default=[1.0, 4.0], help="信号时长（秒）")
+    parser.add_argument("--samplerates", type=int, nargs="+", default=[44100], help="抽样率")
+    parser.add_argument("--channels", type=int, nargs="+", default=[1, 2], help="声道数")
+    parser.add_argument("--signals", nargs="+", default=["sine", "noise", "silence"],
+                        choices=["sine", "noise", "silence"], help="信号类型")
+    parser.add_argument("--repeats", type=int, default=3, help="每个用例的计时次数（取中位数）")
+    parser.add_argument("--only", nargs="+", default=None, help="只运行名称包含这些子串的用例")
+    parser.add_argument("--no-pipeline", action="store_true", help="跳过整条流水线用例")
+    parser.add_argument("--no-roundtrip", action="store_true", help="跳过 MP3 编解码往返用例")
+    parser.add_argument("--output", default=None, help="结果 JSON 路径（默认 benchmarks/results/<时间戳>.json）")
+    parser.add_argument("--save-baseline", action="store_true", help="同时把结果保存为 benchmarks/results/baseline.json")
+    parser.add_argument("--compare", default=None, help="与指定的基线 JSON 比较")
+    parser.add_argument("--threshold", type=float, default=1.25, help="判定为回归的变慢倍数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("⏱️  开始基准测试")
+    results = run_suite(args.durations, args.samplerates, args.channels, args.signals,
+                        repeats=args.repeats, only=args.only,
+                        include_pipeline=not args.no_pipeline,
+                        include_roundtrip=not args.no_roundtrip)
+    scaling = scaling_report(results)
+    for entry in scaling:
+        if entry["time_exponent"] > 1.5:
+            print(f"   ⚠️  {entry['case']} ({entry['signal']}, {entry['channels']}ch) "
+                  f"耗时增长指数 {entry['time_exponent']:.2f}，接近平方复杂度")
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}.json"
+    print(f"💾 结果已保存: {save_results(results, scaling, output)}")
+    if args.save_baseline:
+        print(f"💾 基线已更新: {save_results(results, scaling, RESULTS_DIR / 'baseline.json')}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ 发现 {len(regressions)} 个性能回归 (阈值 {args.threshold}x):")
+            for reg in regressions:
+                print(f"   {' / '.join(map(str, reg['key']))}: "
+                      f"{reg['baseline_s']:.4f}s → {reg['current_s']:.4f}s ({reg['ratio']:.2f}x)")
+            return 1
+        print("✅ 没有发现性能回归")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
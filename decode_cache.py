@@ -0,0 +1,55 @@
+"""
+解码缓存：同一个源文件只用 ffmpeg 解码一次
+
+键 = 源文件内容哈希（与文件名、修改时间无关，改名/复制后仍能命中）。
+PCM 以 float32 .npy 存盘（MP3/16bit/24bit 整数样本转 float32 没有精度损失），
+命中时用内存映射读取，不需要解码，也不需要一次性载入内存。
+总大小超过上限时按最近使用时间淘汰。
+"""
+import json
+
+import numpy as np
+
+from disk_cache import DiskLRUCache, hash_file
+
+
+class DecodeCache(DiskLRUCache):
+    def __init__(self, cache_dir="decode_cache", max_bytes=8 * 1024 ** 3):
+        super().__init__(cache_dir, max_bytes, suffix=".npy")
+
+    @staticmethod
+    def make_key(input_path):
+        return hash_file(input_path)
+
+    def _meta_path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def load(self, key):
+        """
+        命中时返回 (内存映射的只读数组, 抽样率)，shape=(通道数, 采样点数)；未命中返回 None
+        """
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                samplerate = json.load(f)["samplerate"]
+        except FileNotFoundError:  # 元数据缺失（被并发淘汰），当作未命中
+            return None
+        return np.load(path, mmap_mode='r'), samplerate
+
+    def save(self, key, audio, samplerate):
+        """保存解码结果；元数据先写，保证 .npy 可见时抽样率一定可读"""
+        with open(self._meta_path(key), "w", encoding="utf-8") as f:
+            json.dump({"samplerate": samplerate, "shape": list(audio.shape)}, f)
+        return self.put_array(key, np.asarray(audio, dtype=np.float32))
+
+    def evict(self):
+        """淘汰 .npy 后顺带删除没有对应数据的元数据文件"""
+        super().evict()
+        for meta in self.cache_dir.glob("*.json"):
+            if not meta.with_suffix(self.suffix).exists():
+                try:
+                    meta.unlink()
+                except FileNotFoundError:
+                    pass
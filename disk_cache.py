@@ -0,0 +1,152 @@
+"""
+磁盘缓存工具：内容哈希 + 效果链指纹 + 按总大小做 LRU 淘汰
+
+RenderCache 包在 AudioPipeline.run 外面：
+键 = 输入音频内容哈希 + 每个效果器的类名与参数，命中时直接复制缓存的成品，不做任何 DSP 计算。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """分块计算文件内容的 SHA-256（大文件也不会一次性读入内存）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _to_jsonable(value):
+    """把参数值转换成可稳定序列化的形式（numpy 标量/数组、元组等）"""
+    if isinstance(value, np.ndarray):
+        return {"ndarray_sha256": hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def effect_fingerprint(effect):
+    """效果器指纹：完整类名 + cache_params()"""
+    cls = type(effect)
+    return {
+        "class": f"{cls.__module__}.{cls.__qualname__}",
+        "params": _to_jsonable(effect.cache_params()),
+    }
+
+
+def hash_payload(payload):
+    """对任意可 JSON 化的结构求稳定哈希"""
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DiskLRUCache:
+    """
+    以文件为单位的磁盘缓存，总大小超过上限时按最近使用时间 (mtime) 淘汰
+    命中时刷新 mtime，因此 mtime 即"最近一次使用"的时间。
+    """
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, suffix=""):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key):
+        return self.cache_dir / f"{key}{self.suffix}"
+
+    def get(self, key):
+        """命中返回缓存文件路径（并刷新其使用时间），未命中返回 None"""
+        path = self.path_for(key)
+        if not path.exists():
+            return None
+        os.utime(path, None)
+        return path
+
+    def put_file(self, key, src_path):
+        """把 src_path 复制进缓存（先写临时文件再原子替换，避免并发进程读到半个文件）"""
+        path = self.path_for(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+        return path
+
+    def put_array(self, key, array):
+        """把 numpy 数组以 .npy 格式存入缓存（同样先写临时文件再原子替换），之后可以内存映射读取"""
+        path = self.path_for(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(array))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+        return path
+
+    def entries(self):
+        """[(路径, 大小, mtime)]，按最近使用时间从旧到新排序"""
+        entries = []
+        for path in self.cache_dir.glob(f"*{self.suffix}"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:  # 被其他进程并发淘汰
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        entries.sort(key=lambda e: e[2])
+        return entries
+
+    def total_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """淘汰最久未使用的条目，直到总大小不超过上限"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class RenderCache(DiskLRUCache):
+    """
+    渲染结果缓存：同一段输入 + 同一条效果链 → 同一个输出 WAV
+    """
+    def __init__(self, cache_dir="render_cache", max_bytes=2 * 1024 ** 3):
+        super().__init__(cache_dir, max_bytes, suffix=".wav")
+
+    @staticmethod
+    def make_key(input_path, effects, **options):
+        """
+        :param effects: 按执行顺序排列的效果器列表
+        :param options: 其他会影响输出的运行选项（如流式块大小）
+        """
+        return hash_payload({
+            "input": hash_file(input_path),
+            "effects": [effect_fingerprint(e) for e in effects],
+            "options": _to_jsonable(options),
+        })
@@ -1,10 +1,159 @@
 from abc import ABC, abstractmethod
+import numpy as np
+from pedalboard import Pedalboard
+from .channel_scheduler import map_channels
 
 class AudioEffect(ABC):
     """Effect Interface"""
+    # 不属于效果参数的公开属性（显示名、运行时才写入的抽样率、随机生成的数据等）
+    non_param_attrs = ('name', 'sample_rate')
+
     def __init__(self, name="Unknown Effect"):
         self.name = name
 
     @abstractmethod
     def process(self, audio, samplerate):
         pass
+
+    def process_into(self, audio, out, samplerate):
+        """
+        把结果写进调用方预先分配好的缓冲区 out（与 audio 同形状、不能与 audio 重叠），
+        流水线用两块缓冲区来回交替，避免每一级都分配新的整段数组。
+        :return: 保存结果的数组——通常就是 out；输出长度变化或无法原地写入的效果器可以返回自己的新数组
+        """
+        # 默认实现：调用 process 后复制进 out；能原地计算的效果器应覆盖此方法
+        result = self.process(audio, samplerate)
+        if result.shape != out.shape:
+            return result
+        np.copyto(out, result, casting='same_kind')
+        return out
+
+    def cache_params(self):
+        """
+        决定输出结果的参数字典（与 get_params 类似，但不含展示用的派生值），
+        供渲染缓存计算效果链指纹。默认取所有公开的非方法属性。
+        """
+        return {key: value for key, value in vars(self).items()
+                if not key.startswith('_') and key not in self.non_param_attrs and not callable(value)}
+
+    @property
+    def rng(self):
+        """实例自己的随机数发生器（numpy Generator 可以直接生成 float32 噪声，不经过 float64）"""
+        if getattr(self, '_rng', None) is None:
+            self._rng = np.random.default_rng()
+        return self._rng
+
+    def map_channels(self, func, audio, *per_channel_args, out=None):
+        """
+        声道并行：在共享线程池上对 audio 的每个声道调用 func(chan, *args)，
+        结果按声道顺序堆叠回 (通道数, 采样点数)。func 不能修改实例上的共享状态。
+        :param out: 可选的输出缓冲区；各声道结果直接写入其中（省掉 np.array 堆叠的整段复制），
+                    形状不一致时退回新建数组
+        """
+        self.rng  # 在派发到线程池之前创建随机数发生器：各声道线程里再懒创建会互相覆盖
+        results = map_channels(func, audio, *per_channel_args)
+        if out is None or len(results) != len(out) or any(r.shape != o.shape for r, o in zip(results, out)):
+            return np.array(results)
+        for dst, result in zip(out, results):
+            dst[...] = result
+        return out
+
+    # ---------------- 块处理 (Block Streaming) 接口 ----------------
+    # 流水线在流式模式下按固定大小的块调用 process_block，
+    # 有状态的效果器（滤波器状态、振荡器相位、重叠尾巴等）需要覆盖这三个方法，
+    # 把状态保存在实例上，使块与块之间无缝衔接。
+
+    def reset(self):
+        """开始新的音频流之前清空所有块处理状态（默认无状态）"""
+        pass
+
+    def process_block(self, block, samplerate):
+        """
+        处理一个音频块
+        :param block: 音频块，shape=(通道数, 块长度)
+        :param samplerate: 抽样率（Hz）
+        :return: 处理后的音频块；可以比输入短（内部缓存的样本由后续块或 flush 输出）
+        """
+        # 默认实现：无状态效果器直接复用整段处理逻辑
+        return self.process(block, samplerate)
+
+    def flush(self, samplerate):
+        """音频流结束时调用，输出内部缓存的剩余样本（没有则返回 None）"""
+        return None
+
+
+class PedalboardEffect(AudioEffect):
+    """
+    基于 Pedalboard 插件链的效果器
+    插件图只在第一次使用时构建一次并在实例上复用（不再每次 process 都重新 new 插件），
+    并以 cache_params() 为键：修改了效果参数后，下次使用时自动重新构建；
+    可选的 numpy 后处理（加噪声等）放在 post_process 中。
+    流水线会把相邻的 PedalboardEffect 合并成一次 Pedalboard 调用，减少对整段内存的遍历次数。
+    """
+    # 是否有 numpy 后处理；有后处理的效果器只能作为合并组的最后一级
+    has_post_process = False
+
+    def __init__(self, name="Unknown Effect"):
+        super().__init__(name)
+        self._board = None
+        self._board_key = None  # 构建 _board 时的 cache_params()
+
+    @abstractmethod
+    def build_plugins(self):
+        """返回该效果器的插件列表（只在构建插件图时调用一次）"""
+        pass
+
+    @property
+    def board(self):
+        # 参数变了（包括合并组里任一成员的参数）插件图就作废，渲染缓存的键也随之改变，两者保持一致
+        key = repr(self.cache_params())
+        if self._board is None or key != self._board_key:
+            self._board = Pedalboard(self.build_plugins())
+            self._board_key = key
+        return self._board
+
+    def rebuild_board(self):
+        """强制下次使用时重新构建插件图（参数变化会自动触发，一般不需要调用）"""
+        self._board = None
+
+    def post_process(self, audio, samplerate):
+        """
+        插件链之后的 numpy 处理，默认不做任何事
+        audio 是插件链新生成的数组，可以直接原地修改
+        """
+        return audio
+
+    def process(self, audio, samplerate):
+        return self.post_process(self.board(audio, samplerate), samplerate)
+
+    def process_into(self, audio, out, samplerate):
+        # Pedalboard 总是返回新数组，不能写进 out；直接交还这块数组，省掉一次复制
+        return self.process(audio, samplerate)
+
+    def reset(self):
+        self.board.reset()
+
+    def process_block(self, block, samplerate):
+        # 流式模式：reset=False 保留压缩器/LFO/滤波器等插件内部状态
+        return self.post_process(self.board(block, samplerate, reset=False), samplerate)
+
+
+class FusedPedalboardEffect(PedalboardEffect):
+    """
+    由流水线自动生成：把若干相邻的 PedalboardEffect 嵌套进同一个 Pedalboard，
+    一次调用完成整组插件处理；最后一级的 numpy 后处理照常执行。
+    复用各成员自身的插件图，不会重新创建插件。
+    """
+    def __init__(self, members):
+        super().__init__(" + ".join(m.name for m in members))
+        self.members = list(members)
+        self.has_post_process = self.members[-1].has_post_process
+
+    def build_plugins(self):
+        return [m.board for m in self.members]
+
+    def cache_params(self):
+        return {"members": [(type(m).__qualname__, m.cache_params()) for m in self.members]}
+
+    def post_process(self, audio, samplerate):
+        return self.members[-1].post_process(audio, samplerate)
@@ -0,0 +1,168 @@
+"""
+抑制载波信号 (DSB-SC/SSB) 的载波恢复
+
+平方律：s²(t) = (m·a(t))²/2 · [1 + cos(2(2πf t + φ))]，其中 (m·a(t))² 恒为正，
+所以平方后的信号在 2f 处有一根稳定的谱线，其频率和相位的一半就是载波的频率和相位
+（相位有 π 的模糊，只影响解调输出的极性，听不出来）。
+
+- 整段 (estimate_carrier / recover_carrier)：平方信号的 FFT 找 2f 谱线（等价于同时与所有候选频率做互相关），
+  再逐段与该频率的复指数做相关、对相位做加权直线拟合，得到精确的频率和相位。O(N log N) 只作用于开头一段，
+  之后全部是分段累加，内存有上界。
+- 流式 (CostasLoop)：Costas 环逐块跟踪相位。混频按块向量化完成，环路按“积分-清除”的子块
+  （默认 64 个采样点）更新一次，Python 循环次数只有采样点数的 1/64。
+"""
+import numpy as np
+import scipy.fft
+
+from .precision import float_dtype
+
+# 频率粗估时最多使用的采样点数（约 24 秒 @44.1kHz）；更长的信号只用于相位拟合
+ACQUISITION_FRAMES = 1 << 20
+# 相位拟合的分段长度
+PHASE_SEGMENT = 4096
+
+
+def synthesize_carrier(freq, phase, start, length, samplerate):
+    """
+    cos(2πf·n/fs + φ)，n 从 start 开始：相位在 float64 下计算并折回 [0, 2π)，再按全局精度求余弦
+    """
+    n = start + np.arange(length)
+    theta = np.mod(2 * np.pi * freq / samplerate * n + phase, 2 * np.pi)
+    return np.cos(theta.astype(float_dtype()))
+
+
+def _coarse_frequency(squared, samplerate, nominal_freq, tolerance):
+    """平方信号的频谱中在 2f(1±tol) 范围内找最高谱线，抛物线插值到小数频点；返回 2f 的估计值"""
+    n_fft = scipy.fft.next_fast_len(max(len(squared), 16384))
+    spectrum = np.abs(scipy.fft.rfft(squared - np.mean(squared), n=n_fft))
+    bin_hz = samplerate / n_fft
+    lo = max(int((2 * nominal_freq * (1 - tolerance)) / bin_hz), 1)
+    hi = min(int(np.ceil(2 * nominal_freq * (1 + tolerance) / bin_hz)) + 1, len(spectrum) - 1)
+    if hi <= lo:
+        return 2 * nominal_freq
+    k = lo + int(np.argmax(spectrum[lo:hi]))
+    a, b, c = np.log(spectrum[k - 1:k + 2] + 1e-30)
+    denom = a - 2 * b + c
+    delta = 0.5 * (a - c) / denom if denom < 0 else 0.0
+    return (k + delta) * bin_hz
+
+
+def estimate_carrier(modulated, samplerate, nominal_freq, tolerance=0.01):
+    """
+    估计抑制载波信号的载波频率与相位
+    :param tolerance: 载波频率相对于标称值的最大偏差（比例），搜索范围留 50% 余量
+    :return: (freq, phase)，载波为 cos(2π·freq·n/fs + phase)
+    """
+    x = np.asarray(modulated, dtype=np.float64)
+    if len(x) < 4:
+        return float(nominal_freq), 0.0
+    head = x[:ACQUISITION_FRAMES]
+    f2 = _coarse_frequency(head * head, samplerate, nominal_freq, 1.5 * tolerance)
+
+    # 分段复相关：Z_k = Σ s²(n)·e^{-j2π·f2·n/fs}，各段相位随时间的斜率就是剩余的频率误差
+    seg = PHASE_SEGMENT
+    count = -(-len(x) // seg)
+    sums = np.empty(count, dtype=np.complex128)
+    step = seg * 256  # 每次处理 256 段，中间数组有上界
+    for first in range(0, count, 256):
+        start = first * seg
+        chunk = x[start:start + step]
+        n = start + np.arange(len(chunk))
+        z = chunk * chunk * np.exp(-2j * np.pi * f2 / samplerate * n)
+        pad = -len(z) % seg
+        sums[first:first + -(-len(chunk) // seg)] = np.pad(z, (0, pad)).reshape(-1, seg).sum(axis=1)
+
+    weights = np.abs(sums)
+    if not np.any(weights > 0):
+        return f2 / 2, 0.0
+    centers = (np.arange(count) * seg + seg / 2) / samplerate
+    angles = np.unwrap(np.angle(sums))
+    if count >= 2:
+        slope, intercept = np.polyfit(centers, angles, 1, w=weights)
+    else:
+        slope, intercept = 0.0, angles[0]
+    f2 += slope / (2 * np.pi)
+    return f2 / 2, float(np.mod(intercept, 2 * np.pi)) / 2
+
+
+def recover_carrier(modulated, samplerate, nominal_freq, tolerance=0.01):
+    """整段载波恢复：返回与 modulated 等长、同步后的载波 cos(2πf̂t + φ̂)"""
+    freq, phase = estimate_carrier(modulated, samplerate, nominal_freq, tolerance)
+    return synthesize_carrier(freq, phase, 0, len(modulated), samplerate)
+
+
+class CostasLoop:
+    """
+    块处理的 Costas 环（二阶环路：比例 + 积分）
+    NCO 以捕获到的频率 f0 运行；每个子块把 s(n)·e^{-jθ(n)} 累加成一个复数 Z，
+    鉴相器 e = Im(Z²)/平均功率 ≈ 2Δφ（对调制信号的正负号不敏感），环路滤波后修正相位与频率。
+    第一次调用时用 estimate_carrier 在第一块上做频率捕获，环路只需跟踪剩余的小误差。
+    """
+    def __init__(self, samplerate, nominal_freq, tolerance=0.01, loop_bandwidth=20.0, damping=0.707,
+                 subblock=64):
+        """
+        :param loop_bandwidth: 环路噪声带宽 (Hz)：越大跟踪越快，越小相位抖动越小
+        :param subblock: 积分-清除的子块长度（采样点），也是环路的更新间隔
+        """
+        self.samplerate = samplerate
+        self.nominal_freq = nominal_freq
+        self.tolerance = tolerance
+        self.subblock = int(subblock)
+
+        # 离散二阶环路系数（鉴相器增益按 2 计）
+        theta = loop_bandwidth * self.subblock / samplerate / (damping + 1 / (4 * damping))
+        denom = (1 + 2 * damping * theta + theta * theta) * 2
+        self.kp = 4 * damping * theta / denom
+        self.ki = 4 * theta * theta / denom
+        self.reset()
+
+    def reset(self):
+        self.freq = None  # NCO 频率（第一次处理时捕获）
+        self.phase = 0.0  # 当前子块开头的相位修正 φ
+        self.step = 0.0  # 每个子块的相位增量 ν（环路积分器，即剩余频偏）
+        self.power = None  # |Z|² 的滑动平均，用于归一化鉴相器输出
+        self._position = 0  # 下一个采样点的绝对序号
+        self._pending = np.zeros(0, dtype=np.complex128)  # 未满一个子块的混频结果
+
+    def process(self, block):
+        """输入一块调制信号，返回同步后的本地载波（与输入等长）"""
+        x = np.asarray(block, dtype=np.float64)
+        length, M = len(x), self.subblock
+        if self.freq is None:
+            self.freq, self.phase = estimate_carrier(x, self.samplerate, self.nominal_freq, self.tolerance)
+
+        n = self._position + np.arange(length)
+        nco = 2 * np.pi * self.freq / self.samplerate * n
+        baseband = np.concatenate([self._pending, x * np.exp(-1j * nco)])
+
+        # 本块涉及的每个子块：先记下子块开头的 (φ, ν)，子块完整时再用它的累加值更新环路
+        offset = self._position % M  # 第一个子块里已经在上一块处理过的采样点数
+        complete = len(baseband) // M
+        sums = baseband[:complete * M].reshape(complete, M).sum(axis=1)
+        touched = complete + (len(baseband) % M > 0)
+        phases = np.empty(touched)
+        steps = np.empty(touched)
+        for k in range(touched):
+            phases[k], steps[k] = self.phase, self.step
+            if k < complete:
+                self._update(sums[k])
+
+        # 子块内相位线性增长：φ(n) = φ_k + ν_k·i/M
+        index = offset + np.arange(length)
+        k, i = index // M, index % M
+        correction = phases[k] + steps[k] * (i / M)
+        theta = np.mod(nco + correction, 2 * np.pi)
+
+        self._pending = baseband[complete * M:]
+        self._position += length
+        return np.cos(theta).astype(float_dtype())
+
+    def _update(self, z):
+        # 以子块中点的相位去旋转，Z' ≈ A·e^{jΔφ}；Costas 鉴相 Im(Z'²) ∝ sin(2Δφ)
+        z = z * complex(np.cos(self.phase + self.step / 2), -np.sin(self.phase + self.step / 2))
+        power = z.real * z.real + z.imag * z.imag
+        self.power = power if self.power is None else 0.99 * self.power + 0.01 * power
+        error = 2 * z.real * z.imag / (self.power + 1e-30)
+        error = max(-1.0, min(1.0, error))
+        self.step += self.ki * error
+        self.phase = (self.phase + self.step + self.kp * error) % (2 * np.pi)
@@ -0,0 +1,53 @@
+"""
+声道并行调度器
+
+Doppler / AM / FSK / 卷积混响都是"逐声道独立处理"，
+其中最耗时的 FFT、sosfilt、hilbert 都是 C 实现并会释放 GIL，
+因此用一个全局共享的线程池让各声道同时计算即可获得接近线性的加速，
+立体声/多声道文件的耗时接近只处理一个声道。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_executor = None
+_executor_lock = threading.Lock()
+_max_workers = None
+
+
+def set_max_workers(max_workers):
+    """
+    设置声道线程池的最大线程数（None 表示 CPU 核数，1 表示关闭并行）
+    批处理的多进程场景下应调小，避免 进程数 × 线程数 超过 CPU 核数。
+    """
+    global _executor, _max_workers
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+        _max_workers = max_workers
+
+
+def get_max_workers():
+    return _max_workers or os.cpu_count() or 1
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_max_workers(),
+                                           thread_name_prefix="channel")
+        return _executor
+
+
+def map_channels(func, *iterables):
+    """
+    对每个声道并行调用 func，结果按声道顺序返回（list）
+    用法与内置 map 相同：map_channels(f, audio) 或 map_channels(f, audio, states)
+    只有一个声道或并行被关闭时直接在当前线程执行，没有额外开销。
+    """
+    args = list(zip(*iterables))
+    if len(args) <= 1 or get_max_workers() <= 1:
+        return [func(*a) for a in args]
+    return list(_get_executor().map(lambda a: func(*a), args))
@@ -1,6 +1,10 @@
+import os
+
 import numpy as np
-import scipy.signal
+from . import ir_library
 from .base import AudioEffect
+from .partitioned_convolution import PartitionedConvolver
+from .precision import float_dtype
 
 class ConvolutionReverb(AudioEffect):
     """
@@ -8,72 +12,79 @@ class ConvolutionReverb(AudioEffect):
     原理：利用 LTI 系统特性，通过与脉冲响应 (IR) 进行卷积，
     将音频“置入”特定的物理空间或设备中。
     """
-    def __init__(self, ir_type='spring', mix=0.3):
-        super().__init__(f"Convolution Reverb ({ir_type})")
+    def __init__(self, ir_type='spring', mix=0.3, normalize='peak', partition_size=None):
+        """
+        :param ir_type: 合成 IR 类型（'spring'、'old_radio'）或真实 IR 的 .wav 文件路径
+        :param normalize: 湿信号归一化方式
+                          'peak'   按湿信号峰值归一化（默认，湿信号峰值 = mix；整段模式需要先算完全部湿信号，
+                                   流式模式只能用累计峰值近似）
+                          'energy' 按 IR 能量归一化（需显式选择：不需要全局扫描，整段与流式结果一致，
+                                   但湿信号电平随 IR 和素材变化，与 'peak' 不同）
+        :param partition_size: 分段卷积的分段长度，None 时按 IR 长度自动选择
+        """
+        super().__init__(f"Convolution Reverb ({os.path.basename(str(ir_type))})")
+        if normalize not in ('energy', 'peak'):
+            raise ValueError(f"未知的归一化方式: {normalize}")
+        ir_library.source_key(ir_type)  # 尽早报告未知类型 / 不存在的文件
+        self.ir_type = ir_type
         self.mix = mix
-        self.ir = self._generate_synthetic_ir(ir_type)
+        self.normalize = normalize
+        self.partition_size = partition_size
+        # IR 在第一次处理时才按实际抽样率从 IR 库取得（库内按抽样率缓存，构造本身不做任何计算）
+        self._convolver = None  # 流式模式：分段卷积引擎（保存频域延迟线）
+        self._wet_peak = 0.0  # 流式模式（peak）：湿信号的累计峰值
+
+    def cache_params(self):
+        # 合成 IR 由 (类型, 抽样率) 确定性生成，类型名即可代表它；IR 文件还要带上大小和修改时间
+        params = super().cache_params()
+        params['ir_type'] = ir_library.source_key(self.ir_type)
+        return params
+
+    def _new_convolver(self, samplerate):
+        # 'energy' 模式直接用单位能量的 IR；'peak' 模式用峰值归一化的 IR，湿信号之后再按峰值缩放
+        ir, partition_size, spectra = ir_library.get_spectra(
+            self.ir_type, samplerate, self.normalize, self.partition_size)
+        return PartitionedConvolver(ir, partition_size, spectra=spectra)
+
+    def process(self, audio, samplerate):
+        return self.process_into(audio, np.empty(audio.shape, dtype=float_dtype()), samplerate)
 
-    def _generate_synthetic_ir(self, ir_type):
+    def process_into(self, audio, out, samplerate):
         """
-        生成模拟的脉冲响应 (IR)。
-        在实际项目中，这里应该加载一个真实的 .wav IR 文件。
+        整段处理：与流式相同的分段卷积引擎，湿信号直接写进 out，干湿混合原地完成
+        输出长度与输入一致（卷积拖尾被截掉）
         """
-        sr = 44100
-        if ir_type == 'spring':
-            # 模拟“弹簧混响”：这是吉他音箱和老式设备常用的，金属感很强
-            length_sec = 2.0
-            t = np.linspace(0, length_sec, int(sr * length_sec))
-            # 载波噪声 * 指数衰减
-            noise = np.random.normal(0, 1, len(t))
-            # 弹簧特有的“不断反弹”的颤动感 (Chirp)
-            chirp = np.sin(2 * np.pi * 50 * t * t) 
-            envelope = np.exp(-3 * t) # 衰减包络
-            
-            ir = noise * chirp * envelope
-            
-        elif ir_type == 'old_radio':
-            # 模拟“小盒子内部反射”：短、闷
-            length_sec = 0.2
-            t = np.linspace(0, length_sec, int(sr * length_sec))
-            noise = np.random.normal(0, 1, len(t))
-            # 这是一个低通滤波特性的极短混响
-            envelope = np.exp(-20 * t) 
-            ir = noise * envelope
-            
-        # 归一化 IR，防止能量过大
-        return ir / np.max(np.abs(ir))
+        # 【核心数学操作】 y[n] = x[n] * h[n]，分段后在频域完成：Y = Σ H[p]·X[k-p]
+        wet = self._new_convolver(samplerate).process(audio, out=out)
 
-    def process(self, audio, samplerate):
-        # audio shape: (2, N) 双声道
-        # ir shape: (M,)
-        
-        # 1. 既然 Scipy 的 fftconvolve 支持多维，我们可以尝试直接卷
-        # 但通常建议分声道处理以防止串扰奇怪
-        # 为了演示数理原理，可以手动对每个声道做 FFT 卷积
-        
-        # 使用 Scipy 的 FFT 卷积算法 (自动选择重叠相加法等优化)
-        # mode='same' 保证输出长度和输入一致，不会变长
-        
-        wet_signal_max_len = audio.shape[1]
-        wet_channels = []
+        if self.normalize == 'peak':
+            # 峰值归一化需要整段湿信号的全局最大值（流式模式只能用累计峰值近似）
+            wet *= self.mix / (float(np.max(np.abs(wet))) + 1e-9)
+        else:
+            wet *= self.mix
+        # 干信号逐声道叠加，临时数组只有一个声道大小
+        for dst, dry in zip(wet, audio):
+            dst += dry * (1 - self.mix)
+        return wet
+
+    def reset(self):
+        self._convolver = None
+        self._wet_peak = 0.0
+
+    def process_block(self, block, samplerate):
+        """
+        流式接口：分段卷积 (Uniformly Partitioned Overlap-Save)
+        IR 各段的频谱只算一次，块与块之间只保留上一块输入和频域延迟线，不满一个分段的块也零延迟输出。
+        """
+        if self._convolver is None:
+            self._convolver = self._new_convolver(samplerate)
+        wet_signal = self._convolver.process(block)
 
-        for i in range(audio.shape[0]): # 遍历左、右声道
-            channel_audio = audio[i]
-            
-            # 【核心数学操作】 y[n] = x[n] * h[n]
-            # 这里实际上执行的是 IFFT( FFT(x) * FFT(h) )
-            convolved = scipy.signal.fftconvolve(channel_audio, self.ir, mode='full')
-            
-            # 裁剪到原始长度 (卷积会让信号变长 IR的长度，形成拖尾)
-            # 我们只取前半部分对齐
-            wet_channels.append(convolved[:wet_signal_max_len])
+        if self.normalize == 'peak':
+            # 流式模式拿不到全局峰值，用累计峰值归一化湿信号
+            self._wet_peak = max(self._wet_peak, float(np.max(np.abs(wet_signal))))
+            wet_signal *= 1.0 / (self._wet_peak + 1e-9)
 
-        wet_signal = np.array(wet_channels)
-        
-        # 2. 也是必做的一步：归一化湿信号能量
-        # 因为卷积是累加运算，数值会爆炸非常大
-        wet_signal = wet_signal / (np.max(np.abs(wet_signal)) + 1e-9)
-        
-        # 3. 干湿混合 (Dry/Wet Mix)
-        # Dry(1-mix) + Wet(mix)
-        return audio * (1 - self.mix) + wet_signal * self.mix
\ No newline at end of file
+        wet_signal *= self.mix
+        wet_signal += block * (1 - self.mix)
+        return wet_signal
@@ -1,174 +1,299 @@
+import warnings
+
 import numpy as np
-from scipy.signal import firwin, lfilter
 from .base import AudioEffect  # 注意相对导入（effects文件夹内）
+from .precision import float_dtype
+from .resampling import PolyphaseResampler
 
 
 class DopplerEffect(AudioEffect):
     """
     多普勒效应音频处理器
-    核心功能：模拟信号源/接收端相对运动导致的音频频率偏移
+    核心功能：模拟声源匀速直线驶过听者（pass-by）时的音高变化——驶近时偏高、驶离时偏低，
+    经过最近点时连续滑落
     关联通信原理知识点：
-    1. 信号处理：傅里叶变换（时频域转换）、离散抽样
-    2. 数字基带系统：奈奎斯特频率（抽样率约束）、过采样与抗混叠滤波
-    3. 多普勒效应：多普勒频移公式与频率缩放
+    1. 多普勒效应：接收信号 y(t) = s(t - τ(t))，τ(t) 为声音从声源传到听者的时延，
+       瞬时频率 f' = f · (1 - dτ/dt)，远离/驶近时 dτ/dt 随径向速度连续变化
+    2. 离散抽样与插值：τ(t) 不是抽样间隔的整数倍，用分数时延（三次 Hermite）插值
+       在抽样点之间重建信号，相当于随时间变化的重采样
+    3. 因果系统：输出只依赖过去的输入，历史缓冲区长度由最大传播时延决定，内存有上界
+    4. 过采样与抗混叠：输入先经多相滤波器 oversample_rate 倍升采样再插值，插值误差更小；
+       同一个滤波器把截止频率压到 奈奎斯特频率/多普勒因子，驶近时频率升高也不会超过奈奎斯特频率
+
+    实现：逐块计算每个输出抽样的时延，在保存的（过采样）输入历史上插值，O(N) 计算、块与块之间无缝衔接；
+    整段处理同样分块进行，与流式结果完全一致。
+    输出时间轴扣除了第一个输入样本的传播时延 D0（输出序号 0 正好读到输入序号 0），开头没有静音、内容不整体后移；
+    驶近时实际时延比 D0 短，需要读取“未来”的输入，所以内部有 lookahead 个采样点的前瞻：
+    流式模式的输出比输入滞后这么多（process_block 的输出可能比输入短），剩余部分由 flush 输出，总长度与输入相同。
+    声源结束时比开始时更远的话，最后 (结束时延 - D0) 的输入还在“路上”，不会出现在输出里。
     """
+    # 整段处理时每次计算的采样点数（中间数组只有这么大）
+    chunk_size = 65536
+    # 时延曲线非常平滑：每隔 trajectory_step 个采样点精确计算一次，中间线性插值
+    # （最近点附近的插值误差也不到千分之一个采样点），与块边界无关，流式与整段结果一致
+    trajectory_step = 32
+    # 旧版（频域频移实现）的参数及其默认值：pass-by 模型不再使用
+    removed_params = {"oversample_enable": True, "freq_shift_range": (20, 15000)}
 
     def __init__(self, **kwargs):
         super().__init__(name="Doppler Effect")
 
-        # 补充缺失的属性默认值
-        self.speed = 30.0
+        # 运动轨迹参数：声源沿直线匀速运动，听者在原点
+        self.speed = 30.0  # 声源速度 (m/s)，正负只影响方向，不影响声音
         self.sound_speed = 343.0
-        self.oversample_enable = True  # 新增：过采样开关（原逻辑中用到的属性）
-        self.oversample_rate = 4  # 新增：过采样倍数（若原逻辑用到）
-        self.freq_shift_range = (20, 15000)  # 新增：频率范围（若原逻辑用到）
+        self.closest_distance = 10.0  # 最近点距离 (m)
+        self.pass_time = 5.0  # 经过最近点的时刻（秒，以音频开头为 0）
+        self.max_distance = 150.0  # 距离上限 (m)：远处平滑收敛到该值，决定历史缓冲区长度
+        self.distance_gain = False  # 是否按 1/r 衰减音量（真实但会让远处的声音很轻）
+        self.oversample_rate = 2  # 历史缓冲区的过采样倍数；1 表示直接在原始抽样上插值（不做抗混叠）
+        self.resample_quality = "fast"  # 过采样滤波器的质量档位（见 resampling.QUALITY）
+        self.sample_rate = None  # 处理时写入，用于展示奈奎斯特频率
 
         # 动态覆盖参数
-        for key, value in kwargs.items():
+        for key, value in self._handle_removed_params(kwargs).items():
             if hasattr(self, key):
                 setattr(self, key, value)
+        self._validate()
 
-    def _validate_freq_range(self, freq):
-        """
-        基于数字基带系统的奈奎斯特准则，约束频移后的频率范围
-        知识点应用：奈奎斯特频率（f_N = 采样率/2）- 基带系统最高无混叠传输频率
-        核心逻辑：频移后信号最高频率 ≤ 奈奎斯特频率，避免混叠失真
-        """
-        # 计算当前抽样率下的奈奎斯特频率（数字基带系统的带宽上限）
-        nyquist_freq = self.sample_rate / 2
-        # 基础频率范围：下限为音频可听域（20Hz），上限初步限制为初始设定值
-        valid_lower = max(self.freq_shift_range[0], 20)
-        valid_upper = self.freq_shift_range[1]
-
-        # 关键约束1：处理频率上限不得超过奈奎斯特频率（留1Hz余量，避免边界混叠）
-        valid_upper = min(valid_upper, nyquist_freq - 1)
-
-        # 关键约束2：预判频移后频率是否超界（多普勒因子可能导致频率放大）
-        doppler_factor = self.sound_speed / (self.sound_speed - self.speed)
-        max_shifted_freq = valid_upper * doppler_factor  # 频移后的最高频率
-        if max_shifted_freq > nyquist_freq:
-            # 动态降低处理频率上限，确保频移后仍符合奈奎斯特准则
-            valid_upper = nyquist_freq / doppler_factor
+        self._stream = None  # 流式模式的状态（见 _new_state）
 
-        # 生成频率掩码：仅对符合奈奎斯特约束的频段进行处理
-        freq_mask = np.logical_and(freq >= valid_lower, freq <= valid_upper)
-        return freq_mask
-
-    def _oversample(self, waveform):
+    def _handle_removed_params(self, kwargs):
         """
-        数字基带系统的过采样处理
-        知识点应用：过采样技术 - 提升抽样率以降低抗混叠滤波难度，提升信号质量
-        工程逻辑：先升采样（插入零值），再低通滤波（滤除镜像频率）
+        旧参数以非默认值传入时发出警告（不再静默忽略）：
+        oversample_enable=False 等价于 oversample_rate=1；freq_shift_range 没有对应的概念，不起作用
+        :return: 去掉旧参数后的 kwargs
         """
-        # 1. 升采样：在原抽样点间插入（过采样倍数-1）个零值，抽样率提升至原倍数
-        oversampled_len = len(waveform) * self.oversample_rate
-        oversampled_wave = np.zeros(oversampled_len)
-        oversampled_wave[::self.oversample_rate] = waveform  # 每隔N个点放置原抽样值
+        kwargs = dict(kwargs)
+        for name, default in self.removed_params.items():
+            if name not in kwargs:
+                continue
+            value = kwargs.pop(name)
+            if (tuple(value) if name == "freq_shift_range" else bool(value)) == default:
+                continue
+            if name == "oversample_enable":
+                warnings.warn("DopplerEffect 的 oversample_enable 参数已移除，"
+                              "oversample_enable=False 已按 oversample_rate=1 处理", FutureWarning, stacklevel=3)
+                kwargs.setdefault("oversample_rate", 1)
+            else:
+                warnings.warn("DopplerEffect 的 freq_shift_range 参数已移除并被忽略："
+                              "频移由运动轨迹 (speed, closest_distance, pass_time) 决定，"
+                              "抗混叠由过采样滤波器自动处理", FutureWarning, stacklevel=3)
+        return kwargs
 
-        # 2. 抗混叠低通滤波（基带系统核心步骤）
-        # 截止频率：归一化频率 = 1/过采样倍数（确保仅保留原始信号频段）
-        cutoff = 1 / self.oversample_rate
-        # 设计FIR低通滤波器（汉明窗，31阶-兼顾滤波效果与计算效率）
-        fir_filter = firwin(numtaps=31, cutoff=cutoff, window='hamming')
-        # 应用滤波，去除升采样引入的镜像频率（避免后续处理混叠）
-        filtered_wave = lfilter(fir_filter, 1, oversampled_wave)
+    def _validate(self):
+        if abs(self.speed) >= self.sound_speed:
+            raise ValueError(f"声源速度必须低于声速: |{self.speed}| >= {self.sound_speed}")
+        if self.closest_distance < 0 or self.max_distance <= self.closest_distance:
+            raise ValueError("需要 0 <= closest_distance < max_distance")
+        if int(self.oversample_rate) < 1:
+            raise ValueError(f"过采样倍数必须 >= 1: {self.oversample_rate}")
 
-        return filtered_wave
+    # ---------------- 运动轨迹 ----------------
 
-    def _downsample(self, waveform):
+    def _distance(self, t):
         """
-        数字基带系统的降采样处理
-        知识点应用：抽样率还原 - 过采样后需降回原始抽样率，匹配音频输出要求
-        核心逻辑：每隔（过采样倍数）个点取一个值，丢弃冗余抽样点
+        声源在时刻 t（秒）与听者的距离
+        超过 max_distance 后用 tanh 平滑饱和：远处的径向速度逐渐趋于 0（音高回到原调），
+        传播时延有上界，输入历史缓冲区的长度因此有限
         """
-        return waveform[::self.oversample_rate]
+        x = self.speed * (t - self.pass_time)
+        r = np.sqrt(x * x + self.closest_distance ** 2)
+        return self.max_distance * np.tanh(r / self.max_distance)
 
-    def _doppler_freq_shift(self, waveform):
+    def _delay(self, t):
         """
-        多普勒频移核心算法：基于傅里叶变换的频域频率缩放
-        知识点应用：
-        1. 傅里叶变换：时域→频域（修改频率特征），频域→时域（还原音频波形）
-        2. 多普勒频移公式：频率缩放因子计算
+        时刻 t 到达听者的声音在声源处的发出时延 τ：τ = R(t - τ) / c
+        不动点迭代，每次误差缩小到 |v|/c 倍（30 m/s 时约 0.09），迭代 4 次已远小于一个抽样点
         """
-        # 1. 离散傅里叶变换（DFT）：时域波形转换为频域复数谱（获取频率特征）
-        fft_wave = np.fft.fft(waveform)
-        # 获取频域对应的实际频率轴（Hz）- FFT频率索引与实际频率的映射
-        freq_axis = np.fft.fftfreq(len(waveform), 1 / self.sample_rate)
+        tau = self._distance(t) / self.sound_speed
+        for _ in range(4):
+            tau = self._distance(t - tau) / self.sound_speed
+        return tau
+
+    def doppler_factors(self):
+        """驶近 / 驶离时的多普勒频率缩放因子 c/(c-v)、c/(c+v)"""
+        v = abs(self.speed)
+        return self.sound_speed / (self.sound_speed - v), self.sound_speed / (self.sound_speed + v)
 
-        # 2. 计算多普勒频率缩放因子（通信原理多普勒频移公式变形）
-        # 原始公式：f' = f * (v_sound + v_receive) / (v_sound - v_source)
-        # 简化为频率缩放因子：doppler_factor = v_sound / (v_sound - 相对速度)
-        doppler_factor = self.sound_speed / (self.sound_speed - self.speed)
+    # ---------------- 分数时延插值 ----------------
 
-        # 3. 生成频率掩码（基于奈奎斯特准则约束的有效频段）
-        freq_mask = self._validate_freq_range(freq_axis)
+    def _render(self, state, start, length, samplerate, out):
+        """
+        计算绝对序号 [start, start+length) 的输出抽样，写进 out（shape=(通道数, length)）
+        输出序号 n 对应听者时刻 t = n/fs + D0，读取该时刻听到的、在 t - τ(t) 发出的输入
+        state["history"][:, j] 对应过采样序号 history_start + j（原始序号 × oversample_rate）；
+        序号 < 0 的样本视为 0（声音还没发出），输入结束（final）后超出末尾的样本也视为 0
+        """
+        if length == 0:
+            return out
+        source, source_start = state["history"], state["history_start"]
+        rate = int(self.oversample_rate)
+        n = start + np.arange(length)
+        step = self.trajectory_step
+        grid = np.arange(start // step, (start + length - 1) // step + 2) * step
+        grid_t = grid / samplerate + state["offset"]
+        grid_emit = grid_t - self._delay(grid_t)  # 声音发出的时刻
+        read_pos = np.interp(n, grid, grid_emit * samplerate)  # 要读取的输入位置（绝对序号，带小数）
+        if rate > 1:
+            read_pos *= rate
 
-        # 4. 频域频率缩放（实现多普勒频移的核心步骤）
-        # 计算缩放后的频域索引（确保索引在有效范围内，避免数组越界）
-        scaled_indices = np.round(np.arange(len(fft_wave)) * doppler_factor).astype(int)
-        valid_indices = np.logical_and(scaled_indices >= 0, scaled_indices < len(fft_wave))
+        base = np.floor(read_pos)
+        frac = (read_pos - base).astype(float_dtype())
+        base = base.astype(np.int64)
 
-        # 初始化新频域数组，将缩放后的频域值映射到对应位置（仅保留有效频段）
-        shifted_fft = np.zeros_like(fft_wave, dtype=np.complex128)
-        shifted_fft[scaled_indices[valid_indices]] = fft_wave[valid_indices] * freq_mask[valid_indices]
+        # 前瞻/历史长度由轨迹的时延范围算出，读到范围之外说明计算有误：直接报错，不用错位的样本凑数
+        if base[0] - 1 >= 0 and base[0] - 1 < source_start:
+            raise RuntimeError(f"Doppler 输入历史不足: 需要过采样序号 {base[0] - 1}，历史从 {source_start} 开始")
+        if not state["final"] and base[-1] + 2 >= source_start + source.shape[-1]:
+            raise RuntimeError(f"Doppler 前瞻不足: 需要过采样序号 {base[-1] + 2}，"
+                               f"只收到 {source_start + source.shape[-1]}")
 
-        # 5. 逆离散傅里叶变换（IDFT）：频域谱转换回时域波形（可听音频信号）
-        shifted_wave = np.fft.ifft(shifted_fft).real
+        # Catmull-Rom 三次 Hermite 插值：用 x[n-1], x[n], x[n+1], x[n+2] 重建 x[n+frac]
+        taps = []
+        for offset in (-1, 0, 1, 2):
+            index = base + offset - source_start
+            outside = (index < 0) | (index >= source.shape[-1])
+            tap = source[:, np.clip(index, 0, source.shape[-1] - 1)]
+            tap[:, outside] = 0
+            taps.append(tap)
+        x0, x1, x2, x3 = taps
+        c1 = (x2 - x0) * 0.5
+        c2 = x0 - 2.5 * x1 + 2 * x2 - 0.5 * x3
+        c3 = (x3 - x0) * 0.5 + 1.5 * (x1 - x2)
+        out[...] = ((c3 * frac + c2) * frac + c1) * frac + x1
 
-        return shifted_wave
+        if self.distance_gain:
+            # 球面波 1/r 衰减，以最近点（至少 1m）为参考距离
+            reference = max(self.closest_distance, 1.0)
+            grid_gain = np.minimum(reference / self._distance(grid_emit), 1.0)
+            out *= np.interp(n, grid, grid_gain).astype(float_dtype())
+        return out
 
     # 核心process方法（严格匹配基类接口：audio, samplerate）
     def process(self, audio, samplerate):
         """
         对外统一接口：处理多通道音频（支持单声道/立体声）
-        完整流程：过采样→频移处理→降采样→输出
         :param audio: 输入音频波形，shape=(通道数, 采样点数)
         :param samplerate: 输入音频抽样率（Hz）
         :return: 处理后的音频波形，shape与输入一致
         """
-        self.sample_rate = samplerate  # 缓存当前音频抽样率
-        processed_channels = []
-
-        # 对每个声道单独处理（适配多通道音频）
-        for chan in audio:
-            # 步骤1：过采样处理（若开启）- 数字基带系统抗混叠前置操作
-            if self.oversample_enable:
-                # 过采样时，抽样率需更新为原抽样率×过采样倍数
-                self.sample_rate *= self.oversample_rate
-                oversampled_chan = self._oversample(chan)
-                current_chan = oversampled_chan
-            else:
-                current_chan = chan
+        return self.process_into(audio, np.empty(audio.shape, dtype=float_dtype()), samplerate)
 
-            # 步骤2：多普勒频移核心处理（基于奈奎斯特约束的频域缩放）
-            shifted_chan = self._doppler_freq_shift(current_chan)
+    def process_into(self, audio, out, samplerate):
+        """与 process 相同，直接写进 out；按 chunk_size 分块走与流式相同的路径，中间数组只有块大小"""
+        self.sample_rate = samplerate  # 缓存当前音频抽样率（供 get_params 展示）
+        state = self._new_state(audio.shape[0], samplerate)
+        total = audio.shape[-1]
+        for start in range(0, total, self.chunk_size):
+            self._feed(state, audio[:, start:start + self.chunk_size])
+            ready = min(state["received"] - state["lookahead"], total)
+            self._emit(state, ready, samplerate, out[:, state["position"]:max(ready, state["position"])])
+        self._finish_input(state)
+        self._emit(state, total, samplerate, out[:, state["position"]:])
+        return out
 
-            # 步骤3：降采样处理（若开启）- 还原为原始抽样率，匹配音频输出
-            if self.oversample_enable:
-                downsampled_chan = self._downsample(shifted_chan)
-                # 抽样率恢复为原始值，避免影响后续处理
-                self.sample_rate /= self.oversample_rate
-                processed_chan = downsampled_chan
-            else:
-                processed_chan = shifted_chan
+    def reset(self):
+        self._stream = None
+
+    def process_block(self, block, samplerate):
+        """
+        流式接口：把新块（过采样后）接在输入历史后面，在历史上做分数时延插值；
+        输出比输入滞后 lookahead 个采样点，只保留时延范围内的历史，内存与音频长度无关
+        """
+        self.sample_rate = samplerate
+        if self._stream is None:
+            self._stream = self._new_state(block.shape[0], samplerate)
+        state = self._stream
+        self._feed(state, block)
+        return self._emit(state, state["received"] - state["lookahead"], samplerate)
+
+    def flush(self, samplerate):
+        """输入结束：输出前瞻缓存里剩下的 lookahead 个采样点（之后的输入按静音处理）"""
+        if self._stream is None:
+            return None
+        state, self._stream = self._stream, None
+        self._finish_input(state)
+        return self._emit(state, state["received"], samplerate)
+
+    def _new_state(self, num_channels, samplerate):
+        self._validate()
+        rate = int(self.oversample_rate)
+        upsampler = None
+        if rate > 1:
+            # 截止频率压到 1/多普勒因子：时间压缩后最高频率仍低于原奈奎斯特频率
+            approach, _ = self.doppler_factors()
+            upsampler = PolyphaseResampler(rate, 1, self.resample_quality, cutoff=1.0 / approach)
+
+        # 输出时间轴扣除第一个输入样本的传播时延 D0；实际时延在 [最近点时延, max_distance/c) 之间
+        offset = float(self._distance(0.0)) / self.sound_speed
+        nearest = self.max_distance * np.tanh(self.closest_distance / self.max_distance) / self.sound_speed
+        # 前瞻：时延最短时比 D0 提前读取的采样点数 + 插值的两个右侧抽样 + 升采样器滤波器的滞后
+        lookahead = int(np.ceil(max(offset - nearest, 0.0) * samplerate)) + 3
+        if upsampler is not None:
+            lookahead += upsampler.half_len // rate + 2
+        # 历史：时延最长时比 D0 滞后读取的采样点数 + 插值的左侧抽样
+        backlog = int(np.ceil((self.max_distance / self.sound_speed - offset) * samplerate)) + 2
+        return {
+            "history": np.zeros((num_channels, 0), dtype=float_dtype()),  # 过采样后的输入历史
+            "history_start": 0,  # history[:, 0] 的过采样序号
+            "received": 0,  # 已收到的输入采样点数
+            "position": 0,  # 下一个输出采样点的绝对序号（原始抽样率）
+            "final": False,  # 输入是否已结束
+            "offset": offset,
+            "lookahead": lookahead,
+            "backlog": backlog,
+            "upsampler": upsampler,
+        }
+
+    @staticmethod
+    def _feed(state, block):
+        """新输入（升采样后）接在历史后面"""
+        block = np.asarray(block, dtype=float_dtype())
+        fresh = block if state["upsampler"] is None else state["upsampler"].process(block)
+        state["history"] = np.concatenate([state["history"], fresh], axis=-1)
+        state["received"] += block.shape[-1]
+
+    @staticmethod
+    def _finish_input(state):
+        """输入结束：取出升采样器滤波器里剩余的输出，之后超出末尾的读取按静音处理"""
+        if state["upsampler"] is not None:
+            tail = state["upsampler"].flush()
+            if tail is not None:
+                state["history"] = np.concatenate([state["history"], tail], axis=-1)
+        state["final"] = True
 
-            processed_channels.append(processed_chan)
+    def _emit(self, state, stop, samplerate, out=None):
+        """渲染输出序号 [position, stop)，然后丢掉之后再也用不到的历史"""
+        start = state["position"]
+        length = max(stop - start, 0)
+        if out is None:
+            out = np.empty((state["history"].shape[0], length), dtype=float_dtype())
+        self._render(state, start, length, samplerate, out)
+        state["position"] = start + length
 
-        # 转换为numpy数组，保持与输入一致的格式
-        return np.array(processed_channels)
+        keep_from = int(self.oversample_rate) * (state["position"] - state["backlog"]) - state["history_start"]
+        if keep_from > 0:
+            state["history"] = state["history"][:, keep_from:].copy()
+            state["history_start"] += keep_from
+        return out
 
     def get_params(self):
         """
-        获取当前处理器所有参数（含数字基带系统关键参数）
+        获取当前处理器所有参数
         便于调试与参数展示，体现对理论参数的工程化控制
         """
+        approach, recede = self.doppler_factors()
         return {
             # 多普勒效应参数
-            "relative_speed(m/s)": self.speed,
+            "source_speed(m/s)": self.speed,
             "sound_speed(m/s)": self.sound_speed,
-            "initial_freq_range(Hz)": self.freq_shift_range,
-            # 数字基带系统参数（重点标注）
-            "oversample_enable": self.oversample_enable,
+            "closest_distance(m)": self.closest_distance,
+            "pass_time(s)": self.pass_time,
+            "max_distance(m)": self.max_distance,
+            "approach_factor": round(approach, 4),  # 驶近时的频率缩放（近似值，受 max_distance 平滑影响）
+            "recede_factor": round(recede, 4),
+            "initial_delay(ms)": round(1000 * float(self._distance(0.0)) / self.sound_speed, 1),  # 已从输出中扣除
+            "max_delay(ms)": round(1000 * self.max_distance / self.sound_speed, 1),
             "oversample_rate": self.oversample_rate,
             "nyquist_freq(Hz)": self.sample_rate / 2 if self.sample_rate else None  # 奈奎斯特频率实时计算
         }
@@ -176,16 +301,17 @@ class DopplerEffect(AudioEffect):
     def set_params(self, **kwargs):
         """
         动态调整处理器参数（支持运行中修改）
-        工程化设计：方便测试不同参数下的效果（如不同速度、过采样倍数）
+        工程化设计：方便测试不同参数下的效果（如不同速度、最近距离、过采样倍数）
         """
-        for param_name, param_value in kwargs.items():
+        for param_name, param_value in self._handle_removed_params(kwargs).items():
             if hasattr(self, param_name):
                 # 对关键参数添加合理性约束
                 if param_name == "speed":
                     # 相对速度限制在±100m/s（避免极端值导致频率失真）
                     param_value = np.clip(param_value, -100, 100)
                 elif param_name == "oversample_rate":
-                    # 过采样倍数限制为2的幂次（基带系统工程常用值）
-                    valid_rates = [1, 2, 4, 8, 16]
-                    param_value = param_value if param_value in valid_rates else 4
+                    # 过采样倍数限制为常用值
+                    valid_rates = [1, 2, 4, 8]
+                    param_value = param_value if param_value in valid_rates else 2
                 setattr(self, param_name, param_value)
+        self._validate()
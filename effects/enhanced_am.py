@@ -1,6 +1,9 @@
 import numpy as np
-from scipy.signal import butter, lfilter, hilbert
+from scipy.signal import hilbert
 from .base import AudioEffect  # 适配effects文件夹的相对导入
+from .carrier_recovery import CostasLoop, recover_carrier, synthesize_carrier
+from .filters import design_sos, sosfilt_stateful
+from .precision import float_dtype
 
 
 class EnhancedAMEffect(AudioEffect):
@@ -10,7 +13,7 @@ class EnhancedAMEffect(AudioEffect):
              包含完整的“预处理→调制→信道噪声→解调→后处理”链路
     关联通信原理知识点：
     1. 模拟调制：AM/DSB-SC/SSB调制公式与频谱特性
-    2. 载波同步：平方律检波载波恢复、相位调整
+    2. 载波同步：平方律检波载波恢复、Costas 环相位跟踪
     3. 信道特性：信噪比（SNR）计算、高斯白噪声模拟
     4. 信号预处理：预加重/去加重（补偿信道高频损耗）
     """
@@ -26,52 +29,81 @@ class EnhancedAMEffect(AudioEffect):
         self.noise_snr = 35
         self.carrier_sync_tol = 0.01
         self.pre_emphasis = True
+        self._stream_states = None  # 流式模式下每个声道的滤波器/振荡器状态
 
         # 2. 从 kwargs 中提取参数并覆盖默认值（关键步骤）
         for key, value in kwargs.items():
             if hasattr(self, key):  # 只处理类中已定义的属性
                 setattr(self, key, value)
 
-    def _preprocess_audio(self, audio_wave):
+    def _filter(self, kind, order, cutoff, x, state=None, key=None):
+        """
+        Butterworth 滤波：设计结果按参数缓存（不再每次调用都重新设计），以 SOS 形式滤波；
+        流式模式下（state 不为 None）保存/恢复滤波器状态，使相邻音频块的结果与整段滤波完全一致
+        """
+        sos = design_sos(kind, order, cutoff, self.sample_rate)
+        return sosfilt_stateful(sos, x, state, key)
+
+    def _running_peak(self, x, state=None, key=None):
+        """整段模式返回全局峰值；流式模式返回到目前为止的峰值（只增不减）"""
+        peak = np.max(np.abs(x)) if len(x) else 0.0
+        if state is None:
+            return peak
+        state[key] = max(state.get(key, 0.0), peak)
+        return state[key]
+
+    def _preprocess_audio(self, audio_wave, state=None):
         """
         音频预处理：归一化 + 预加重
         知识点应用：峰值归一化（避免过调制）、预加重（补偿信道高频衰减）
         """
         # 1. 峰值归一化（压缩到[-1,1]，防止过调制失真）
-        peak = np.max(np.abs(audio_wave))
+        peak = self._running_peak(audio_wave, state, 'input_peak')
         if peak != 0:
             audio_wave = audio_wave / peak
 
         # 2. 预加重：一阶高通滤波（3kHz截止，提升高频分量）
         if self.pre_emphasis:
-            b, a = butter(1, 3000, btype='highpass', fs=self.sample_rate)
-            audio_wave = lfilter(b, a, audio_wave)
+            audio_wave = self._filter('highpass', 1, 3000, audio_wave, state, 'pre_emphasis')
 
         return audio_wave
 
-    def _generate_carrier(self, length):
+    def _carrier_start(self, length, state=None):
+        """载波的起始样本序号：流式模式下从上一块结束的样本位置继续，保证载波相位连续"""
+        start = 0 if state is None else state.get('sample_pos', 0)
+        if state is not None:
+            state['sample_pos'] = start + length
+        return start
+
+    def _generate_carrier(self, length, state=None):
         """
         生成带同步误差的载波信号
         知识点应用：正弦载波公式、载波同步误差模拟（频率/相位偏移）
         """
-        # 生成时间轴（覆盖音频时长）
-        t = np.linspace(0, length / self.sample_rate, length, endpoint=False)
+        # 起始样本序号（覆盖音频时长）
+        start = self._carrier_start(length, state)
 
         # 模拟载波同步误差：频率偏移（±1%）+ 相位偏移（0~2π）
-        freq_offset = self.carrier_freq * self.carrier_sync_tol * np.random.uniform(-1, 1)
-        phase_offset = np.random.uniform(0, 2 * np.pi)
+        # 流式模式下误差只抽取一次，整条音频流共用同一个"振荡器"
+        if state is not None and 'carrier_offsets' in state:
+            freq_offset, phase_offset = state['carrier_offsets']
+        else:
+            freq_offset = self.carrier_freq * self.carrier_sync_tol * self.rng.uniform(-1, 1)
+            phase_offset = self.rng.uniform(0, 2 * np.pi)
+            if state is not None:
+                state['carrier_offsets'] = (freq_offset, phase_offset)
 
         # 生成载波信号：c(t) = cos(2π(fc+Δf)t + φ)
-        carrier = np.cos(2 * np.pi * (self.carrier_freq + freq_offset) * t + phase_offset)
+        carrier = synthesize_carrier(self.carrier_freq + freq_offset, phase_offset, start, length, self.sample_rate)
         return carrier
 
-    def _am_modulate(self, audio_wave):
+    def _am_modulate(self, audio_wave, state=None):
         """
         多模式AM调制：standard/DSB-SC/SSB
         知识点应用：三种AM调制的核心公式，直接对应通信原理教材理论
         """
         length = len(audio_wave)
-        carrier = self._generate_carrier(length)  # 生成载波
+        carrier = self._generate_carrier(length, state)  # 生成载波
 
         # 1. 标准AM调制：s_AM(t) = (1 + m×s(t))×cos(2πfc t)
         if self.am_mode == "standard":
@@ -86,42 +118,31 @@ class EnhancedAMEffect(AudioEffect):
             analytic_signal = hilbert(audio_wave)  # 希尔伯特变换获取解析信号
             dsb_modulated = self.modulation_index * analytic_signal * carrier
             # 低通滤波提取单边带（截止频率=载波频率）
-            b, a = butter(2, self.carrier_freq, btype='lowpass', fs=self.sample_rate)
-            modulated = lfilter(b, a, dsb_modulated).real
+            modulated = self._filter('lowpass', 2, self.carrier_freq, dsb_modulated, state, 'ssb_lowpass').real
 
         # 2. 模拟信道噪声（基于SNR计算噪声功率）
         signal_power = np.mean(np.square(modulated))
         noise_power = signal_power / (10 ** (self.noise_snr / 10))  # SNR→噪声功率
-        noise = np.sqrt(noise_power) * np.random.randn(length)  # 高斯白噪声
+        noise = np.sqrt(noise_power) * self.rng.standard_normal(length, dtype=float_dtype())  # 高斯白噪声
         modulated += noise
 
         return modulated
 
-    def _carrier_recovery(self, modulated_wave):
+    def _carrier_recovery(self, modulated_wave, state=None):
         """
-        载波恢复：平方律检波法（针对DSB-SC/SSB无载波信号）
-        知识点应用：平方律检波提取2倍载波频率，二分频还原原始载波
+        载波恢复（针对DSB-SC/SSB无载波信号）
+        知识点应用：平方律检波提取2倍载波频率谱线，二分频还原原始载波；锁相环（Costas 环）跟踪相位
+        整段模式：平方信号的 FFT 找 2fc 谱线 + 分段相关拟合频率与相位，O(N log N)
+        流式模式：Costas 环逐块跟踪，相位在块之间连续，O(N)
         """
-        # 1. 平方律检波：s²(t) = [m×s(t)×cos(2πfc t)]² = (m²s²(t)/2)×[1 + cos(4πfc t)]
-        squared = np.square(modulated_wave)
-
-        # 2. 窄带带通滤波：提取2fc分量（中心频率=2fc，带宽=200Hz）
-        b, a = butter(2, [2 * self.carrier_freq - 100, 2 * self.carrier_freq + 100],
-                      btype='bandpass', fs=self.sample_rate)
-        filtered = lfilter(b, a, squared)
-
-        # 3. 二分频：2fc→fc，恢复原始载波频率
-        t = np.linspace(0, len(filtered) / self.sample_rate, len(filtered))
-        recovered_carrier = np.cos(np.cumsum(2 * np.pi * 2 * self.carrier_freq * t) * 0.5)
-
-        # 4. 相位调整：互相关找到最佳相位偏移
-        cross_corr = np.correlate(modulated_wave, recovered_carrier, mode='same')
-        phase_shift = np.argmax(cross_corr) * (2 * np.pi / len(cross_corr))
-        recovered_carrier = np.cos(2 * np.pi * self.carrier_freq * t + phase_shift)
-
-        return recovered_carrier
-
-    def _am_demodulate(self, modulated_wave):
+        if state is None:
+            return recover_carrier(modulated_wave, self.sample_rate, self.carrier_freq, self.carrier_sync_tol)
+        loop = state.get('costas')
+        if loop is None:
+            loop = state['costas'] = CostasLoop(self.sample_rate, self.carrier_freq, self.carrier_sync_tol)
+        return loop.process(modulated_wave)
+
+    def _am_demodulate(self, modulated_wave, state=None):
         """
         多模式AM解调：包络检波（standard）/同步检波（DSB-SC/SSB）
         知识点应用：包络检波（无需同步）、同步检波（无载波信号必备）
@@ -130,26 +151,31 @@ class EnhancedAMEffect(AudioEffect):
         if self.am_mode == "standard":
             rectified = np.abs(modulated_wave)  # 半波整流提取包络
             # 低通滤波：提取包络（截止频率=5kHz，覆盖音频最高频率）
-            b, a = butter(2, 5000, btype='lowpass', fs=self.sample_rate)
-            demodulated = lfilter(b, a, rectified)
-            demodulated -= np.mean(demodulated)  # 去除直流分量
+            demodulated = self._filter('lowpass', 2, 5000, rectified, state, 'envelope_lowpass')
+            # 去除直流分量（流式模式下用累计均值近似全局均值）
+            if state is None:
+                demodulated -= np.mean(demodulated)
+            else:
+                state['dc_sum'] = state.get('dc_sum', 0.0) + np.sum(demodulated)
+                state['dc_count'] = state.get('dc_count', 0) + len(demodulated)
+                demodulated = demodulated - state['dc_sum'] / max(state['dc_count'], 1)
 
         # 2. DSB-SC/SSB：同步检波（需先恢复载波）
         else:
-            recovered_carrier = self._carrier_recovery(modulated_wave)
+            recovered_carrier = self._carrier_recovery(modulated_wave, state)
             multiplied = modulated_wave * recovered_carrier  # 相乘解调
             # 低通滤波提取低频调制分量
-            b, a = butter(2, 5000, btype='lowpass', fs=self.sample_rate)
-            demodulated = lfilter(b, a, multiplied)
+            demodulated = self._filter('lowpass', 2, 5000, multiplied, state, 'sync_lowpass')
             demodulated = demodulated * 2 / self.modulation_index  # 幅度补偿
 
         # 3. 去加重：补偿预加重，还原音频频响
         if self.pre_emphasis:
-            b, a = butter(1, 3000, btype='lowpass', fs=self.sample_rate)
-            demodulated = lfilter(b, a, demodulated)
+            demodulated = self._filter('lowpass', 1, 3000, demodulated, state, 'de_emphasis')
 
         # 4. 归一化：避免幅度异常
-        demodulated = demodulated / np.max(np.abs(demodulated))
+        peak = self._running_peak(demodulated, state, 'output_peak')
+        if peak != 0:
+            demodulated = demodulated / peak
         return demodulated
 
     # 核心process方法（严格匹配基类接口：audio, samplerate）
@@ -161,18 +187,33 @@ class EnhancedAMEffect(AudioEffect):
         :return: 处理后的音频波形，shape与输入一致
         """
         self.sample_rate = samplerate  # 覆盖默认采样率
-        processed_wave = []
 
-        # 对每个声道单独处理
-        for chan in audio:
-            # 完整链路：预处理→调制→解调
-            preprocessed = self._preprocess_audio(chan)
-            modulated = self._am_modulate(preprocessed)
-            demodulated = self._am_demodulate(modulated)
+        # 对每个声道单独处理（声道调度器并行执行）
+        return self.map_channels(self._process_channel, audio)
+
+    def process_into(self, audio, out, samplerate):
+        """与 process 相同，各声道结果直接写进 out"""
+        self.sample_rate = samplerate
+        return self.map_channels(self._process_channel, audio, out=out)
+
+    def _process_channel(self, chan, state=None):
+        """单声道完整链路：预处理→调制→解调（state 为该声道的流式状态）"""
+        preprocessed = self._preprocess_audio(chan, state)
+        modulated = self._am_modulate(preprocessed, state)
+        return self._am_demodulate(modulated, state)
 
-            processed_wave.append(demodulated)
+    def reset(self):
+        self._stream_states = None
+
+    def process_block(self, block, samplerate):
+        """
+        流式接口：逐块调制解调，滤波器状态、载波相位、归一化峰值在块之间延续
+        """
+        self.sample_rate = samplerate
+        if self._stream_states is None:
+            self._stream_states = [{} for _ in range(len(block))]
 
-        return np.array(processed_wave)
+        return self.map_channels(self._process_channel, block, self._stream_states)
 
     def get_params(self):
         """获取AM效果器参数（便于调试/参数调整）"""
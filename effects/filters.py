@@ -0,0 +1,52 @@
+"""
+共享的 IIR 滤波器设计缓存 + 带状态的二阶节 (SOS) 滤波
+
+- design_sos：Butterworth 设计按 (类型, 阶数, 截止频率, 抽样率) 记忆化，
+  同样的滤波器在所有效果器、所有声道、所有音频块之间只设计一次
+- 以二阶节级联 (second-order sections) 保存：窄带/高阶滤波器用 (b, a) 形式时
+  系数对舍入误差很敏感，SOS 形式数值上稳定得多
+- sosfilt_stateful：整段模式直接滤波；流式模式把每一级的状态 zi 存进调用方的（每声道一份）状态字典，
+  相邻音频块的结果与整段滤波完全一致
+"""
+import functools
+
+import numpy as np
+import scipy.signal
+
+from .precision import float_dtype
+
+
+@functools.lru_cache(maxsize=128)
+def _design_sos(kind, order, cutoff, fs):
+    # 所有调用方共享同一份系数，不要原地修改
+    # （不能标记为只读：scipy 的 sosfilt 要求可写的系数缓冲区）
+    return scipy.signal.butter(order, cutoff, btype=kind, fs=fs, output='sos')
+
+
+def design_sos(kind, order, cutoff, fs):
+    """
+    Butterworth 滤波器的 SOS 系数（float64，按参数缓存，共享只读使用）
+    :param kind: 'lowpass' / 'highpass' / 'bandpass' / 'bandstop'
+    :param cutoff: 截止频率 (Hz)；带通/带阻为 (低, 高)
+    :param fs: 抽样率 (Hz)
+    """
+    if np.ndim(cutoff):
+        cutoff = tuple(float(c) for c in cutoff)
+    else:
+        cutoff = float(cutoff)
+    return _design_sos(kind, int(order), cutoff, float(fs))
+
+
+def sosfilt_stateful(sos, x, state=None, key=None):
+    """
+    sosfilt 封装：流式模式下（state 不为 None）按 key 保存/恢复滤波器状态 zi
+    系数保持 float64 以保证窄带滤波器稳定，实数输出再转回全局精度（复数输入保持复数）
+    """
+    out_dtype = np.result_type(x, float_dtype())
+    if state is None:
+        return scipy.signal.sosfilt(sos, x).astype(out_dtype, copy=False)
+    zi = state.get(key)
+    if zi is None:
+        zi = np.zeros((sos.shape[0], 2), dtype=np.result_type(x, sos))
+    y, state[key] = scipy.signal.sosfilt(sos, x, zi=zi)
+    return y.astype(out_dtype, copy=False)
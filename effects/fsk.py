@@ -1,6 +1,9 @@
 import numpy as np
-from scipy.signal import butter, lfilter, hilbert
 from .base import AudioEffect  # 适配effects文件夹的相对导入
+from .filters import design_sos, sosfilt_stateful
+from .fsk_modem import (CHUNK_SIZE, CPFSKModulator, FSKDetector, bit_chunks, bit_lengths, bits_to_levels,
+                        complete_bits, per_bit_mean)
+from .precision import float_dtype
 
 
 class FSKEffect(AudioEffect):
@@ -10,7 +13,7 @@ class FSKEffect(AudioEffect):
     关联通信原理知识点：
     1. 数字调制：FSK基本原理（不同频率载波代表0/1比特）
     2. 数模转换：音频信号的比特化抽样、量化
-    3. 载波同步：FSK解调的频率检测、比特同步
+    3. 非相干解调：FSK解调的频率（能量）检测、比特同步
     4. 滤波：带通滤波提取载波频率，低通滤波还原音频
     """
 
@@ -28,92 +31,106 @@ class FSKEffect(AudioEffect):
         self.normalize = True  # 音频归一化（避免调制时幅度失真）
         self.noise_level = 0.001  # 模拟信道噪声强度（0~1）
 
-    def _audio_to_bits(self, audio_wave, samplerate):
+        # 3. 流式模式状态（每个声道一份：未凑满一个比特的样本、判决阈值统计、滤波器状态）
+        self._stream_states = None
+
+    def _audio_to_bits(self, audio_wave, samplerate, state=None, final=True):
         """
         音频信号→数字比特流（数模转换核心步骤）
         知识点应用：抽样定理、量化编码、比特率匹配
+        每个比特 fs/Rb 个采样点可以不是整数（44100/1200 = 36.75），比特边界按绝对位置取整
+        :param final: 最后不满一个比特的样本是否也算作一个比特（整段模式与 flush 时为 True）
+        :return: (bits, bit_lengths)，bit_lengths 为每个比特的采样点数
         """
-        # 1. 音频归一化（避免幅度超界）
+        # 1. 按比特切分（比特序号在流式模式下跨块累计，保证比特边界与整段处理一致）
+        first_bit = 0 if state is None else state.get('bit_pos', 0)
+        lengths = bit_lengths(first_bit, len(audio_wave), samplerate, self.bit_rate)
+        if not final:
+            lengths = lengths[:complete_bits(first_bit, len(audio_wave), samplerate, self.bit_rate)]
+        if state is not None:
+            state['bit_pos'] = first_bit + len(lengths)
+
+        # 2. 每帧平均幅度（按批计算，不生成整段的绝对值数组）
+        frame_energy = np.concatenate(
+            [np.zeros(0)] + [per_bit_mean(np.abs(audio_wave[start:stop]), lengths[first:last])
+                             for first, last, start, stop in bit_chunks(lengths)])
+
+        # 3. 音频归一化（避免幅度超界）：平均幅度与幅度成正比，直接缩放帧能量，不复制整段音频
         if self.normalize:
-            audio_wave = audio_wave / np.max(np.abs(audio_wave))
-
-        # 2. 计算每个比特对应的采样点数（比特率→采样点映射）
-        samples_per_bit = int(samplerate / self.bit_rate)
-
-        # 3. 音频信号分帧（每帧对应1个比特）
-        # 补零使音频长度为samples_per_bit的整数倍
-        pad_len = (samples_per_bit - len(audio_wave) % samples_per_bit) % samples_per_bit
-        padded_wave = np.pad(audio_wave, (0, pad_len), mode='constant')
-
-        # 4. 帧能量量化为比特（能量>0为1，≤0为0，简化版编码）
-        frames = np.reshape(padded_wave, (-1, samples_per_bit))
-        frame_energy = np.mean(np.abs(frames), axis=1)  # 计算每帧能量
-        bits = (frame_energy > np.mean(frame_energy)).astype(int)  # 能量阈值分割为0/1
-
-        return bits, samples_per_bit
-
-    def _fsk_modulate(self, bits, samples_per_bit, samplerate):
+            peak = max(float(audio_wave.max()), -float(audio_wave.min())) if len(audio_wave) else 0.0
+            if state is not None:
+                state['input_peak'] = peak = max(state.get('input_peak', 0.0), peak)
+            if peak != 0:
+                frame_energy /= peak
+
+        # 4. 帧能量量化为比特（能量>阈值为1，否则为0，简化版编码）
+        if state is None:
+            threshold = np.mean(frame_energy) if len(frame_energy) else 0.0
+        else:
+            # 流式模式：阈值取到目前为止所有帧能量的累计均值
+            state['energy_sum'] = state.get('energy_sum', 0.0) + np.sum(frame_energy)
+            state['energy_count'] = state.get('energy_count', 0) + len(frame_energy)
+            threshold = state['energy_sum'] / max(state['energy_count'], 1)
+        bits = (frame_energy > threshold).astype(np.int8)  # 能量阈值分割为0/1
+
+        return bits, lengths
+
+    def _fsk_modulate(self, bits, bit_lengths, samplerate, state=None):
         """
         FSK调制：数字比特流→FSK载波信号
-        知识点应用：FSK调制公式 s(t) = A×cos(2πf_bit×t)
+        知识点应用：相位连续 FSK (CPFSK)，s(t) = A×cos(φ(t))，φ 的斜率 2πf_bit 随比特切换，φ 本身连续
+        相位由累加器向量化生成，不再逐比特拼接
         """
-        # 1. 生成时间轴（每个比特对应的时间点）
-        t_bit = np.linspace(0, samples_per_bit / samplerate, samples_per_bit, endpoint=False)
-
-        # 2. 生成FSK载波（逐比特拼接）
-        modulated = []
-        for bit in bits:
-            # 选择对应频率的载波：0→freq0，1→freq1
-            freq = self.freq0 if bit == 0 else self.freq1
-            # 生成单比特载波信号
-            bit_wave = np.cos(2 * np.pi * freq * t_bit)
-            modulated.extend(bit_wave)
-
-        # 3. 转换为numpy数组并添加信道噪声
-        modulated_wave = np.array(modulated)
-        noise = self.noise_level * np.random.randn(len(modulated_wave))  # 高斯白噪声
-        modulated_wave += noise
+        modulator = None if state is None else state.get('modulator')
+        if modulator is None:
+            modulator = CPFSKModulator(self.freq0, self.freq1, samplerate)
+            if state is not None:
+                state['modulator'] = modulator  # 流式模式：相位在块之间延续
+        modulated_wave = modulator.modulate(bits, bit_lengths)
+
+        # 添加信道噪声：高斯白噪声按批生成、原地叠加，不分配整段的噪声数组
+        for start in range(0, len(modulated_wave), CHUNK_SIZE):
+            segment = modulated_wave[start:start + CHUNK_SIZE]
+            noise = self.rng.standard_normal(len(segment), dtype=float_dtype())
+            noise *= self.noise_level
+            segment += noise
 
         return modulated_wave
 
-    def _fsk_demodulate(self, modulated_wave, samples_per_bit, samplerate):
+    def _fsk_demodulate(self, modulated_wave, bit_lengths, samplerate, state=None, final=True):
         """
         FSK解调：FSK载波信号→数字比特流→还原音频
-        知识点应用：希尔伯特变换提取瞬时频率、比特判决、数模还原
+        知识点应用：非相干检测（每个比特内分别与 freq0/freq1 做单频点 DFT，比较能量）、比特判决、数模还原
+        逐块 O(N)、内存有上界；流式模式下检测器保存跨块的比特累加值
+        :param final: 是否对最后一个不完整的比特做判决（整段模式与 flush 时为 True）
         """
-        # 1. 希尔伯特变换提取解析信号（用于计算瞬时频率）
-        analytic_signal = hilbert(modulated_wave)
-        instantaneous_phase = np.unwrap(np.angle(analytic_signal))
-        instantaneous_freq = np.diff(instantaneous_phase) / (2 * np.pi) * samplerate  # 瞬时频率
-
-        # 补零使瞬时频率长度与原信号一致
-        instantaneous_freq = np.pad(instantaneous_freq, (0, 1), mode='edge')
-
-        # 2. 分帧判决比特（每帧平均频率靠近freq0为0，靠近freq1为1）
-        frames = np.reshape(instantaneous_freq, (-1, samples_per_bit))
-        frame_freq = np.mean(frames, axis=1)
-
-        # 比特判决：计算与两个载波频率的距离
-        dist0 = np.abs(frame_freq - self.freq0)
-        dist1 = np.abs(frame_freq - self.freq1)
-        bits = (dist1 < dist0).astype(int)
-
-        # 3. 比特流→音频信号（简化版：1→正幅度，0→负幅度）
-        reconstructed = []
-        for bit in bits:
-            # 生成单比特对应的音频帧
-            bit_amp = 0.5 if bit == 1 else -0.5
-            bit_wave = np.full(samples_per_bit, bit_amp)
-            reconstructed.extend(bit_wave)
-
-        # 4. 低通滤波还原音频（滤除载波高频）
-        # 设计低通滤波器（截止频率=音频最高频率，此处取4kHz）
-        b, a = butter(2, 4000, btype='lowpass', fs=samplerate)
-        demodulated_wave = lfilter(b, a, np.array(reconstructed))
-
-        # 5. 归一化并裁剪至原音频长度
-        demodulated_wave = demodulated_wave / np.max(np.abs(demodulated_wave))
-        demodulated_wave = demodulated_wave[:len(self._original_wave)]  # 匹配原音频长度
+        # 1~2. 按比特做 freq0/freq1 的能量检测并判决（freq1 的能量更大判为1）
+        detector = None if state is None else state.get('detector')
+        if detector is None:
+            detector = FSKDetector(self.freq0, self.freq1, samplerate, self.bit_rate)
+            if state is not None:
+                state['detector'] = detector
+        bits = detector.process(modulated_wave)
+        if final:
+            bits = np.concatenate([bits, detector.flush()])
+
+        # 3~4. 比特流→音频信号（简化版：1→正幅度，0→负幅度）→ 低通滤波还原音频（滤除载波高频）
+        # 低通滤波器截止频率=音频最高频率，此处取4kHz；设计结果按参数缓存。
+        # 电平展开与滤波按批进行，滤波器状态在批之间（流式模式下还在块之间）延续，结果与一次滤完全相同
+        sos = design_sos('lowpass', 2, 4000, samplerate)
+        filter_state = {} if state is None else state
+        demodulated_wave = np.empty(int(np.sum(bit_lengths)), dtype=float_dtype())
+        for first, last, start, stop in bit_chunks(bit_lengths):
+            reconstructed = bits_to_levels(bits[first:last], bit_lengths[first:last])
+            demodulated_wave[start:stop] = sosfilt_stateful(sos, reconstructed, filter_state, 'lowpass_zi')
+
+        # 5. 归一化
+        # max/min 代替 max(abs)：不生成整段的绝对值数组
+        peak = max(float(demodulated_wave.max()), -float(demodulated_wave.min())) if len(demodulated_wave) else 0.0
+        if state is not None:
+            state['output_peak'] = peak = max(state.get('output_peak', 0.0), peak)
+        if peak != 0:
+            demodulated_wave /= peak
 
         return demodulated_wave
 
@@ -125,23 +142,57 @@ class FSKEffect(AudioEffect):
         :param samplerate: 输入音频抽样率（Hz）
         :return: 处理后的音频波形，shape与输入一致
         """
-        processed_wave = []
-        self._original_wave = None  # 缓存原始波形（用于解调后长度匹配）
-
-        # 对每个声道单独处理
-        for chan in audio:
-            self._original_wave = chan  # 缓存当前声道波形
-            # 步骤1：音频→比特流
-            bits, samples_per_bit = self._audio_to_bits(chan, samplerate)
-            # 步骤2：比特流→FSK调制
-            modulated = self._fsk_modulate(bits, samples_per_bit, samplerate)
-            # 步骤3：FSK调制→还原音频
-            demodulated = self._fsk_demodulate(modulated, samples_per_bit, samplerate)
-
-            processed_wave.append(demodulated)
-
-        # 转换为numpy数组，保持与输入一致的格式
-        return np.array(processed_wave)
+        # 对每个声道单独处理（声道调度器并行执行），结果保持与输入一致的格式
+        return self.map_channels(lambda chan: self._process_channel(chan, samplerate), audio)
+
+    def process_into(self, audio, out, samplerate):
+        """与 process 相同，各声道结果直接写进 out"""
+        return self.map_channels(lambda chan: self._process_channel(chan, samplerate), audio, out=out)
+
+    def _process_channel(self, chan, samplerate):
+        """单声道完整链路：音频→比特流→FSK调制→还原音频（输出与输入等长）"""
+        # 步骤1：音频→比特流
+        bits, bit_lengths = self._audio_to_bits(chan, samplerate)
+        # 步骤2：比特流→FSK调制
+        modulated = self._fsk_modulate(bits, bit_lengths, samplerate)
+        # 步骤3：FSK调制→还原音频
+        return self._fsk_demodulate(modulated, bit_lengths, samplerate)
+
+    def _process_stream_chunk(self, chan, samplerate, state, final=False):
+        """
+        流式处理单个声道：只处理凑满整数个比特的样本，余下的留到下一块；
+        final=True 时（flush）把剩余样本当作最后一个（不完整的）比特处理掉
+        """
+        pending = np.concatenate([state.get('pending', np.zeros(0, dtype=float_dtype())), chan])
+        bits, bit_lengths = self._audio_to_bits(pending, samplerate, state, final=final)
+        usable = int(bit_lengths.sum())
+        state['pending'] = pending[usable:]
+        if usable == 0:
+            return pending[:0]
+
+        modulated = self._fsk_modulate(bits, bit_lengths, samplerate, state)
+        return self._fsk_demodulate(modulated, bit_lengths, samplerate, state, final=final)
+
+    def reset(self):
+        self._stream_states = None
+
+    def process_block(self, block, samplerate):
+        """
+        流式接口：比特帧可能跨越块边界，因此输出可能比输入短，
+        剩余样本在后续块或 flush 中输出
+        """
+        if self._stream_states is None:
+            self._stream_states = [{} for _ in range(len(block))]
+        return self.map_channels(lambda chan, state: self._process_stream_chunk(chan, samplerate, state),
+                                 block, self._stream_states)
+
+    def flush(self, samplerate):
+        if self._stream_states is None:
+            return None
+        tail = np.array([self._process_stream_chunk(np.zeros(0, dtype=float_dtype()), samplerate, state, final=True)
+                         for state in self._stream_states])
+        self._stream_states = None
+        return tail
 
     def get_params(self):
         """获取FSK效果器参数（便于调试/参数调整）"""
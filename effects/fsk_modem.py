@@ -0,0 +1,206 @@
+"""
+向量化的 FSK 调制解调基础组件
+
+- 比特边界：第 k 个比特从采样点 ⌊k·fs/Rb⌋ 开始（整数运算，没有累积误差），
+  所以 fs/Rb 不是整数时（44100/1200 = 36.75）每个比特 36 或 37 个采样点，长期比特率严格等于 Rb
+- 按比特的统计（能量、平均频率）用 np.add.reduceat 一次完成，不需要逐比特的 Python 循环
+- CPFSK：相位连续的 FSK。瞬时频率按比特展开后做累加 (cumsum) 得到相位，
+  比特切换时只改变相位的斜率，不会产生相位跳变（频谱旁瓣小得多）；
+  相位在块之间延续，流式输出与整段输出一致
+- 调制、检测、电平展开都按约 CHUNK_SIZE 个采样点一组比特分批进行（bit_chunks），
+  float64 的相位等中间数组只有一批大小，整段处理的额外内存与信号长度无关
+- 非相干检测 (FSKDetector)：每个比特内对 freq0/freq1 各做一次单频点 DFT（Goertzel 的向量化形式），
+  比较两者能量判决。按块处理，跨块的半个比特只保留 4 个累加值，内存与信号长度无关
+"""
+import numpy as np
+
+from .precision import float_dtype
+
+# 一批处理的最大采样点数（至少一个比特）
+CHUNK_SIZE = 65536
+
+
+def bit_boundaries(first_bit, last_bit, samplerate, bit_rate):
+    """比特 first_bit ... last_bit 的起点（绝对采样点序号，含 last_bit 的起点），int64"""
+    k = np.arange(first_bit, last_bit + 1, dtype=np.int64)
+    return k * int(samplerate) // int(bit_rate)
+
+
+def bit_start(bit, samplerate, bit_rate):
+    """第 bit 个比特的起始采样点"""
+    return int(bit) * int(samplerate) // int(bit_rate)
+
+
+def complete_bits(first_bit, frames, samplerate, bit_rate):
+    """从 first_bit 的起点开始、frames 个采样点里包含的完整比特数"""
+    start = bit_start(first_bit, samplerate, bit_rate)
+    # 满足 ⌊(first_bit+j)·fs/Rb⌋ <= start + frames 的最大 j
+    return ((start + frames + 1) * int(bit_rate) - 1) // int(samplerate) - first_bit
+
+
+def bit_lengths(first_bit, frames, samplerate, bit_rate):
+    """
+    把从 first_bit 起点开始的 frames 个采样点切成比特，返回每个比特的采样点数
+    最后一个不完整的比特（如果有）也算一个比特，长度为剩余的采样点数
+    """
+    count = complete_bits(first_bit, frames, samplerate, bit_rate)
+    edges = bit_boundaries(first_bit, first_bit + count, samplerate, bit_rate)
+    edges -= edges[0]
+    lengths = np.diff(edges)
+    if edges[-1] < frames:
+        lengths = np.append(lengths, frames - edges[-1])
+    return lengths
+
+
+def bit_chunks(lengths, chunk_size=CHUNK_SIZE):
+    """
+    把比特按采样点数分批：每批不超过 chunk_size 个采样点（单个比特更长时一批一个比特）
+    :return: 生成 (第一个比特, 最后一个比特+1, 起始采样点, 结束采样点)
+    """
+    ends = np.cumsum(lengths)
+    first, start = 0, 0
+    while first < len(lengths):
+        last = max(int(np.searchsorted(ends, start + chunk_size, side='right')), first + 1)
+        stop = int(ends[last - 1])
+        yield first, last, start, stop
+        first, start = last, stop
+
+
+def per_bit_mean(x, lengths):
+    """每个比特内 x 的平均值（reduceat 一次完成）"""
+    if len(lengths) == 0:
+        return np.zeros(0, dtype=np.result_type(x, float_dtype()))
+    starts = np.concatenate([[0], np.cumsum(lengths[:-1])])
+    return np.add.reduceat(x, starts) / lengths
+
+
+def bits_to_levels(bits, lengths, high=0.5, low=-0.5):
+    """比特流 → 分段常数的电平信号（1→high，0→low），np.repeat 一次展开"""
+    levels = np.where(np.asarray(bits) > 0, high, low).astype(float_dtype())
+    return np.repeat(levels, lengths)
+
+
+class CPFSKModulator:
+    """相位连续 FSK 调制器：s(n) = cos(φ(n))，φ(n+1) = φ(n) + 2π·f_bit/fs"""
+    def __init__(self, freq0, freq1, samplerate):
+        self.freq0 = freq0
+        self.freq1 = freq1
+        self.samplerate = samplerate
+        self.reset()
+
+    def reset(self):
+        self.phase = 0.0  # 下一个采样点的相位（折回 [0, 2π)）
+
+    def modulate(self, bits, lengths):
+        """
+        :param bits: 0/1 比特数组
+        :param lengths: 每个比特的采样点数
+        :return: 已调信号，长度为 lengths 之和
+        """
+        bits = np.asarray(bits)
+        out = np.empty(int(np.sum(lengths)), dtype=float_dtype())
+        for first, last, start, stop in bit_chunks(lengths):
+            out[start:stop] = self._modulate_chunk(bits[first:last], lengths[first:last])
+        return out
+
+    def _modulate_chunk(self, bits, lengths):
+        # 每个采样点的相位增量（按比特展开），累加得到相位；float64 累加保证长音频的相位精度
+        step = np.where(bits > 0, self.freq1, self.freq0) * (2 * np.pi / self.samplerate)
+        increments = np.repeat(step, lengths)
+        phase = np.cumsum(increments)
+        phase -= increments  # 第一个采样点的相位就是当前相位（不含本点的增量）
+        phase += self.phase
+        self.phase = float((phase[-1] + increments[-1]) % (2 * np.pi))
+        np.mod(phase, 2 * np.pi, out=phase)
+        return np.cos(phase.astype(float_dtype()))
+
+
+class FSKDetector:
+    """
+    非相干 FSK 检测器：每个比特内求 C_f = Σ x(i)·cos(2πf·i/fs)、S_f = Σ x(i)·sin(2πf·i/fs)
+    （i 为比特内的样本序号），比较 x 投影到 {cos, sin}_f 张成的子空间上的能量，f1 的能量更大判为 1。
+    只比较能量，与载波的绝对相位无关，不需要载波同步；按块输入，比特可以跨越块边界。
+    比特很短时（4800bps 每比特只有约 9 个采样点）cos 与 sin 不再正交，直接用 C²+S² 会严重误判，
+    因此按比特长度预先算好 Gram 矩阵的逆：E = [C S]·G⁻¹·[C S]ᵀ
+    """
+    def __init__(self, freq0, freq1, samplerate, bit_rate, chunk_size=CHUNK_SIZE):
+        """
+        :param chunk_size: 一次向量化处理的最大采样点数；更长的输入分块处理，中间数组有上界
+        """
+        self.samplerate = int(samplerate)
+        self.bit_rate = int(bit_rate)
+        self.chunk_size = int(chunk_size)
+        # 比特内第 i 个样本的参考正余弦表：行依次为 cos f0, sin f0, cos f1, sin f1
+        max_len = -(-self.samplerate // self.bit_rate) + 1
+        w = 2 * np.pi * np.array([freq0, freq1]) / self.samplerate
+        angles = np.outer(w, np.arange(max_len))
+        cos, sin = np.cos(angles), np.sin(angles)
+        self._table = np.stack([cos[0], sin[0], cos[1], sin[1]])
+        # 按比特长度 l 的二次型系数：E = a·C² + b·C·S + c·S²，shape=(2 个频率, 3, max_len+1)
+        zero = np.zeros((2, 1))
+        cc = np.concatenate([zero, np.cumsum(cos * cos, axis=1)], axis=1)
+        ss = np.concatenate([zero, np.cumsum(sin * sin, axis=1)], axis=1)
+        cs = np.concatenate([zero, np.cumsum(cos * sin, axis=1)], axis=1)
+        det = cc * ss - cs * cs
+        singular = det < 1e-9  # 只有 1 个采样点时 sin 恒为 0：退化为只用 C
+        det = np.where(singular, 1.0, det)
+        self._quadratic = np.stack([np.where(singular, 1 / np.maximum(cc, 1e-12), ss / det),
+                                    np.where(singular, 0.0, -2 * cs / det),
+                                    np.where(singular, 0.0, cc / det)], axis=1)
+        self.reset()
+
+    def reset(self):
+        self._position = 0  # 下一个输入样本的绝对序号
+        self._bit = 0  # 当前（未判决）比特的序号
+        self._partial = np.zeros(4)  # 当前比特已经累加的 4 个相关值
+
+    def process(self, block):
+        """输入一块已调信号，返回本块内完整结束的比特的判决结果（bool 数组）"""
+        block = np.asarray(block)
+        decided = [self._process_chunk(block[i:i + self.chunk_size])
+                   for i in range(0, len(block), self.chunk_size)]
+        return np.concatenate(decided) if decided else np.zeros(0, dtype=bool)
+
+    def flush(self):
+        """输入结束：对最后一个不完整的比特（如果有）做判决"""
+        if self._position == bit_start(self._bit, self.samplerate, self.bit_rate):
+            return np.zeros(0, dtype=bool)
+        length = self._position - bit_start(self._bit, self.samplerate, self.bit_rate)
+        bits = self._decide(self._partial[:, None], np.array([length]))
+        self._bit += 1
+        self._partial = np.zeros(4)
+        return bits
+
+    def _process_chunk(self, x):
+        offset = self._position - bit_start(self._bit, self.samplerate, self.bit_rate)
+        count = complete_bits(self._bit, offset + len(x), self.samplerate, self.bit_rate)
+        # 本块涉及的比特的起点（相对本块开头，第一个可能为负：比特从上一块开始）
+        edges = bit_boundaries(self._bit, self._bit + count, self.samplerate, self.bit_rate) - self._position
+        decided_lengths = np.diff(edges)
+        if edges[-1] >= len(x):
+            edges = edges[:-1]  # 块正好在比特边界结束，没有下一个比特的样本
+        starts = np.maximum(edges, 0)
+        lengths = np.diff(np.append(starts, len(x)))
+
+        # 每个样本在所属比特内的序号 → 查表混频，再按比特 reduceat 累加
+        index = np.arange(len(x)) - np.repeat(edges, lengths)
+        products = self._table[:, index].astype(float_dtype(), copy=False) * x
+        sums = np.add.reduceat(products, starts, axis=1).astype(np.float64)
+        sums[:, 0] += self._partial
+
+        self._position += len(x)
+        self._bit += count
+        if count < len(starts):
+            # 最后一个比特还没结束：累加值留到下一块
+            self._partial = sums[:, -1].copy()
+            sums = sums[:, :-1]
+        else:
+            self._partial = np.zeros(4)
+        return self._decide(sums, decided_lengths)
+
+    def _decide(self, sums, lengths):
+        a0, b0, c0 = self._quadratic[0][:, lengths]
+        a1, b1, c1 = self._quadratic[1][:, lengths]
+        energy0 = a0 * sums[0] ** 2 + b0 * sums[0] * sums[1] + c0 * sums[1] ** 2
+        energy1 = a1 * sums[2] ** 2 + b1 * sums[2] * sums[3] + c1 * sums[3] ** 2
+        return energy1 > energy0
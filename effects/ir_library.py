@@ -0,0 +1,168 @@
+"""
+脉冲响应 (IR) 库：合成 IR 与真实 .wav IR 的统一入口
+
+- 合成 IR（'spring'、'old_radio'）按会话抽样率生成，随机数种子由 (类型, 抽样率) 决定，
+  同样的参数在任何进程里都得到完全相同的 IR（渲染缓存的指纹因此也是可靠的）
+- .wav IR 读入后混成单声道，并重采样到会话抽样率
+- IR 本身和它的分段频谱都按 (来源, 抽样率, 分段长度, ...) 记忆化，所有效果器实例共享；
+  构造再多的混响实例也不需要重新生成或重新做 FFT
+- 可选的磁盘缓存 (set_cache_dir)：频谱以 .npy 存盘、以内存映射读取，
+  批处理的多个工作进程共用操作系统页缓存中的同一份数据
+"""
+import functools
+import os
+import zlib
+
+import numpy as np
+import scipy.io.wavfile
+
+from disk_cache import DiskLRUCache, hash_payload
+
+from .partitioned_convolution import auto_partition_size, partition_spectra
+from .precision import get_precision
+from .resampling import resample_to
+
+_disk_cache = None
+
+
+def set_cache_dir(cache_dir, max_bytes=2 * 1024 ** 3):
+    """启用（或以 None 关闭）IR 频谱的磁盘缓存；批处理时在每个工作进程里调用"""
+    global _disk_cache
+    _disk_cache = None if cache_dir is None else DiskLRUCache(cache_dir, max_bytes, suffix=".npy")
+
+
+# ---------------- 合成 IR ----------------
+
+def _spring_ir(samplerate, rng):
+    # 模拟“弹簧混响”：这是吉他音箱和老式设备常用的，金属感很强
+    length_sec = 2.0
+    t = np.linspace(0, length_sec, int(samplerate * length_sec))
+    # 载波噪声 * 指数衰减
+    noise = rng.standard_normal(len(t))
+    # 弹簧特有的“不断反弹”的颤动感 (Chirp)
+    chirp = np.sin(2 * np.pi * 50 * t * t)
+    envelope = np.exp(-3 * t)  # 衰减包络
+    return noise * chirp * envelope
+
+
+def _old_radio_ir(samplerate, rng):
+    # 模拟“小盒子内部反射”：短、闷
+    length_sec = 0.2
+    t = np.linspace(0, length_sec, int(samplerate * length_sec))
+    noise = rng.standard_normal(len(t))
+    # 这是一个低通滤波特性的极短混响
+    envelope = np.exp(-20 * t)
+    return noise * envelope
+
+
+SYNTHETIC_IRS = {
+    "spring": _spring_ir,
+    "old_radio": _old_radio_ir,
+}
+
+
+def is_ir_file(source):
+    return str(source).lower().endswith(".wav")
+
+
+def source_key(source):
+    """
+    IR 来源的缓存键：合成类型直接用名字；文件加上大小和修改时间，文件被替换后自动失效
+    """
+    if not is_ir_file(source):
+        if source not in SYNTHETIC_IRS:
+            raise ValueError(f"未知的 IR 类型: {source}，可选 {list(SYNTHETIC_IRS)} 或 .wav 文件路径")
+        return str(source)
+    st = os.stat(source)
+    return f"{os.path.abspath(source)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+# ---------------- IR 加载与记忆化 ----------------
+
+def _read_ir_file(path):
+    """读取 .wav IR：转为 [-1, 1] 浮点并混成单声道（IR 对所有声道共用）"""
+    samplerate, data = scipy.io.wavfile.read(path)
+    if data.dtype.kind == 'f':
+        ir = data.astype(np.float64)
+    elif data.dtype == np.uint8:
+        ir = (data.astype(np.float64) - 128) / 128
+    else:
+        ir = data.astype(np.float64) / (1 << (8 * data.dtype.itemsize - 1))
+    if ir.ndim > 1:
+        ir = ir.mean(axis=1)
+    return ir, samplerate
+
+
+@functools.lru_cache(maxsize=32)
+def _load_ir(key, source, samplerate, normalize):
+    if is_ir_file(source):
+        ir, file_rate = _read_ir_file(source)
+        # IR 以 float64 保存，重采样也在 float64 下完成（高质量滤波器组，只做一次）
+        ir = resample_to(ir, file_rate, samplerate, quality="high", dtype=np.float64)
+    else:
+        # 种子由 (类型, 抽样率) 决定：每个进程、每次运行生成的 IR 都一样
+        seed = zlib.crc32(f"{source}:{samplerate}".encode("utf-8"))
+        ir = SYNTHETIC_IRS[source](samplerate, np.random.default_rng(seed))
+
+    if normalize == 'energy':
+        # 单位 L2 范数：湿信号与干信号的能量大致相当，不需要对湿信号做全局扫描
+        ir = ir / (np.sqrt(np.sum(ir ** 2)) + 1e-12)
+    else:
+        # 峰值归一化，防止能量过大
+        ir = ir / (np.max(np.abs(ir)) + 1e-12)
+    ir.flags.writeable = False  # 所有实例共享，禁止原地修改
+    return ir
+
+
+def get_ir(source, samplerate, normalize='peak'):
+    """
+    取得按会话抽样率准备好的 IR（float64，只读，所有调用方共享同一份）
+    :param source: 合成类型名（'spring'、'old_radio'）或 .wav 文件路径
+    :param normalize: 'peak' 峰值归一化到 1；'energy' 归一化到单位 L2 范数
+    """
+    return _load_ir(source_key(source), source, int(samplerate), normalize)
+
+
+@functools.lru_cache(maxsize=32)
+def _load_spectra(key, source, samplerate, normalize, partition_size, precision):
+    ir = _load_ir(key, source, samplerate, normalize)
+    if _disk_cache is None:
+        spectra = partition_spectra(ir, partition_size)
+    else:
+        spectra = _disk_spectra(ir, key, samplerate, normalize, partition_size, precision)
+    spectra.flags.writeable = False
+    return ir, spectra
+
+
+def get_spectra(source, samplerate, normalize='peak', partition_size=None):
+    """
+    取得 IR 及其分段频谱 (ir, H)，供 PartitionedConvolver(ir, partition_size, spectra=H) 使用
+    频谱按 (来源, 抽样率, 归一化方式, 分段长度, 全局精度) 缓存
+    :return: (ir, partition_size, H)
+    """
+    key, samplerate = source_key(source), int(samplerate)
+    if partition_size is None:
+        partition_size = auto_partition_size(len(_load_ir(key, source, samplerate, normalize)))
+    ir, spectra = _load_spectra(key, source, samplerate, normalize, int(partition_size), get_precision())
+    return ir, int(partition_size), spectra
+
+
+def _disk_spectra(ir, key, samplerate, normalize, partition_size, precision):
+    """磁盘缓存的频谱：命中时内存映射读取；未命中时计算并写入（DiskLRUCache 原子写入，并发进程不会读到半个文件）"""
+    cache_key = "ir_" + hash_payload([key, samplerate, normalize, partition_size, precision])
+    path = _disk_cache.get(cache_key)
+    if path is None:
+        spectra = partition_spectra(ir, partition_size)
+        path = _disk_cache.put_array(cache_key, spectra)
+    else:
+        spectra = None
+    try:
+        return np.load(path, mmap_mode='r')
+    except FileNotFoundError:  # 刚写入就被（其他进程的）容量淘汰删掉
+        return partition_spectra(ir, partition_size) if spectra is None else spectra
+
+
+def clear_cache():
+    """清空进程内的记忆化缓存（磁盘缓存不受影响）"""
+    _load_ir.cache_clear()
+    _load_spectra.cache_clear()
@@ -5,9 +5,29 @@ class Normalizer(AudioEffect):
     def __init__(self, target_db=-1.0):
         super().__init__("Safety Normalizer")
         self.target_factor = 10 ** (target_db / 20) # dB转线性幅度
+        self._running_peak = 0.0
 
     def process(self, audio, samplerate):
         max_val = np.max(np.abs(audio))
         if max_val > 0:
             return audio / max_val * self.target_factor
         return audio
+
+    def process_into(self, audio, out, samplerate):
+        # 峰值用 max/min 求，避免 np.abs 生成整段临时数组；增益一次乘进 out
+        max_val = max(float(np.max(audio)), -float(np.min(audio)))
+        if max_val > 0:
+            np.multiply(audio, self.target_factor / max_val, out=out)
+        else:
+            np.copyto(out, audio)
+        return out
+
+    def reset(self):
+        self._running_peak = 0.0
+
+    def process_block(self, block, samplerate):
+        # 流式模式拿不到全局峰值，改用"到目前为止"的峰值（只增不减，保证不削波）
+        self._running_peak = max(self._running_peak, float(np.max(np.abs(block))))
+        if self._running_peak > 0:
+            return block / self._running_peak * self.target_factor
+        return block
@@ -0,0 +1,150 @@
+"""
+均匀分段的 FFT 卷积引擎 (Uniformly Partitioned Overlap-Save, UPOLS)
+
+把 IR 切成 P 段、每段长 B，预先算好每段的频谱 H[p]；输入同样按 B 分块，
+第 k 块输出 = IFFT( Σ_p H[p] · X[k-p] ) 的后半段（重叠保留法），
+X[k-p] 保存在频域延迟线 (FDL) 中，不需要重新做 FFT。
+
+- 内存 O(块 + IR)：只保存上一块输入和 P-1 个历史频谱，与信号总长无关；
+  一次调用输入再长，完整块也按 chunk_size 分批处理，临时数组有上界
+- 所有声道（以及一批中的所有完整块）合并成一次批量 rFFT
+- 零延迟：不满一块的输入也立即输出——未到达的样本按 0 参与本块 FFT，
+  已到达位置的输出已经是精确值；同一块凑满之前每次调用重算一次当前块
+"""
+import numpy as np
+import scipy.fft
+
+from .precision import complex_dtype, float_dtype
+
+
+def auto_partition_size(ir_length, min_size=1024, max_size=16384):
+    """
+    默认分段长度：约为 IR 长度的 1/4，取 2 的幂
+    每个样本的乘加次数约等于分段数 P，分段越长 P 越小；因为有零延迟的不满块处理，
+    分段长度不影响延迟，只影响很小的块（< B）反复重算当前块的开销
+    """
+    size = 1 << max(int(ir_length // 4) - 1, 1).bit_length()
+    return int(min(max(size, min_size), max_size))
+
+
+def partition_spectra(ir, partition_size):
+    """IR 切成长 B 的段，每段补零到 2B 后做 rFFT：返回 H，shape=(P, B+1)"""
+    B = int(partition_size)
+    ir = np.asarray(ir, dtype=float_dtype())
+    P = max(1, -(-len(ir) // B))
+    segments = np.zeros((P, 2 * B), dtype=float_dtype())
+    segments[:, :B].flat[:len(ir)] = ir
+    return scipy.fft.rfft(segments, axis=-1).astype(complex_dtype())
+
+
+class PartitionedConvolver:
+    # 一次批量 FFT 处理的最大样本数（至少一个分段）：整段卷积时的临时数组只有这么大
+    chunk_size = 65536
+
+    def __init__(self, ir, partition_size=None, spectra=None):
+        """
+        :param ir: 脉冲响应，shape=(IR长度,)，所有声道共用
+        :param partition_size: 分段长度 B（也是 FFT 长度的一半）；None 时按 IR 长度自动选择
+        :param spectra: 预先算好的 partition_spectra(ir, partition_size)（如 IR 库中缓存的频谱），
+                        只读使用，多个实例可以共享同一份
+        """
+        if partition_size is None:
+            partition_size = auto_partition_size(len(ir))
+        self.partition_size = int(partition_size)
+        self.ir_length = len(ir)
+        self.H = partition_spectra(ir, self.partition_size) if spectra is None else spectra
+        self.num_partitions = len(self.H)
+        self._num_channels = None
+
+    def reset(self, num_channels=None):
+        """清空所有状态；num_channels 为 None 时在第一次 process 时按输入确定"""
+        self._num_channels = num_channels
+        if num_channels is None:
+            return
+        B, F = self.partition_size, self.partition_size + 1
+        self._prev = np.zeros((num_channels, B), dtype=float_dtype())    # 上一块完整输入
+        self._cur = np.zeros((num_channels, B), dtype=float_dtype())     # 正在填充的当前块
+        self._fill = 0
+        # 频域延迟线：X[k-P+1] ... X[k-1]，最旧的在前
+        self._fdl = np.zeros((self.num_partitions - 1, num_channels, F), dtype=complex_dtype())
+        self._acc_old = None  # 当前块的 Σ_{p≥1} H[p]·X[k-p]，同一块内只算一次
+
+    def process(self, x, out=None):
+        """
+        卷积一段输入并输出等长的结果（块与块之间状态延续）
+        :param x: shape=(通道数, 采样点数)，长度任意
+        :param out: 可选的输出缓冲区，shape 与 x 相同
+        """
+        if self._num_channels != x.shape[0]:
+            self.reset(x.shape[0])
+        if out is None:
+            out = np.empty(x.shape, dtype=float_dtype())
+        B, n, pos = self.partition_size, x.shape[-1], 0
+
+        # 1. 先把上次没填满的块补满（或者用完这次的输入）
+        if self._fill:
+            pos = self._process_partial(x, out, 0, min(B - self._fill, n))
+
+        # 2. 中间所有完整块：按批做批量 FFT + 频域乘加
+        full = (n - pos) // B
+        batch = max(self.chunk_size // B, 1)
+        while full:
+            k = min(full, batch)
+            self._process_full(x[:, pos:pos + k * B], out[:, pos:pos + k * B])
+            pos += k * B
+            full -= k
+
+        # 3. 剩余不满一块的样本：零延迟输出，等待后续输入补满
+        if pos < n:
+            self._process_partial(x, out, pos, n - pos)
+        return out
+
+    def _old_contribution(self):
+        """Σ_{p=1}^{P-1} H[p]·X[k-p]（FDL 中最新的在最后，所以倒序对应 p=1,2,...）"""
+        if self._acc_old is None:
+            if len(self._fdl):
+                self._acc_old = np.einsum('pf,pcf->cf', self.H[1:], self._fdl[::-1])
+            else:
+                self._acc_old = 0
+        return self._acc_old
+
+    def _process_partial(self, x, out, pos, m):
+        """把 x[:, pos:pos+m] 填进当前块，输出这些位置的卷积结果；返回新的 pos"""
+        B, fill = self.partition_size, self._fill
+        self._cur[:, fill:fill + m] = x[:, pos:pos + m]
+        X = scipy.fft.rfft(np.concatenate([self._prev, self._cur], axis=-1), axis=-1)
+        y = scipy.fft.irfft(self.H[0] * X + self._old_contribution(), n=2 * B, axis=-1)
+        out[:, pos:pos + m] = y[:, B + fill:B + fill + m]
+        self._fill = fill + m
+        if self._fill == B:
+            self._push(X[np.newaxis].astype(complex_dtype(), copy=False), self._cur.copy())
+            self._cur[:] = 0
+            self._fill = 0
+        return pos + m
+
+    def _process_full(self, x, out):
+        """K 个完整块：帧视图 (C, K, 2B) 一次 rFFT，再沿 IR 分段做 P 次向量化乘加"""
+        B, P = self.partition_size, self.num_partitions
+        K = x.shape[-1] // B
+        signal = np.concatenate([self._prev, x], axis=-1)
+        frames = np.lib.stride_tricks.sliding_window_view(signal, 2 * B, axis=-1)[:, ::B]  # (C, K, 2B)
+        X = scipy.fft.rfft(frames, axis=-1).astype(complex_dtype(), copy=False).transpose(1, 0, 2)  # (K, C, F)
+
+        # 历史频谱 + 本次的新频谱，Y[i] = Σ_p H[p]·hist[P-1+i-p]
+        hist = np.concatenate([self._fdl, X], axis=0)
+        Y = np.zeros_like(X)
+        for p in range(P):
+            Y += self.H[p] * hist[P - 1 - p:P - 1 - p + K]
+        y = scipy.fft.irfft(Y, n=2 * B, axis=-1)[..., B:]  # (K, C, B)
+        out[...] = y.transpose(1, 0, 2).reshape(x.shape[0], K * B)
+
+        self._fdl = hist[K:] if P > 1 else self._fdl
+        self._prev = np.array(x[:, -B:], dtype=float_dtype())
+        self._acc_old = None
+
+    def _push(self, X, block):
+        """一个块凑满：频谱进入延迟线，原始样本成为下一块的“上一块”"""
+        if len(self._fdl):
+            self._fdl = np.concatenate([self._fdl[1:], X], axis=0)
+        self._prev = block
+        self._acc_old = None
@@ -13,14 +13,23 @@ class PCMBitcrusherStyle(AudioEffect):
         self.quantization_levels = 2 ** bit_depth
 
     def process(self, audio, samplerate):
+        return self.process_into(audio, np.empty_like(audio), samplerate)
+
+    def process_into(self, audio, out, samplerate):
+        # 全部运算都在 out 上原地完成，不产生中间数组
         # 1. 归一化信号到 [0, 1] 区间以便计算
         # (假设输入 audio 范围是 -1 到 1)
-        audio_normalized = (audio + 1.0) / 2.0
+        np.add(audio, 1.0, out=out)
+        out /= 2.0
         
         # 2. 核心量化算法 (Quantization)
         # 将连续的模拟信号映射到离散的台阶上
         # y = floor(x * levels) / levels
-        audio_quantized = np.floor(audio_normalized * self.quantization_levels) / self.quantization_levels
+        out *= self.quantization_levels
+        np.floor(out, out=out)
+        out /= self.quantization_levels
         
         # 3. 还原回 [-1, 1] 区间
-        return audio_quantized * 2.0 - 1.0
\ No newline at end of file
+        out *= 2.0
+        out -= 1.0
+        return out
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+全链路数据类型 (dtype) 策略
+
+Pedalboard 读入的就是 float32，默认让每一级的缓冲区都保持 float32（复数用 complex64），
+内存和带宽都只有 float64 的一半；分析用途可以切换到 float64。
+策略是进程级的全局设置（声道线程池里的线程也能看到），由 AudioPipeline 在运行期间设置。
+"""
+from contextlib import contextmanager
+
+import numpy as np
+
+_DTYPES = {
+    "float32": (np.dtype(np.float32), np.dtype(np.complex64)),
+    "float64": (np.dtype(np.float64), np.dtype(np.complex128)),
+}
+
+_current = "float32"
+
+
+def set_precision(name):
+    """设置全局精度：'float32'（默认）或 'float64'"""
+    global _current
+    if name not in _DTYPES:
+        raise ValueError(f"不支持的精度: {name}，可选 {list(_DTYPES)}")
+    _current = name
+
+
+def get_precision():
+    return _current
+
+
+def float_dtype():
+    """当前策略下的实数 dtype"""
+    return _DTYPES[_current][0]
+
+
+def complex_dtype():
+    """当前策略下的复数 dtype"""
+    return _DTYPES[_current][1]
+
+
+def as_float(audio):
+    """转换为当前策略的实数 dtype；类型已经一致时不复制"""
+    return np.asarray(audio, dtype=float_dtype())
+
+
+@contextmanager
+def precision(name):
+    """临时切换精度：with precision('float64'): ..."""
+    previous = get_precision()
+    set_precision(name)
+    try:
+        yield
+    finally:
+        set_precision(previous)
@@ -1,20 +1,25 @@
-import numpy as np
-from pedalboard import Pedalboard, LowpassFilter, HighpassFilter, Distortion
-from .base import AudioEffect
+from pedalboard import LowpassFilter, HighpassFilter, Distortion
+from .base import PedalboardEffect
+from .precision import float_dtype
+
+class RadioStyle(PedalboardEffect):
+    has_post_process = True
 
-class RadioStyle(AudioEffect):
     def __init__(self, noise_level=0.015):
         super().__init__("AM Radio Style")
         self.noise_level = noise_level
 
-    def process(self, audio, samplerate):
-        board = Pedalboard([
+    def build_plugins(self):
+        return [
             HighpassFilter(cutoff_frequency_hz=300),
             LowpassFilter(cutoff_frequency_hz=3400),
             Distortion(drive_db=10)
-        ])
-        audio = board(audio, samplerate)
-        
-        # 加性高斯白噪声
-        noise = np.random.normal(0, self.noise_level, audio.shape)
-        return audio + noise
+        ]
+
+    def post_process(self, audio, samplerate):
+        # 加性高斯白噪声（按全局精度直接生成，避免 float64 噪声把整段音频提升为 float64）
+        noise = self.rng.standard_normal(audio.shape, dtype=float_dtype())
+        noise *= self.noise_level
+        # audio 是插件链刚生成的数组，原地相加，不再分配新的整段数组
+        audio += noise
+        return audio
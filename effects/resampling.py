@@ -0,0 +1,168 @@
+"""
+多相 (polyphase) 重采样：整段与流式两种接口共用同一组缓存的滤波器组
+
+抽样率变换 up/down = 先插入 up-1 个零，再低通滤波，最后每 down 个点取一个。
+多相结构只计算真正被保留下来的输出点，并且跳过与插入的零相乘的系数，
+计算量是“补零 + 全速率滤波 + 抽取”的 1/(up·down)；低通滤波同时承担插值与抗混叠两个作用。
+
+- 滤波器（Kaiser 窗 sinc）按 (up, down, quality, cutoff) 记忆化，同一比例只设计一次
+- resample / resample_to：整段重采样，走 scipy 的 C 实现 (resample_poly)
+- PolyphaseResampler：流式重采样，保存跨块的输入历史，输出与整段结果一致
+"""
+import functools
+from math import gcd
+
+import numpy as np
+import scipy.signal
+
+from .precision import float_dtype
+
+# 质量档位：(滤波器半长按较低抽样率计的过零点数, Kaiser β)
+QUALITY = {
+    "fast": (8, 5.0),
+    "default": (16, 8.0),
+    "high": (32, 10.0),
+}
+
+
+def rate_ratio(from_rate, to_rate):
+    """抽样率之比化为最简整数比 (up, down)"""
+    g = gcd(int(from_rate), int(to_rate))
+    return int(to_rate) // g, int(from_rate) // g
+
+
+@functools.lru_cache(maxsize=64)
+def design_filter(up, down, quality="default", cutoff=1.0):
+    """
+    线性相位低通原型滤波器（长度 2·half_len+1，未乘 up 的增益）
+    :param cutoff: 相对于 min(原抽样率, 新抽样率) 奈奎斯特频率的截止比例；<1 时留出额外的保护带
+    """
+    if quality not in QUALITY:
+        raise ValueError(f"未知的重采样质量: {quality}，可选 {list(QUALITY)}")
+    zeros, beta = QUALITY[quality]
+    max_rate = max(up, down)
+    half_len = zeros * max_rate
+    h = scipy.signal.firwin(2 * half_len + 1, cutoff / max_rate, window=("kaiser", beta))
+    h.flags.writeable = False
+    return h
+
+
+@functools.lru_cache(maxsize=64)
+def filter_bank(up, down, quality="default", cutoff=1.0):
+    """
+    把原型滤波器按相位拆开：bank[p, i] = up · h[p + i·up]，shape=(up, 每相抽头数)
+    输出第 m 点 = Σ_i bank[p, i] · x[n - i]，其中 j = m·down + half_len，p = j % up，n = j // up
+    """
+    h = design_filter(up, down, quality, cutoff) * up
+    taps = -(-len(h) // up)
+    bank = np.zeros(up * taps)
+    bank[:len(h)] = h
+    bank = bank.reshape(taps, up).T.copy()
+    bank.flags.writeable = False
+    return bank
+
+
+def output_length(frames, up, down):
+    return -(-frames * up // down)
+
+
+def resample(audio, up, down, quality="default", cutoff=1.0, dtype=None):
+    """
+    整段重采样（沿最后一维），输出长度 ceil(N·up/down)
+    :param dtype: 计算与输出的 dtype，默认为全局精度
+    """
+    g = gcd(up, down)
+    up, down = up // g, down // g
+    dtype = float_dtype() if dtype is None else dtype
+    audio = np.asarray(audio, dtype=dtype)
+    if up == down == 1 and cutoff >= 1.0:
+        return audio
+    h = np.asarray(design_filter(up, down, quality, cutoff), dtype=dtype)
+    return scipy.signal.resample_poly(audio, up, down, axis=-1, window=h)
+
+
+def resample_to(audio, from_rate, to_rate, quality="default", dtype=None):
+    """按抽样率重采样，如 resample_to(ir, 48000, 44100)"""
+    return resample(audio, *rate_ratio(from_rate, to_rate), quality=quality, dtype=dtype)
+
+
+class PolyphaseResampler:
+    """
+    流式多相重采样器
+    每个输出点需要 half_len/up 个“未来”的输入样本，因此输出比输入稍有滞后，
+    最后由 flush 补零输出剩余部分；全部块的输出拼起来与 resample() 的结果一致。
+    """
+    def __init__(self, up, down, quality="default", cutoff=1.0):
+        g = gcd(up, down)
+        self.up, self.down = up // g, down // g
+        self.quality = quality
+        self.cutoff = cutoff
+        # 1:1 且不额外限带时什么都不用做，直接透传
+        self.passthrough = self.up == self.down == 1 and cutoff >= 1.0
+        if not self.passthrough:
+            self.bank = filter_bank(self.up, self.down, quality, cutoff)
+            self.half_len = (len(design_filter(self.up, self.down, quality, cutoff)) - 1) // 2
+        self.reset()
+
+    def reset(self):
+        self._buffer = None  # 输入历史，_buffer[:, k] 对应绝对序号 _buffer_start + k
+        self._buffer_start = 0
+        self._frames_in = 0  # 已输入的采样点数
+        self._next_out = 0  # 下一个输出点的序号
+
+    def process(self, block):
+        """输入一块 (通道数, 块长度)，返回目前已经能确定的输出 (通道数, 输出长度)"""
+        block = np.asarray(block, dtype=float_dtype())
+        if self.passthrough:
+            return block
+        if self._buffer is None:
+            # 开头补上一个滤波器长度的零：序号为负的输入视为 0
+            taps = self.bank.shape[1]
+            self._buffer = np.zeros((block.shape[0], taps), dtype=float_dtype())
+            self._buffer_start = -taps
+        self._buffer = np.concatenate([self._buffer, block], axis=-1)
+        self._frames_in += block.shape[-1]
+
+        # 第 m 个输出点需要输入到序号 (m·down + half_len) // up 为止
+        last = self._frames_in - 1
+        stop = (last * self.up + self.up - 1 - self.half_len) // self.down + 1
+        stop = min(max(stop, self._next_out), output_length(self._frames_in, self.up, self.down))
+        return self._emit(stop)
+
+    def flush(self):
+        """输入结束：后面补零，输出剩余的点，使总长度为 ceil(N·up/down)"""
+        if self._buffer is None:
+            return None
+        total = output_length(self._frames_in, self.up, self.down)
+        pad = self.half_len // self.up + 2
+        self._buffer = np.concatenate([self._buffer, np.zeros((self._buffer.shape[0], pad), dtype=float_dtype())],
+                                      axis=-1)
+        out = self._emit(total)
+        return out if out.shape[-1] else None
+
+    def _emit(self, stop):
+        start = self._next_out
+        count = stop - start
+        out = np.empty((self._buffer.shape[0], max(count, 0)), dtype=float_dtype())
+        if count > 0:
+            bank = self.bank.astype(float_dtype(), copy=False)
+            taps = bank.shape[1]
+            # 帧视图：frames[:, k, :] = x[k-taps+1 ... k]（按缓冲区内的下标），不复制
+            frames = np.lib.stride_tricks.sliding_window_view(self._buffer, taps, axis=-1)
+            # 输出点按相位分组：每 up 个输出点相位循环一次，同相位的点对应的输入位置等间隔（步长 down）
+            for r in range(min(self.up, count)):
+                m = start + r
+                j = m * self.down + self.half_len
+                phase, n = j % self.up, j // self.up
+                first = n - taps + 1 - self._buffer_start
+                rows = frames[:, first::self.down][:, :len(range(r, count, self.up))]
+                out[:, r::self.up] = rows @ bank[phase, ::-1]
+            self._next_out = stop
+
+        # 丢掉后续输出不再需要的历史
+        j = self._next_out * self.down + self.half_len
+        keep_from = j // self.up - self.bank.shape[1] + 1 - self._buffer_start
+        if keep_from > 0:
+            self._buffer = self._buffer[:, keep_from:]
+            self._buffer_start += keep_from
+        return out
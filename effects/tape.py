@@ -1,17 +1,16 @@
-from pedalboard import Pedalboard, Chorus, Distortion, LowpassFilter, Compressor
-from .base import AudioEffect
+from pedalboard import Chorus, Distortion, LowpassFilter, Compressor
+from .base import PedalboardEffect
 
-class TapeStyle(AudioEffect):
+class TapeStyle(PedalboardEffect):
     def __init__(self, flutter=0.15, drive=3):
         super().__init__("Vintage Tape Style")
         self.flutter = flutter
         self.drive = drive
 
-    def process(self, audio, samplerate):
-        board = Pedalboard([
+    def build_plugins(self):
+        return [
             Compressor(threshold_db=-10, ratio=2.5),
             Chorus(rate_hz=1.5, depth=self.flutter, mix=0.5),
             Distortion(drive_db=self.drive),
             LowpassFilter(cutoff_frequency_hz=12000),
-        ])
-        return board(audio, samplerate)
+        ]
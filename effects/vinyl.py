@@ -1,26 +1,29 @@
 import numpy as np
-from pedalboard import Pedalboard, LowpassFilter, HighpassFilter, Gain
-from .base import AudioEffect
+from pedalboard import LowpassFilter, HighpassFilter, Gain
+from .base import PedalboardEffect
+from .precision import float_dtype
+
+class VinylStyle(PedalboardEffect):
+    has_post_process = True
 
-class VinylStyle(AudioEffect):
     def __init__(self, crackle_amount=0.001):
         super().__init__("Vinyl Record Style")
         self.crackle_amount = crackle_amount
 
-    def process(self, audio, samplerate):
+    def build_plugins(self):
         # 1. 模拟频响
-        board = Pedalboard([
+        return [
             HighpassFilter(cutoff_frequency_hz=30),
             LowpassFilter(cutoff_frequency_hz=10000),
             Gain(gain_db=2)
-        ])
-        audio = board(audio, samplerate)
+        ]
 
+    def post_process(self, audio, samplerate):
         # 2. 模拟爆豆 (Numpy 逻辑)
-        noise = np.zeros_like(audio)
         # 生成随机布尔遮罩
-        indices = np.random.rand(*audio.shape) < self.crackle_amount
-        # 注入脉冲噪声
-        noise[indices] = np.random.uniform(-0.1, 0.1, np.sum(indices))
+        indices = self.rng.random(audio.shape, dtype=float_dtype()) < self.crackle_amount
+        # 注入脉冲噪声（-0.1 ~ 0.1 均匀分布）
+        # 爆豆是稀疏的，只在遮罩位置原地叠加，不再构造整段的噪声数组
+        audio[indices] += self.rng.random(np.count_nonzero(indices), dtype=float_dtype()) * 0.2 - 0.1
         
-        return audio + noise
+        return audio
@@ -1,7 +1,9 @@
 import os
 import glob
+from pathlib import Path
 from audio_loader import AudioHandler
 from audio_exporter import AudioExporter
+from decode_cache import DecodeCache
 from pipeline import AudioPipeline
 
 # 导入所有独立的原子模块
@@ -46,33 +48,18 @@ def cleanup_directories():
     
     print("✨ 清理完成。")
 
-def main():
-    cleanup_directories()
+# === 在这里像搭积木一样配置 ===
+# (定义为模块级函数，批处理 batch.py 的每个工作进程会调用它们各自构建一份效果链)
 
-    loader = AudioHandler()
-    exporter = AudioExporter()
-    pipeline = AudioPipeline()
-    
-    # mp3文件入口
-    input_file = "./testmp3/test02.mp3"
-    if not os.path.exists(input_file):
-        # 如果没有文件，生成一个静音做测试
-        from pydub import AudioSegment
-        AudioSegment.silent(duration=3000).export(input_file, format="mp3")
-
-    # Step 1: 转 Wav
-    wav_path = loader.convert_mp3_to_wav(input_file)
-    output_wav = wav_path.replace(".wav", "_final.wav")
-    
-    # === 在这里像搭积木一样配置 ===
-    
-    # 1. 配置预处理链 (可以放去水印、降噪等)
-    clean_chain = [
+def build_clean_chain():
+    """1. 配置预处理链 (可以放去水印、降噪等)"""
+    return [
         
     ]
-    
-    # 2. 配置主效果链 (风格化 + 最后归一化)
-    style_chain = [
+
+def build_style_chain():
+    """2. 配置主效果链 (风格化 + 最后归一化)"""
+    return [
         # TapeStyle(), 
         # VinylStyle(crackle_amount=0.01), 
         # RadioStyle(), 
@@ -85,17 +72,80 @@ def main():
         # Normalizer(), 
         # ConvolutionReverb()
     ]
+
+def render_to_mp3(input_path, loader, exporter, pipeline, pre_processors, main_effects,
+                  bitrate="192k", block_size=None, keep_temp_files=False):
+    """
+    单个文件的完整流程：解码 → 效果链 → MP3 编码
+    默认全程在内存中传递 float32 数组，不落盘任何中间文件；
+    keep_temp_files=True 时走调试路径，在 temp_audio/ 保留解码后和处理后的 WAV 便于检查。
+    :return: 导出的 mp3 绝对路径
+    """
+    if keep_temp_files:
+        wav_path = loader.convert_mp3_to_wav(input_path)
+        output_wav = wav_path.replace(".wav", "_final.wav")
+        pipeline.run(
+            input_path=wav_path,
+            output_path=output_wav,
+            pre_processors=pre_processors,
+            main_effects=main_effects,
+            block_size=block_size,
+        )
+        return exporter.export_to_mp3(output_wav, bitrate=bitrate)
+
+    name = Path(input_path).stem
+    if block_size is not None:
+        # 全程流式：分块解码 → 逐块处理 → 逐块编码，内存占用与音频长度无关
+        with loader.open_stream(input_path, block_size) as stream:
+            blocks = pipeline.process_blocks(stream, stream.samplerate, pre_processors, main_effects)
+            return exporter.export_blocks_to_mp3(blocks, stream.samplerate, stream.num_channels, name,
+                                                 bitrate=bitrate)
+
+    audio, samplerate = loader.load(input_path)
+    processed = pipeline.process(audio, samplerate, pre_processors=pre_processors, main_effects=main_effects)
+    return exporter.export_array_to_mp3(processed, samplerate, name, bitrate=bitrate)
+
+def render_progressive(input_path, loader, exporter, pipeline, pre_processors, main_effects,
+                       block_size=65536, segment_seconds=4.0, bitrate="192k", open_browser=True):
+    """
+    渐进式流程：分块解码 → 逐块处理 → 逐块送进同一个 ffmpeg 进程，编码为 AAC (fMP4) 的 HLS 分段，
+    第一段完成就打开播放器，不必等整首歌渲染结束
+    :return: playlist.m3u8 的绝对路径
+    """
+    with loader.open_stream(input_path, block_size) as stream:
+        blocks = pipeline.process_blocks(stream, stream.samplerate, pre_processors, main_effects)
+        return exporter.export_progressive(blocks, stream.samplerate, stream.num_channels, Path(input_path).stem,
+                                           segment_seconds=segment_seconds, bitrate=bitrate,
+                                           open_browser=open_browser)
+
+def main(keep_temp_files=False, progressive=False):
+    cleanup_directories()
+
+    # 解码缓存放在 decode_cache/，不在启动清理的范围内，同一首歌只解码一次
+    loader = AudioHandler(decode_cache=DecodeCache())
+    exporter = AudioExporter()
+    pipeline = AudioPipeline()
     
-    # 执行
-    pipeline.run(
-        input_path=wav_path,
-        output_path=output_wav,
-        pre_processors=clean_chain,
-        main_effects=style_chain
-    )
+    # mp3文件入口
+    input_file = "./testmp3/test02.mp3"
+    if not os.path.exists(input_file):
+        # 如果没有文件，生成一个静音做测试
+        from pydub import AudioSegment
+        AudioSegment.silent(duration=3000).export(input_file, format="mp3")
+
+    clean_chain = build_clean_chain()
+    style_chain = build_style_chain()
+    
+    if progressive:
+        # 渐进式：第一段渲染完就打开播放器，其余分段边渲染边追加
+        render_progressive(input_file, loader, exporter, pipeline, clean_chain, style_chain)
+        return
+
+    # Step 1~3: 解码 → 执行效果链 → 编码（内存中完成；keep_temp_files=True 时保留中间 WAV）
+    mp3_path = render_to_mp3(input_file, loader, exporter, pipeline, clean_chain, style_chain,
+                             keep_temp_files=keep_temp_files)
     
-    # Step 3: 导出播放
-    mp3_path = exporter.export_to_mp3(output_wav)
+    # Step 4: 导出播放
     # exporter.regex_browser_playback(mp3_path)
     exporter.browser_playback(mp3_path)
 
@@ -1,34 +1,160 @@
+import shutil
+from pathlib import Path
 from pedalboard.io import AudioFile
 import numpy as np  
+from effects.base import PedalboardEffect, FusedPedalboardEffect
+from effects.precision import precision, as_float
+from wav_reader import MemmapWavReader, window_frames
 
 class AudioPipeline:
-    def run(self, input_path, output_path, pre_processors=None, main_effects=None):
+    def __init__(self, fuse_pedalboards=True, cache=None, checkpoints=None, precision="float32"):
+        """
+        :param fuse_pedalboards: 是否把相邻的 Pedalboard 效果器合并成一次 Pedalboard 调用
+        :param cache: 可选的 RenderCache；相同输入 + 相同效果链参数时直接复用上次的渲染结果
+        :param checkpoints: 可选的 StageCheckpointStore；保存每一级的中间结果，
+                            调参后重新渲染时从最长的未改动前缀继续（仅整段模式）
+        :param precision: 全链路数据类型，默认 'float32'；分析用途可选 'float64'
+        """
+        self.fuse_pedalboards = fuse_pedalboards
+        self.cache = cache
+        self.checkpoints = checkpoints
+        self.precision = precision
+
+    def _build_stages(self, pre_processors, main_effects):
+        """返回 [(阶段标签, 效果器)]，按需合并相邻的 Pedalboard 效果器"""
+        stages = []
+        for label, effects in (("预处理", pre_processors), ("风格化", main_effects)):
+            if self.fuse_pedalboards:
+                effects = self._fuse_pedalboards(effects)
+            stages.extend((label, effect) for effect in effects)
+        return stages
+
+    @staticmethod
+    def _fuse_pedalboards(effects):
+        """
+        把连续的 PedalboardEffect 分成一组，嵌套进同一个 Pedalboard 一次处理。
+        带 numpy 后处理（如加噪声）的效果器只能是组内最后一个，否则后处理顺序会被打乱。
+        """
+        fused, group = [], []
+
+        def close_group():
+            if len(group) == 1:
+                fused.append(group[0])
+            elif group:
+                fused.append(FusedPedalboardEffect(group))
+            group.clear()
+
+        for effect in effects:
+            if isinstance(effect, PedalboardEffect):
+                group.append(effect)
+                if effect.has_post_process:
+                    close_group()
+            else:
+                close_group()
+                fused.append(effect)
+        close_group()
+        return fused
+
+    def run(self, input_path, output_path, pre_processors=None, main_effects=None, block_size=None,
+            profiler=None, window=None):
         """
         :param pre_processors: 清理/预处理对象列表
         :param main_effects: 风格化对象列表
+        :param block_size: 块大小（采样点数）。为 None 时整段读入处理；
+                           否则进入流式模式，按块读取→处理→写出，峰值内存与音频长度无关
+        :param profiler: 可选的 StageProfiler，记录每一级的耗时/内存/实时倍率
+        :param window: 可选的时间窗口 (开始秒, 结束秒)，结束为 None 表示到文件末尾；
+                       WAV 输入通过内存映射只读取窗口内的数据
         """
         if pre_processors is None: pre_processors = []
         if main_effects is None: main_effects = []
 
-        print(f"🚀 开始处理: {input_path}")
+        if self.cache is None:
+            return self._render(input_path, output_path, pre_processors, main_effects, block_size, profiler,
+                                window)
+
+        # 渲染缓存：键 = 输入内容哈希 + 每个效果器的类名与参数（流式模式的块大小也会影响结果）
+        cache_key = self.cache.make_key(input_path, list(pre_processors) + list(main_effects),
+                                        block_size=block_size, precision=self.precision, window=window)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            shutil.copyfile(cached, output_path)
+            print(f"⚡ 命中渲染缓存，跳过处理: {output_path}")
+            return
+
+        self._render(input_path, output_path, pre_processors, main_effects, block_size, profiler, window)
+        self.cache.put_file(cache_key, output_path)
+
+    @staticmethod
+    def _apply(index, label, effect, func, audio, samplerate, profiler=None):
+        """
+        调用一级效果器的 process / process_block；有 profiler 时由它计时。
+        输出统一转换为全局精度（已经一致时不复制），防止某一级把后续整条链提升为 float64
+        """
+        if profiler is None:
+            return as_float(func(audio, samplerate))
+        return as_float(profiler.measure(index, label, effect, func, audio, samplerate))
+
+    def _render(self, input_path, output_path, pre_processors, main_effects, block_size, profiler=None,
+                window=None):
+        if block_size is not None:
+            return self.run_streaming(input_path, output_path, pre_processors, main_effects, block_size,
+                                      profiler, window)
+        with precision(self.precision):
+            self._render_offline(input_path, output_path, pre_processors, main_effects, profiler, window)
+
+    @staticmethod
+    def _window_frames(window, samplerate, frames):
+        """把时间窗口 (开始秒, 结束秒) 换算为采样点范围 [start, stop)"""
+        if window is None:
+            return 0, frames
+        return window_frames(samplerate, frames, *window)
+
+    def _read_input(self, input_path, window=None):
+        """
+        整段模式的输入：WAV 用内存映射（浮点 WAV 不复制，整数 WAV 只转换窗口内的数据），
+        其他格式或无法映射的 WAV（如 24bit）退回 AudioFile 读取
+        :return: (audio, samplerate)
+        """
+        if Path(input_path).suffix.lower() == '.wav':
+            try:
+                reader = MemmapWavReader(input_path)
+            except ValueError:
+                pass
+            else:
+                start, stop = self._window_frames(window, reader.samplerate, reader.frames)
+                return reader.read(start, stop), reader.samplerate
 
-        # 1. 读入
         with AudioFile(input_path) as f:
-            audio = f.read(f.frames)
-            samplerate = f.samplerate
-
-        # 2. 预处理 (Pre-processing)
-        pass_count = 1
-        for effect in pre_processors:
-            print(f"   [{pass_count}] 预处理: {effect.name}")
-            audio = effect.process(audio, samplerate)
-            pass_count += 1
-
-        # 3. 主效果 (Main Effects)
-        for effect in main_effects:
-            print(f"   [{pass_count}] 风格化: {effect.name}")
-            audio = effect.process(audio, samplerate)
-            pass_count += 1
+            start, stop = self._window_frames(window, f.samplerate, f.frames)
+            f.seek(start)
+            return as_float(f.read(stop - start)), f.samplerate
+
+    def _render_offline(self, input_path, output_path, pre_processors, main_effects, profiler=None,
+                        window=None):
+        print(f"🚀 开始处理: {input_path}")
+        stages = self._build_stages(pre_processors, main_effects)
+
+        # 0. 检查点：找到最长的未改动前缀，直接内存映射它的输出
+        done, audio = 0, None
+        if self.checkpoints is not None:
+            keys = self.checkpoints.prefix_keys(input_path, [effect for _, effect in stages],
+                                                precision=self.precision, window=window)
+            done, audio = self.checkpoints.resume(keys)
+            if done:
+                audio = as_float(audio)
+                print(f"   ⏩ 从检查点恢复，跳过前 {done} 个阶段")
+
+        # 1. 读入（从检查点恢复时只读文件头拿抽样率）
+        if audio is None:
+            audio, samplerate = self._read_input(input_path, window)
+        else:
+            with AudioFile(input_path) as f:
+                samplerate = f.samplerate
+
+        # 2. 预处理 (Pre-processing) + 3. 主效果 (Main Effects)
+        audio = self._run_stages(stages, audio, samplerate, profiler, start=done,
+                                 keys=keys if self.checkpoints is not None else None, owns_input=True)
 
         # 4. 写入 (修复了单声道/立体声的声道数判断 Bug) ★★★
         # ----------------------------------------------------
@@ -43,4 +169,153 @@ class AudioPipeline:
             f.write(audio)
         # ----------------------------------------------------
 
-        print(f"✅ 完成: {output_path}")
\ No newline at end of file
+        print(f"✅ 完成: {output_path}")
+
+    def process(self, audio, samplerate, pre_processors=None, main_effects=None, block_size=None,
+                profiler=None):
+        """
+        内存接口：直接处理解码好的数组并返回结果，不经过任何临时文件
+        （渲染缓存和检查点以输入文件为键，只在 run 中生效）
+        :param audio: 输入音频，shape=(通道数, 采样点数)
+        :param samplerate: 抽样率（Hz）
+        :param block_size: 为 None 时整段处理；否则按块走流式接口（结果与 run_streaming 一致）
+        :return: 处理后的音频数组
+        """
+        if pre_processors is None: pre_processors = []
+        if main_effects is None: main_effects = []
+
+        with precision(self.precision):
+            audio = as_float(audio)
+            if block_size is None:
+                print(f"🚀 开始处理: 内存音频 {audio.shape[0]} 声道 x {audio.shape[-1]} 采样点")
+                stages = self._build_stages(pre_processors, main_effects)
+                return self._run_stages(stages, audio, samplerate, profiler)
+
+            blocks = (audio[..., i:i + block_size] for i in range(0, audio.shape[-1], block_size))
+            out = list(self.process_blocks(blocks, samplerate, pre_processors, main_effects, profiler))
+            return np.concatenate(out, axis=-1) if out else audio[..., :0]
+
+    def process_blocks(self, blocks, samplerate, pre_processors=None, main_effects=None, profiler=None):
+        """
+        流式内存接口：消费输入块的迭代器（如 AudioHandler.open_stream），逐块产出处理结果
+        输入块是边解码边产生的，所以处理在解码结束之前就已开始；空块不会产出。
+        """
+        if pre_processors is None: pre_processors = []
+        if main_effects is None: main_effects = []
+        stages = self._build_stages(pre_processors, main_effects)
+
+        print("🚀 开始流式处理")
+        for block in self._stream_stages(stages, blocks, samplerate, profiler):
+            if block.shape[-1] > 0:
+                yield block
+
+    def _run_stages(self, stages, audio, samplerate, profiler=None, start=0, keys=None, owns_input=False):
+        """
+        整段模式：依次执行 stages[start:]，有 keys 时每一级结束后保存检查点
+        两块缓冲区交替使用：每一级从 audio 读、写进 spare，然后两者互换
+        :param owns_input: 输入数组是否归流水线所有；调用方传进来的数组不能被当作缓冲区覆盖
+        """
+        input_audio = None if owns_input else audio
+        spare = None
+        for pass_count, (label, effect) in enumerate(stages[start:], start=start + 1):
+            print(f"   [{pass_count}] {label}: {effect.name}")
+            if spare is None or spare.shape != audio.shape:
+                spare = np.empty_like(audio)
+            process_into = lambda x, sr, out=spare, effect=effect: effect.process_into(x, out, sr)
+            result = self._apply(pass_count, label, effect, process_into, audio, samplerate, profiler)
+            if result is spare:
+                spare = audio if audio is not input_audio else None
+            audio = result
+            # 检查点恢复出的只读内存映射不能当作输出缓冲区
+            if spare is not None and not spare.flags.writeable:
+                spare = None
+            if keys is not None:
+                self.checkpoints.save(keys[pass_count], audio)
+        return audio
+
+    def _stream_stages(self, stages, blocks, samplerate, profiler=None):
+        """
+        流式模式：重置各级状态 → 逐块通过效果链 → 最后冲刷各级缓存，依次产出输出块
+        :param blocks: 输入块的可迭代对象，每块 shape=(通道数, 块长度)
+        精度是进程级的全局设置：只在处理每个块时切换，不跨 yield 持有，
+        调用方在两次取块之间（或放弃迭代后）看到的仍是它自己的精度
+        """
+        for pass_count, (label, effect) in enumerate(stages, start=1):
+            print(f"   [{pass_count}] {label}: {effect.name}")
+            effect.reset()
+
+        for block in blocks:
+            with precision(self.precision):
+                out = self._process_block_chain(stages, as_float(block), samplerate, profiler)
+            yield out
+
+        tails = self._flush_chain(stages, samplerate, profiler)
+        while True:
+            with precision(self.precision):
+                out = next(tails, None)
+            if out is None:
+                break
+            yield out
+
+    def run_streaming(self, input_path, output_path, pre_processors, main_effects, block_size=65536,
+                      profiler=None, window=None):
+        """
+        流式模式：AudioFile 按块读取 → 逐块通过效果链 → 处理完立即写出
+        每个效果器通过 process_block 在块之间保留自己的滤波器/振荡器状态，
+        流结束时依次调用 flush 取出各级缓存的剩余样本。
+        """
+        stages = self._build_stages(pre_processors, main_effects)
+
+        print(f"🚀 开始流式处理: {input_path} (块大小 {block_size})")
+
+        writer = None
+        try:
+            with precision(self.precision), AudioFile(input_path) as f:
+                samplerate = f.samplerate
+                start, stop = self._window_frames(window, samplerate, f.frames)
+                f.seek(start)
+                blocks = self._read_blocks(f, block_size, stop)
+                for block in self._stream_stages(stages, blocks, samplerate, profiler):
+                    writer = self._write_block(writer, output_path, samplerate, block)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        print(f"✅ 完成: {output_path}")
+
+    def _process_block_chain(self, stages, block, samplerate, profiler=None, start=0):
+        """
+        把一个块依次送过 stages[start:]；某一级暂时没有输出（缓存中）时提前返回空块
+        """
+        for index in range(start, len(stages)):
+            if block.shape[-1] == 0:
+                break
+            label, effect = stages[index]
+            block = self._apply(index + 1, label, effect, effect.process_block, block, samplerate, profiler)
+        return block
+
+    def _flush_chain(self, stages, samplerate, profiler=None):
+        """按顺序冲刷各级缓存：第 i 级吐出的剩余样本还要经过第 i+1 级之后的效果"""
+        for i, (_, effect) in enumerate(stages):
+            tail = effect.flush(samplerate)
+            if tail is not None and tail.shape[-1] > 0:
+                yield self._process_block_chain(stages, as_float(tail), samplerate, profiler, start=i + 1)
+
+    @staticmethod
+    def _read_blocks(f, block_size, stop=None):
+        """按块读取打开的 AudioFile，读到第 stop 个采样点为止"""
+        stop = f.frames if stop is None else stop
+        while f.tell() < stop:
+            yield f.read(min(block_size, stop - f.tell()))
+
+    @staticmethod
+    def _write_block(writer, output_path, samplerate, block):
+        """第一次拿到非空块时才打开输出文件（此时才知道声道数）"""
+        if block.shape[-1] == 0:
+            return writer
+        if block.ndim == 1:
+            block = block[np.newaxis, :]
+        if writer is None:
+            writer = AudioFile(output_path, 'w', samplerate, block.shape[0])
+        writer.write(block)
+        return writer
@@ -0,0 +1,142 @@
+"""
+逐阶段性能剖析：记录每个效果器的 墙钟时间 / CPU 时间 / 峰值内存 / 输入输出形状 / 实时倍率
+
+用法:
+    profiler = StageProfiler()
+    pipeline.run(..., profiler=profiler)
+    profiler.print_table()
+    profiler.to_json("profile.json")
+
+实时倍率 (realtime factor) = 处理的音频时长 / 墙钟时间，>1 表示比实时快。
+流式模式下同一阶段的所有块会累加到同一条记录里。
+"""
+import json
+import time
+import tracemalloc
+
+
+class StageProfiler:
+    def __init__(self, track_memory=True):
+        """
+        :param track_memory: 是否用 tracemalloc 统计峰值分配（numpy 的数据缓冲区也会被统计），
+                             会带来一定开销，只关心耗时时可以关掉
+        """
+        self.track_memory = track_memory
+        self.records = []
+        self._by_index = {}
+
+    def reset(self):
+        self.records = []
+        self._by_index = {}
+
+    def measure(self, index, label, effect, func, audio, samplerate):
+        """
+        执行 func(audio, samplerate) 并记录统计数据，返回 func 的结果
+        :param index: 阶段序号（流式模式下同一序号的多次调用累加）
+        """
+        started_tracing = False
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            mem_before = tracemalloc.get_traced_memory()[0]
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            result = func(audio, samplerate)
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            peak = None
+            if self.track_memory:
+                peak = max(tracemalloc.get_traced_memory()[1] - mem_before, 0)
+                if started_tracing:
+                    tracemalloc.stop()
+
+        self._record(index, label, effect, audio, result, samplerate, wall, cpu, peak)
+        return result
+
+    def _record(self, index, label, effect, audio, result, samplerate, wall, cpu, peak):
+        record = self._by_index.get(index)
+        if record is None:
+            record = {
+                "index": index,
+                "stage": label,
+                "effect": effect.name,
+                "class": type(effect).__name__,
+                "calls": 0,
+                "wall_s": 0.0,
+                "cpu_s": 0.0,
+                "peak_alloc_bytes": None,
+                "input_dtype": str(audio.dtype),
+                "input_shape": list(audio.shape),
+                "output_dtype": None,
+                "output_shape": None,
+                "audio_s": 0.0,
+                "realtime_factor": None,
+            }
+            self._by_index[index] = record
+            self.records.append(record)
+
+        record["calls"] += 1
+        record["wall_s"] += wall
+        record["cpu_s"] += cpu
+        if peak is not None:
+            record["peak_alloc_bytes"] = max(record["peak_alloc_bytes"] or 0, peak)
+        record["output_dtype"] = str(result.dtype)
+        if record["calls"] == 1:
+            record["output_shape"] = list(result.shape)
+        else:
+            # 流式模式：形状记录为累计的采样点数
+            record["input_shape"][-1] += audio.shape[-1]
+            record["output_shape"][-1] += result.shape[-1]
+        record["audio_s"] += audio.shape[-1] / samplerate
+        record["realtime_factor"] = record["audio_s"] / record["wall_s"] if record["wall_s"] > 0 else None
+
+    def summary(self):
+        """整个链路的汇总"""
+        wall = sum(r["wall_s"] for r in self.records)
+        audio_s = self.records[0]["audio_s"] if self.records else 0.0
+        return {
+            "stages": len(self.records),
+            "wall_s": wall,
+            "cpu_s": sum(r["cpu_s"] for r in self.records),
+            "audio_s": audio_s,
+            "realtime_factor": audio_s / wall if wall > 0 else None,
+            "slowest_stage": max(self.records, key=lambda r: r["wall_s"])["effect"] if self.records else None,
+        }
+
+    def to_json(self, path=None):
+        """返回 JSON 报告字符串；给出 path 时同时写入文件"""
+        text = json.dumps({"summary": self.summary(), "stages": self.records},
+                          ensure_ascii=False, indent=2)
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+    def print_table(self):
+        """在控制台打印逐阶段表格"""
+        header = f"{'#':>3}  {'效果器':<40} {'墙钟(s)':>9} {'CPU(s)':>9} {'峰值内存':>10} {'实时倍率':>9}  输入 → 输出"
+        print(header)
+        print("-" * 110)
+        for r in self.records:
+            rtf = f"{r['realtime_factor']:.1f}x" if r["realtime_factor"] else "-"
+            print(f"{r['index']:>3}  {r['effect'][:40]:<40} {r['wall_s']:>9.3f} {r['cpu_s']:>9.3f} "
+                  f"{_format_bytes(r['peak_alloc_bytes']):>10} {rtf:>9}  "
+                  f"{r['input_dtype']}{tuple(r['input_shape'])} → {r['output_dtype']}{tuple(r['output_shape'])}")
+        s = self.summary()
+        if self.records:
+            rtf = f"{s['realtime_factor']:.1f}x" if s["realtime_factor"] else "-"
+            print(f"合计 {s['wall_s']:.3f}s (CPU {s['cpu_s']:.3f}s)，实时倍率 {rtf}，最慢阶段: {s['slowest_stage']}")
+
+
+def _format_bytes(n):
+    if n is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
@@ -0,0 +1,292 @@
+"""
+渐进式分段输出：边渲染边编码成 HLS 分段，播放器拿到第一段就能开始播放
+
+整首歌只启动一个 ffmpeg 编码进程，流水线每产出一个块就写进它的标准输入，
+由 ffmpeg 的 hls 封装器按时长切段并维护播放列表：
+    playlist.m3u8   HLS 播放列表（EVENT 类型，编码结束时 ffmpeg 追加 EXT-X-ENDLIST）
+    init.mp4        fMP4 初始化段
+    segment_*.m4s   AAC 音频分段
+同一个编码器连续编码整条音频，分段之间没有编码器延迟/补零，拼接起来是无缝的。
+player.html 用单个 <audio> + MediaSource 依次追加分段（支持原生 HLS 的浏览器直接播放播放列表），
+需要通过 HTTP 访问，serve_directory() 在本机起一个只读的静态文件服务。
+"""
+import functools
+import http.server
+import subprocess
+import tempfile
+import threading
+import traceback
+from pathlib import Path
+
+from audio_exporter import AudioExporter
+
+
+def parse_playlist(text):
+    """
+    解析 ffmpeg 写出的 HLS 播放列表
+    :return: (分段列表 [{"uri", "duration"}], 是否已结束)
+    """
+    segments, duration = [], None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",")[0])
+        elif line and not line.startswith("#") and duration is not None:
+            segments.append({"uri": line, "duration": duration})
+            duration = None
+    return segments, "#EXT-X-ENDLIST" in text
+
+
+PLAYER_FILENAME = "player.html"
+
+
+def serve_directory(directory, port=0):
+    """
+    在 127.0.0.1 上以后台线程提供 directory 的静态文件服务（MediaSource 需要通过 HTTP 读取分段）
+    :param port: 端口，0 表示由系统分配
+    :return: (server, 播放器 URL)；用完后调用 server.shutdown() 和 server.server_close()
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    handler = functools.partial(_QuietHandler, directory=str(directory))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/{PLAYER_FILENAME}"
+
+
+class ProgressiveSegmentWriter:
+    # 轮询播放列表、触发 on_segment 回调的间隔（秒）
+    poll_interval = 0.2
+
+    def __init__(self, output_dir, samplerate, num_channels, segment_seconds=4.0, bitrate="192k",
+                 on_segment=None):
+        """
+        :param output_dir: 分段、播放列表和播放器页面所在的目录
+        :param segment_seconds: 每段目标时长（秒）；越短首音越快，但分段和播放列表条目越多
+        :param on_segment: 每写好一段后回调 on_segment(序号, 路径)，如第一段完成时打开浏览器
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.samplerate = samplerate
+        self.num_channels = num_channels
+        self.on_segment = on_segment
+
+        self.segments = []          # ffmpeg 已写完的分段 [{"uri", "duration"}]
+        self.complete = False
+        self.playlist_path = self.output_dir / "playlist.m3u8"
+        self.player_path = self.output_dir / PLAYER_FILENAME
+        self.player_path.write_text(PLAYER_HTML, encoding="utf-8")
+        for stale in [self.playlist_path, self.output_dir / "init.mp4", *self.output_dir.glob("segment_*.m4s")]:
+            stale.unlink(missing_ok=True)  # 上一次渲染留下的分段不能混进新的播放列表
+
+        codec_args = [
+            "-codec:a", "aac", "-b:a", bitrate,
+            "-f", "hls", "-hls_time", str(segment_seconds), "-hls_playlist_type", "event",
+            "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", "init.mp4",
+            "-hls_segment_filename", str(self.output_dir / "segment_%05d.m4s"),
+            # 分段先写临时文件再改名：播放列表里出现的分段一定是完整的
+            "-hls_flags", "temp_file",
+        ]
+        command = AudioExporter._ffmpeg_command(samplerate, num_channels, self.playlist_path, codec_args)
+        # stderr 写临时文件而不是管道，避免管道写满后 ffmpeg 阻塞
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                      stderr=self._stderr)
+
+        self._stop = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
+
+    def write(self, block):
+        """追加一个处理好的块，shape=(通道数, 块长度)，直接写进编码器（编码器跟不上时在这里等待）"""
+        if block.shape[-1] == 0:
+            return
+        try:
+            self._proc.stdin.write(AudioExporter._interleave(block))
+        except BrokenPipeError:
+            self._finish()  # ffmpeg 提前退出：非零返回码时带上它的错误输出
+            raise RuntimeError("ffmpeg 编码进程提前退出")
+
+    def close(self):
+        """输入结束：等 ffmpeg 编码完最后一段并写好 EXT-X-ENDLIST"""
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._proc.kill()
+            self._proc.wait()
+            self._stop.set()
+            self._watcher.join()
+            self._stderr.close()
+
+    def _finish(self):
+        self._proc.wait()
+        self._stop.set()
+        self._watcher.join()
+        self._stderr.seek(0)
+        error = self._stderr.read().decode(errors='replace').strip()
+        self._stderr.close()
+        if self._proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg 编码失败: {error}")
+        self._refresh()
+
+    def _watch(self):
+        """后台线程：播放列表一有新分段就更新 segments 并触发回调"""
+        while not self._stop.wait(self.poll_interval):
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            text = self.playlist_path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return
+        segments, complete = parse_playlist(text)
+        new = segments[len(self.segments):]
+        self.segments = segments
+        self.complete = complete
+        if self.on_segment is not None:
+            for offset, segment in enumerate(new):
+                index = len(segments) - len(new) + offset
+                try:
+                    self.on_segment(index, str(self.output_dir / segment["uri"]))
+                except Exception:
+                    # 回调出错只打印，不能让监视线程退出（否则之后的分段都不会再回调）
+                    print(f"⚠️  第 {index} 段的 on_segment 回调出错:")
+                    traceback.print_exc()
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """不在终端打印每个请求的访问日志；禁用缓存，播放器每次都拿到最新的播放列表"""
+    def log_message(self, format, *args):
+        pass
+
+    def end_headers(self):
+        self.send_header("Cache-Control", "no-store")
+        super().end_headers()
+
+
+# 本地播放器：单个 <audio>，MediaSource 按顺序追加分段，时间轴连续，分段之间无缝衔接；
+# 轮询播放列表，渲染期间新写好的分段自动接在后面
+PLAYER_HTML = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <title>渐进式播放</title>
+    <style>
+        body { font-family: -apple-system, "Segoe UI", Roboto, Arial, sans-serif; background: #1d1d1f; color: #fff;
+               display: flex; justify-content: center; align-items: center; min-height: 100vh; margin: 0; }
+        .card { background: rgba(255,255,255,0.08); padding: 32px 40px; border-radius: 20px; min-width: 420px; }
+        .bar { height: 6px; background: rgba(255,255,255,0.15); border-radius: 3px; margin: 16px 0; position: relative; }
+        .bar div { position: absolute; left: 0; top: 0; bottom: 0; border-radius: 3px; }
+        #rendered { background: rgba(255,255,255,0.35); }
+        #played { background: #ff7300; }
+        button { background: #ff7300; color: #fff; border: none; padding: 8px 20px; border-radius: 16px; cursor: pointer; }
+        .status { opacity: 0.6; font-size: 0.85em; }
+    </style>
+</head>
+<body>
+    <div class="card">
+        <h2>🎵 渐进式播放</h2>
+        <div class="bar"><div id="rendered"></div><div id="played"></div></div>
+        <button id="play">▶ 播放</button>
+        <p class="status" id="status">等待第一段...</p>
+    </div>
+    <audio id="player" preload="auto"></audio>
+    <script>
+        const MIME = 'audio/mp4; codecs="mp4a.40.2"';
+        const player = document.getElementById('player');
+        const status = document.getElementById('status');
+        let segments = [], complete = false, duration = 0;
+        let sourceBuffer = null, mediaSource = null, initAppended = false, appended = 0, busy = false;
+
+        function parsePlaylist(text) {
+            const found = [];
+            let extinf = null;
+            for (const raw of text.split('\\n')) {
+                const line = raw.trim();
+                if (line.startsWith('#EXTINF:')) extinf = parseFloat(line.slice(8));
+                else if (line && !line.startsWith('#') && extinf !== null) { found.push({ uri: line, duration: extinf }); extinf = null; }
+            }
+            segments = found;
+            complete = text.includes('#EXT-X-ENDLIST');
+            duration = segments.reduce((sum, s) => sum + s.duration, 0);
+        }
+
+        async function poll() {
+            try {
+                const response = await fetch('playlist.m3u8', { cache: 'no-store' });
+                if (response.ok) parsePlaylist(await response.text());
+            } catch (e) { /* 播放列表还没生成 */ }
+            document.getElementById('rendered').style.width = (complete ? 100 : 90 * duration / (duration + 8)) + '%';
+            status.textContent = complete
+                ? `渲染完成：${segments.length} 段，${duration.toFixed(1)} 秒`
+                : `渲染中：已完成 ${segments.length} 段 (${duration.toFixed(1)} 秒)`;
+            pump();
+            if (!complete) setTimeout(poll, 1000);
+        }
+
+        function append(data) {
+            return new Promise((resolve, reject) => {
+                sourceBuffer.addEventListener('updateend', resolve, { once: true });
+                sourceBuffer.addEventListener('error', reject, { once: true });
+                sourceBuffer.appendBuffer(data);
+            });
+        }
+
+        async function fetchBytes(uri) {
+            return (await fetch(uri, { cache: 'no-store' })).arrayBuffer();
+        }
+
+        // 按顺序把新分段追加进同一个 SourceBuffer；全部追加完且渲染结束时关闭媒体流
+        async function pump() {
+            if (!sourceBuffer || busy) return;
+            busy = true;
+            try {
+                if (!initAppended && segments.length) { await append(await fetchBytes('init.mp4')); initAppended = true; }
+                while (initAppended && appended < segments.length) {
+                    await append(await fetchBytes(segments[appended].uri));
+                    appended += 1;
+                }
+                if (complete && appended === segments.length && mediaSource.readyState === 'open') mediaSource.endOfStream();
+            } finally {
+                busy = false;
+            }
+        }
+
+        if (window.MediaSource && MediaSource.isTypeSupported(MIME)) {
+            mediaSource = new MediaSource();
+            mediaSource.addEventListener('sourceopen', () => {
+                sourceBuffer = mediaSource.addSourceBuffer(MIME);
+                pump();
+            });
+            player.src = URL.createObjectURL(mediaSource);
+        } else if (player.canPlayType('application/vnd.apple.mpegurl')) {
+            player.src = 'playlist.m3u8';  // 原生 HLS：浏览器自己刷新 EVENT 播放列表
+        } else {
+            status.textContent = '当前浏览器既不支持 MediaSource 也不支持 HLS';
+        }
+
+        player.addEventListener('waiting', () => { if (!complete) status.textContent = '缓冲中，等待下一段渲染...'; });
+        player.addEventListener('timeupdate', () => {
+            if (!duration) return;
+            const total = complete ? duration : duration + 8;
+            document.getElementById('played').style.width = (100 * player.currentTime / total) + '%';
+        });
+
+        document.getElementById('play').addEventListener('click', () => {
+            if (player.paused) player.play(); else player.pause();
+        });
+
+        poll();
+    </script>
+</body>
+</html>
+"""
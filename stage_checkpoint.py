@@ -0,0 +1,41 @@
+"""
+阶段级检查点：保存效果链每一级的中间结果，重新渲染时只重算改动过的后缀
+
+第 i 级的检查点键 = 输入内容哈希 + 前 i 个效果器的指纹（链式哈希），
+只改最后一个效果器的参数时，前面各级的键不变，直接从最长的未改动前缀恢复。
+中间结果以 .npy 存盘，恢复时用内存映射读取，不需要一次性载入内存。
+"""
+import numpy as np
+
+from disk_cache import DiskLRUCache, effect_fingerprint, hash_file, hash_payload
+
+
+class StageCheckpointStore(DiskLRUCache):
+    def __init__(self, cache_dir="stage_cache", max_bytes=4 * 1024 ** 3):
+        super().__init__(cache_dir, max_bytes, suffix=".npy")
+
+    @staticmethod
+    def prefix_keys(input_path, effects, **options):
+        """
+        返回 len(effects)+1 个键：keys[0] 对应原始输入，keys[i] 对应执行完前 i 个效果器后的结果
+        :param options: 影响所有阶段结果的运行选项（如全局精度）
+        """
+        keys = [hash_payload({"input": hash_file(input_path), "options": options})]
+        for effect in effects:
+            keys.append(hash_payload({"prefix": keys[-1], "effect": effect_fingerprint(effect)}))
+        return keys
+
+    def resume(self, keys):
+        """
+        找到最长的已缓存前缀
+        :return: (已完成的阶段数, 内存映射的中间结果)；没有任何检查点时返回 (0, None)
+        """
+        for done in range(len(keys) - 1, 0, -1):
+            path = self.get(keys[done])
+            if path is not None:
+                return done, np.load(path, mmap_mode='r')
+        return 0, None
+
+    def save(self, key, audio):
+        """保存一级的输出（先写临时文件再原子替换）"""
+        return self.put_array(key, audio)
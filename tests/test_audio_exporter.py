@@ -0,0 +1,70 @@
+import json
+import shutil
+
+import numpy as np
+import pytest
+from pedalboard.io import AudioFile
+
+from audio_exporter import DEFAULT_LADDER, AudioExporter
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="需要 ffmpeg")
+
+SR = 44100
+
+
+def _tone(seconds=1.0, channels=2):
+    t = np.arange(int(seconds * SR)) / SR
+    return np.stack([0.5 * np.sin(2 * np.pi * 440 * (c + 1) * t) for c in range(channels)]).astype(np.float32)
+
+
+def _read(path):
+    with AudioFile(str(path)) as f:
+        return f.read(f.frames), f.samplerate
+
+
+def test_run_ffmpeg_round_trips_float_pcm(tmp_path):
+    audio = _tone()
+    output = tmp_path / "out.wav"
+    AudioExporter._run_ffmpeg([AudioExporter._interleave(audio[:, :1000]), AudioExporter._interleave(audio[:, 1000:])],
+                              SR, 2, output, ["-codec:a", "pcm_f32le"])
+    decoded, samplerate = _read(output)
+    assert samplerate == SR
+    np.testing.assert_array_equal(decoded, audio)
+
+
+def test_run_ffmpeg_reports_encoder_errors(tmp_path):
+    with pytest.raises(RuntimeError, match="ffmpeg 编码失败"):
+        AudioExporter._run_ffmpeg([AudioExporter._interleave(_tone())], SR, 2, tmp_path / "out.mp3",
+                                  ["-codec:a", "no_such_codec"])
+
+
+def test_export_array_to_mp3_writes_mp3_and_sidecar(tmp_path):
+    audio = _tone(2.0)
+    path = AudioExporter(tmp_path).export_array_to_mp3(audio, SR, "song")
+    assert path.endswith("song_processed.mp3")
+
+    decoded, samplerate = _read(path)
+    assert samplerate == SR and decoded.shape[0] == 2
+    assert abs(decoded.shape[-1] - audio.shape[-1]) < 0.1 * SR  # MP3 编码器的首尾补零
+
+    sidecar = json.loads((tmp_path / "song_processed.peaks.json").read_text(encoding="utf-8"))
+    assert sidecar["channels"] == 2 and sidecar["samplerate"] == SR
+
+
+def test_export_ladder_encodes_every_rendition(tmp_path):
+    reports = AudioExporter(tmp_path).export_ladder(_tone(), SR, "song")
+    assert set(reports) == set(DEFAULT_LADDER)
+    for rendition, report in reports.items():
+        assert report["status"] == "ok", report
+        assert report["path"].endswith(f"song_{rendition}{DEFAULT_LADDER[rendition][0]}")
+        assert report["bytes"] > 0
+
+
+def test_export_ladder_isolates_failed_renditions(tmp_path):
+    renditions = {
+        "good": (".mp3", ["-codec:a", "libmp3lame", "-b:a", "128k"]),
+        "bad": (".mp3", ["-codec:a", "no_such_codec"]),
+    }
+    reports = AudioExporter(tmp_path).export_ladder(_tone(channels=1)[0], SR, "song", renditions)
+    assert reports["good"]["status"] == "ok"
+    assert reports["bad"]["status"] == "failed" and "RuntimeError" in reports["bad"]["error"]
@@ -0,0 +1,43 @@
+import shutil
+
+import numpy as np
+import pytest
+from pedalboard.io import AudioFile
+
+from audio_loader import AudioHandler
+
+
+def test_unknown_suffix_is_not_rejected(tmp_path):
+    path = tmp_path / "song.xyz"
+    path.write_bytes(b"not audio")
+    assert AudioHandler._check_input(path) == path
+
+
+def test_missing_file_is_rejected(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        AudioHandler._check_input(tmp_path / "missing.mp3")
+
+
+def test_undecodable_unknown_suffix_fails_when_decoding(tmp_path):
+    path = tmp_path / "song.xyz"
+    path.write_bytes(b"not audio")
+    handler = AudioHandler(temp_dir=tmp_path / "temp")
+    with pytest.raises(RuntimeError):
+        handler.load(path)
+    with pytest.raises(RuntimeError):
+        with handler.open_stream(path) as stream:
+            list(stream)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="需要 ffmpeg")
+def test_unknown_suffix_decodes_through_ffmpeg(tmp_path):
+    audio = np.sin(np.linspace(0, 200 * np.pi, 44100, dtype=np.float32)) * 0.5
+    wav = tmp_path / "tone.wav"
+    with AudioFile(str(wav), "w", 44100, 1) as f:
+        f.write(audio[np.newaxis, :])
+    path = wav.rename(tmp_path / "tone.audio")
+
+    with AudioHandler(temp_dir=tmp_path / "temp").open_stream(path) as stream:
+        decoded = np.concatenate(list(stream), axis=1)
+    assert stream.samplerate == 44100
+    np.testing.assert_allclose(decoded[0], audio, atol=1e-4)
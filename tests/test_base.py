@@ -0,0 +1,22 @@
+import numpy as np
+
+from effects.base import AudioEffect
+
+
+class _NoiseEffect(AudioEffect):
+    def __init__(self):
+        super().__init__("Noise")
+        self.generators = []
+
+    def process(self, audio, samplerate):
+        def add_noise(chan):
+            self.generators.append(getattr(self, "_rng", None))
+            return chan + self.rng.standard_normal(len(chan), dtype=np.float32)
+        return self.map_channels(add_noise, audio)
+
+
+def test_rng_exists_before_channel_workers_start():
+    effect = _NoiseEffect()
+    effect.process(np.zeros((8, 1024), dtype=np.float32), 44100)
+    assert len(effect.generators) == 8
+    assert all(generator is effect.rng for generator in effect.generators)
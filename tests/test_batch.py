@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import pytest
+
+from batch import plan_output_dirs
+
+
+def test_same_stem_in_different_directories_gets_separate_outputs(tmp_path):
+    inputs = [str(tmp_path / "a" / "song.mp3"), str(tmp_path / "b" / "song.mp3")]
+    dirs = plan_output_dirs(inputs, "out")
+    assert dirs == [Path("out") / "a", Path("out") / "b"]
+
+
+def test_common_directory_maps_to_output_root(tmp_path):
+    inputs = [str(tmp_path / "one.mp3"), str(tmp_path / "two.flac")]
+    assert plan_output_dirs(inputs, "out") == [Path("out"), Path("out")]
+
+
+@pytest.mark.parametrize("names", [("song.mp3", "song.flac"), ("Song.mp3", "song.wav")])
+def test_same_output_name_is_rejected_before_processing(tmp_path, names):
+    inputs = [str(tmp_path / name) for name in names]
+    with pytest.raises(ValueError, match="同一个输出文件"):
+        plan_output_dirs(inputs, "out")
+
+
+def test_empty_input_list():
+    assert plan_output_dirs([], "out") == []
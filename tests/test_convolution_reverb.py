@@ -0,0 +1,14 @@
+import numpy as np
+
+from effects.convolution_reverb import ConvolutionReverb
+
+
+def test_default_normalize_is_peak():
+    """默认湿信号峰值等于 mix（'energy' 需要显式选择）"""
+    reverb = ConvolutionReverb("spring", mix=0.3)
+    assert reverb.normalize == "peak"
+
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, (1, 44100)).astype(np.float32)
+    dry_mix = 1 - reverb.mix
+    wet = reverb.process(audio, 44100) - dry_mix * audio
+    np.testing.assert_allclose(np.max(np.abs(wet)), reverb.mix, rtol=1e-3)
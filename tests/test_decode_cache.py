@@ -0,0 +1,31 @@
+import numpy as np
+
+from decode_cache import DecodeCache
+
+
+def test_round_trip_is_read_only_memmap(tmp_path):
+    cache = DecodeCache(tmp_path)
+    audio = np.random.default_rng(0).uniform(-1, 1, (2, 1000)).astype(np.float32)
+    cache.save("key", audio, 48000)
+
+    loaded, samplerate = cache.load("key")
+    assert samplerate == 48000
+    assert isinstance(loaded, np.memmap) and not loaded.flags.writeable
+    np.testing.assert_array_equal(loaded, audio)
+
+
+def test_key_is_content_hash(tmp_path):
+    first, second = tmp_path / "a.mp3", tmp_path / "renamed.mp3"
+    first.write_bytes(b"same bytes")
+    second.write_bytes(b"same bytes")
+    assert DecodeCache.make_key(first) == DecodeCache.make_key(second)
+
+
+def test_miss_and_eviction_remove_metadata(tmp_path):
+    cache = DecodeCache(tmp_path, max_bytes=10 ** 9)
+    assert cache.load("missing") is None
+    cache.save("key", np.zeros((1, 1000), dtype=np.float32), 44100)
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.load("key") is None
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+from disk_cache import DiskLRUCache, effect_fingerprint, hash_payload
+from effects.pcm import PCMBitcrusherStyle
+
+
+def _age(path, seconds):
+    """把文件的使用时间 (mtime) 往前拨，不依赖文件系统的时间精度"""
+    st = path.stat()
+    os.utime(path, (st.st_atime, st.st_mtime - seconds))
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    array = np.zeros(1000, dtype=np.float32)
+    cache = DiskLRUCache(tmp_path, max_bytes=10 ** 9, suffix=".npy")
+    a = cache.put_array("a", array)
+    b = cache.put_array("b", array)
+    _age(a, 200)
+    _age(b, 100)
+    cache.max_bytes = 2 * a.stat().st_size
+
+    assert cache.get("a") == a  # 命中刷新使用时间：b 成为最久未使用的条目
+    cache.put_array("c", array)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.total_bytes() <= cache.max_bytes
+
+
+def test_put_file_replaces_existing_entry(tmp_path):
+    cache = DiskLRUCache(tmp_path / "cache", suffix=".bin")
+    src = tmp_path / "src.bin"
+    src.write_bytes(b"first")
+    cache.put_file("key", src)
+    src.write_bytes(b"second")
+    assert cache.put_file("key", src).read_bytes() == b"second"
+    assert [path.name for path, _, _ in cache.entries()] == ["key.bin"]
+
+
+def test_fingerprint_changes_with_effect_params():
+    key = hash_payload(effect_fingerprint(PCMBitcrusherStyle(4)))
+    assert key == hash_payload(effect_fingerprint(PCMBitcrusherStyle(4)))
+    assert key != hash_payload(effect_fingerprint(PCMBitcrusherStyle(8)))
@@ -0,0 +1,41 @@
+import numpy as np
+
+from effects.doppler import DopplerEffect
+
+SR = 44100
+
+
+def _tone(seconds, freq=1000.0):
+    t = np.arange(int(seconds * SR)) / SR
+    return np.sin(2 * np.pi * freq * t).astype(np.float32)[np.newaxis, :]
+
+
+def _rms(x):
+    return float(np.sqrt(np.mean(np.square(x, dtype=np.float64))))
+
+
+def test_source_is_audible_from_the_start_and_keeps_its_tail():
+    """扣除初始传播时延：开头没有静音，对称的轨迹也不丢结尾"""
+    out = DopplerEffect().process(_tone(10), SR)
+    assert out.shape == (1, 10 * SR)
+    assert _rms(out[:, :1000]) > 0.5
+    assert _rms(out[:, -1000:]) > 0.5
+
+
+def test_first_output_sample_reads_first_input_sample():
+    audio = np.zeros((1, SR), dtype=np.float32)
+    audio[0, 0] = 1.0
+    out = DopplerEffect(oversample_rate=1).process(audio, SR)
+    assert np.argmax(np.abs(out[0])) == 0
+
+
+def test_streaming_matches_offline_for_any_block_size():
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, (2, SR)).astype(np.float32)
+    effect = DopplerEffect(pass_time=0.5, closest_distance=2.0)
+    offline = effect.process(audio, SR)
+    for block_size in (7, 1000, 65536):
+        effect.reset()
+        blocks = [effect.process_block(audio[:, i:i + block_size], SR)
+                  for i in range(0, audio.shape[-1], block_size)]
+        streamed = np.concatenate(blocks + [effect.flush(SR)], axis=-1)
+        np.testing.assert_array_equal(streamed, offline)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from effects.fsk_modem import CPFSKModulator, FSKDetector, bit_lengths, complete_bits
+
+SR = 44100
+FREQ0, FREQ1 = 1000, 3000
+
+
+def _random_bits(count, seed=0):
+    return np.random.default_rng(seed).integers(0, 2, count).astype(np.int8)
+
+
+def _detect(signal, bit_rate, block_size):
+    detector = FSKDetector(FREQ0, FREQ1, SR, bit_rate)
+    decided = [detector.process(signal[i:i + block_size]) for i in range(0, len(signal), block_size)]
+    return np.concatenate(decided + [detector.flush()])
+
+
+def test_bit_lengths_keep_the_exact_bit_rate():
+    """44100/1200 = 36.75：比特长 36 或 37 个采样点，总数不漂移"""
+    lengths = bit_lengths(0, SR, SR, 1200)
+    assert set(lengths) == {36, 37}
+    assert lengths.sum() == SR
+    assert complete_bits(0, SR, SR, 1200) == 1200
+
+
+@pytest.mark.parametrize("bit_rate", [300, 600, 1200, 2400, 4800])
+@pytest.mark.parametrize("block_size", [1000, 65536])
+def test_zero_bit_errors(bit_rate, block_size):
+    bits = _random_bits(2000, seed=bit_rate)
+    lengths = bit_lengths(0, int(np.ceil(len(bits) * SR / bit_rate)), SR, bit_rate)[:len(bits)]
+    signal = CPFSKModulator(FREQ0, FREQ1, SR).modulate(bits, lengths)
+    signal += 0.001 * np.random.default_rng(1).standard_normal(len(signal)).astype(signal.dtype)
+
+    decided = _detect(signal, bit_rate, block_size)
+    assert len(decided) == len(bits)
+    assert np.count_nonzero(decided != bits.astype(bool)) == 0
+
+
+def test_modulator_phase_is_continuous_across_calls():
+    bits = _random_bits(500)
+    lengths = bit_lengths(0, int(np.ceil(500 * SR / 1200)), SR, 1200)[:500]
+    whole = CPFSKModulator(FREQ0, FREQ1, SR).modulate(bits, lengths)
+
+    modulator = CPFSKModulator(FREQ0, FREQ1, SR)
+    parts = [modulator.modulate(bits[i:i + 77], lengths[i:i + 77]) for i in range(0, 500, 77)]
+    np.testing.assert_allclose(np.concatenate(parts), whole, atol=1e-4)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+import scipy.signal
+
+from effects.partitioned_convolution import PartitionedConvolver
+
+
+def _signal(shape, seed):
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, shape).astype(np.float32)
+
+
+@pytest.mark.parametrize("ir_length, partition_size", [(1, 64), (300, 64), (5000, 512), (5000, None)])
+def test_matches_fftconvolve(ir_length, partition_size):
+    ir = _signal(ir_length, 1)
+    x = _signal((2, 20000), 2)
+    expected = scipy.signal.fftconvolve(x, ir[np.newaxis, :], axes=-1)[:, :x.shape[-1]]
+    out = PartitionedConvolver(ir, partition_size).process(x)
+    np.testing.assert_allclose(out, expected, atol=1e-4)
+
+
+def test_batched_full_blocks_match_single_call():
+    """完整块按 chunk_size 分批处理，结果与一次处理相同"""
+    ir, x = _signal(3000, 3), _signal((1, 50000), 4)
+    reference = PartitionedConvolver(ir, 256).process(x)
+    convolver = PartitionedConvolver(ir, 256)
+    convolver.chunk_size = 1000
+    np.testing.assert_allclose(convolver.process(x), reference, atol=1e-5)
+
+
+def test_streaming_with_irregular_blocks_matches_offline():
+    ir, x = _signal(3000, 5), _signal((2, 30000), 6)
+    offline = PartitionedConvolver(ir, 512).process(x)
+    convolver = PartitionedConvolver(ir, 512)
+    sizes = [1, 100, 511, 512, 513, 2000, 4096]
+    blocks, pos, i = [], 0, 0
+    while pos < x.shape[-1]:
+        size = sizes[i % len(sizes)]
+        blocks.append(convolver.process(x[:, pos:pos + size]))
+        pos, i = pos + size, i + 1
+    np.testing.assert_allclose(np.concatenate(blocks, axis=-1), offline, atol=1e-5)
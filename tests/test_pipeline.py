@@ -0,0 +1,26 @@
+import numpy as np
+
+from effects.pcm import PCMBitcrusherStyle
+from effects.precision import get_precision
+from pipeline import AudioPipeline
+
+
+def test_process_blocks_does_not_hold_precision_across_yield():
+    pipeline = AudioPipeline(precision="float64")
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, (2, 10000)).astype(np.float32)
+    blocks = (audio[:, i:i + 4096] for i in range(0, audio.shape[-1], 4096))
+
+    seen = []
+    for block in pipeline.process_blocks(blocks, 44100, main_effects=[PCMBitcrusherStyle()]):
+        assert block.dtype == np.float64
+        seen.append(get_precision())
+    assert seen and set(seen) == {"float32"}
+
+
+def test_abandoned_stream_restores_precision():
+    pipeline = AudioPipeline(precision="float64")
+    blocks = iter([np.zeros((1, 1024), dtype=np.float32)] * 3)
+    stream = pipeline.process_blocks(blocks, 44100, main_effects=[PCMBitcrusherStyle()])
+    next(stream)
+    del stream
+    assert get_precision() == "float32"
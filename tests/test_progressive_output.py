@@ -0,0 +1,76 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from progressive_output import PLAYER_FILENAME, ProgressiveSegmentWriter, parse_playlist
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="需要 ffmpeg")
+
+SR = 44100
+
+
+def _blocks(seconds, block_size=8192):
+    t = np.arange(int(seconds * SR)) / SR
+    audio = np.stack([0.3 * np.sin(2 * np.pi * 440 * t)] * 2).astype(np.float32)
+    return [audio[:, i:i + block_size] for i in range(0, audio.shape[-1], block_size)]
+
+
+def test_parse_playlist():
+    text = "\n".join([
+        "#EXTM3U", "#EXT-X-VERSION:7", '#EXT-X-MAP:URI="init.mp4"',
+        "#EXTINF:2.000000,", "segment_00000.m4s",
+        "#EXTINF:1.500000,", "segment_00001.m4s",
+    ])
+    segments, complete = parse_playlist(text)
+    assert segments == [{"uri": "segment_00000.m4s", "duration": 2.0},
+                        {"uri": "segment_00001.m4s", "duration": 1.5}]
+    assert not complete
+    assert parse_playlist(text + "\n#EXT-X-ENDLIST\n")[1]
+
+
+@requires_ffmpeg
+def test_writer_produces_complete_playlist_and_calls_back_in_order(tmp_path):
+    calls = []
+    with ProgressiveSegmentWriter(tmp_path, SR, 2, segment_seconds=1.0,
+                                  on_segment=lambda index, path: calls.append((index, path))) as writer:
+        for block in _blocks(5.0):
+            writer.write(block)
+
+    assert writer.complete
+    assert len(writer.segments) >= 4
+    assert sum(s["duration"] for s in writer.segments) == pytest.approx(5.0, abs=0.1)
+    assert [index for index, _ in calls] == list(range(len(writer.segments)))
+    for _, path in calls:
+        assert Path(path).exists()
+    assert (tmp_path / "init.mp4").exists()
+    assert (tmp_path / PLAYER_FILENAME).exists()
+
+
+@requires_ffmpeg
+def test_failing_callback_does_not_stop_the_watcher(tmp_path, capsys):
+    seen = []
+
+    def on_segment(index, path):
+        seen.append(index)
+        if index == 0:
+            raise ValueError("boom")
+
+    with ProgressiveSegmentWriter(tmp_path, SR, 2, segment_seconds=1.0, on_segment=on_segment) as writer:
+        for block in _blocks(3.0):
+            writer.write(block)
+
+    assert seen == list(range(len(writer.segments)))
+    assert "on_segment 回调出错" in capsys.readouterr().out
+    assert not writer._watcher.is_alive()
+
+
+@requires_ffmpeg
+def test_stale_segments_from_previous_render_are_removed(tmp_path):
+    (tmp_path / "segment_00099.m4s").write_bytes(b"stale")
+    with ProgressiveSegmentWriter(tmp_path, SR, 2, segment_seconds=1.0) as writer:
+        for block in _blocks(1.0):
+            writer.write(block)
+    assert not (tmp_path / "segment_00099.m4s").exists()
+    assert writer.complete
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+import scipy.signal
+
+from effects.resampling import PolyphaseResampler, design_filter, output_length, resample
+
+
+def _signal(frames, seed=0):
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, (2, frames)).astype(np.float32)
+
+
+def _reference(x, up, down, quality="default"):
+    window = design_filter(up, down, quality)
+    return scipy.signal.resample_poly(x.astype(np.float64), up, down, axis=-1, window=window)
+
+
+@pytest.mark.parametrize("up, down", [(160, 147), (147, 160), (2, 1), (1, 3)])
+def test_resample_matches_resample_poly(up, down):
+    x = _signal(10000)
+    np.testing.assert_allclose(resample(x, up, down), _reference(x, up, down), atol=1e-5)
+
+
+@pytest.mark.parametrize("up, down", [(160, 147), (147, 160), (2, 1), (1, 3)])
+@pytest.mark.parametrize("block_size", [1, 333, 4096])
+def test_streaming_matches_resample_poly(up, down, block_size):
+    x = _signal(5000 if block_size > 1 else 700)
+    resampler = PolyphaseResampler(up, down)
+    blocks = [resampler.process(x[:, i:i + block_size]) for i in range(0, x.shape[-1], block_size)]
+    tail = resampler.flush()
+    out = np.concatenate(blocks + ([tail] if tail is not None else []), axis=-1)
+    assert out.shape[-1] == output_length(x.shape[-1], up, down)
+    np.testing.assert_allclose(out, _reference(x, up, down), atol=1e-5)
+
+
+def test_one_to_one_is_passthrough():
+    x = _signal(1000)
+    resampler = PolyphaseResampler(1, 1)
+    np.testing.assert_array_equal(resampler.process(x), x)
+    assert resampler.flush() is None
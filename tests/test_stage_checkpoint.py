@@ -0,0 +1,62 @@
+import numpy as np
+from pedalboard.io import AudioFile
+
+from effects.base import AudioEffect
+from effects.normalizer import Normalizer
+from pipeline import AudioPipeline
+from stage_checkpoint import StageCheckpointStore
+
+
+class _CountingGain(AudioEffect):
+    """记录被调用的次数，用来确认恢复时跳过了已缓存的阶段"""
+    calls = 0
+
+    def __init__(self, gain=0.5):
+        super().__init__("Counting Gain")
+        self.gain = gain
+
+    def process(self, audio, samplerate):
+        type(self).calls += 1
+        return audio * self.gain
+
+
+def _write_input(path):
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, (2, 44100)).astype(np.float32)
+    with AudioFile(path, "w", 44100, 2) as f:
+        f.write(audio)
+
+
+def _read(path):
+    with AudioFile(path) as f:
+        return f.read(f.frames)
+
+
+def test_resume_from_longest_unchanged_prefix(tmp_path):
+    source = str(tmp_path / "input.wav")
+    _write_input(source)
+    store = StageCheckpointStore(tmp_path / "stages")
+    pipeline = AudioPipeline(checkpoints=store)
+    _CountingGain.calls = 0
+
+    pipeline.run(source, str(tmp_path / "first.wav"), [_CountingGain()], [Normalizer(-1.0)])
+    assert _CountingGain.calls == 1
+
+    # 只改最后一级：第一级从检查点恢复，不再执行
+    changed = [_CountingGain(), Normalizer(-6.0)]
+    keys = store.prefix_keys(source, changed, precision="float32", window=None)
+    done, audio = store.resume(keys)
+    assert done == 1
+    assert not audio.flags.writeable
+
+    pipeline.run(source, str(tmp_path / "resumed.wav"), changed[:1], changed[1:])
+    assert _CountingGain.calls == 1
+
+    fresh = AudioPipeline().process(_read(source), 44100, [_CountingGain()], [Normalizer(-6.0)])
+    np.testing.assert_allclose(_read(str(tmp_path / "resumed.wav")), fresh, atol=1e-4)  # 输出是 16bit WAV
+
+
+def test_resume_without_checkpoints(tmp_path):
+    source = str(tmp_path / "input.wav")
+    _write_input(source)
+    store = StageCheckpointStore(tmp_path / "stages")
+    assert store.resume(store.prefix_keys(source, [Normalizer()])) == (0, None)
@@ -0,0 +1,54 @@
+"""各效果器的流式接口 (reset / process_block / flush) 与整段处理的一致性（Doppler 见 test_doppler.py）"""
+import numpy as np
+import pytest
+
+from effects.convolution_reverb import ConvolutionReverb
+from effects.normalizer import Normalizer
+from effects.pcm import PCMBitcrusherStyle
+from effects.tape import TapeStyle
+
+SR = 44100
+
+
+def _signal(frames=SR, seed=0):
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, (2, frames)).astype(np.float32)
+
+
+def _stream(effect, audio, block_size):
+    effect.reset()
+    blocks = [effect.process_block(audio[:, i:i + block_size], SR) for i in range(0, audio.shape[-1], block_size)]
+    tail = effect.flush(SR)
+    if tail is not None:
+        blocks.append(tail)
+    return np.concatenate(blocks, axis=-1)
+
+
+@pytest.mark.parametrize("factory", [
+    lambda: ConvolutionReverb("spring", normalize="energy"),
+    lambda: ConvolutionReverb("old_radio", normalize="energy"),
+    lambda: PCMBitcrusherStyle(4),
+    lambda: TapeStyle(),
+], ids=["reverb-spring", "reverb-old_radio", "pcm", "tape"])
+@pytest.mark.parametrize("block_size", [1000, 4096])
+def test_streaming_matches_offline(factory, block_size):
+    audio = _signal()
+    offline = factory().process(audio, SR)
+    streamed = _stream(factory(), audio, block_size)
+    assert streamed.shape == offline.shape
+    np.testing.assert_allclose(streamed, offline, atol=1e-5)
+
+
+def test_normalizer_streaming_matches_offline_when_first_block_holds_the_peak():
+    audio = _signal()
+    audio[:, 10] = 0.9
+    np.testing.assert_allclose(_stream(Normalizer(-1.0), audio, 4096), Normalizer(-1.0).process(audio, SR),
+                               atol=1e-6)
+
+
+def test_normalizer_streaming_never_exceeds_target():
+    """流式模式用累计峰值：峰值出现在后面的块时也不会超过目标电平"""
+    audio = _signal()
+    audio[:, -10] = 0.9
+    streamed = _stream(Normalizer(-1.0), audio, 4096)
+    assert np.max(np.abs(streamed)) <= 10 ** (-1.0 / 20) + 1e-6
+
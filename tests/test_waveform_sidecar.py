@@ -0,0 +1,30 @@
+import base64
+
+import numpy as np
+
+from waveform_sidecar import compute_spectrogram
+
+
+def _decode(spectrogram):
+    data = np.frombuffer(base64.b64decode(spectrogram["data"]), dtype=np.uint8)
+    return data.reshape(spectrogram["frames"], spectrogram["bands"])
+
+
+def test_silence_maps_to_zero():
+    spectrogram = compute_spectrogram(np.zeros((2, 44100 * 3), dtype=np.float32), 44100)
+    assert not _decode(spectrogram).any()
+
+
+def test_full_scale_sine_reaches_top_of_scale():
+    t = np.arange(44100 * 3) / 44100
+    sine = np.sin(2 * np.pi * 1000 * t).astype(np.float32)
+    levels = _decode(compute_spectrogram(np.stack([sine, sine]), 44100))
+    assert levels.max() >= 245
+
+
+def test_quiet_sine_is_not_stretched_to_full_scale():
+    """固定参考：-40 dBFS 的正弦大约落在刻度中间，而不是被拉到 255"""
+    t = np.arange(44100 * 3) / 44100
+    sine = (0.01 * np.sin(2 * np.pi * 1000 * t)).astype(np.float32)
+    levels = _decode(compute_spectrogram(sine, 44100))
+    assert 110 <= levels.max() <= 140
@@ -0,0 +1,92 @@
+"""
+超长 WAV 的内存映射随机访问读取
+
+scipy.io.wavfile.read(mmap=True) 只解析文件头，样本数据以 np.memmap 的形式映射进来，
+切片时才由操作系统按页读入（常驻与否交给页缓存），
+所以从 4GB 的存档文件里取 30 秒窗口，只需要 30 秒数据的 I/O。
+
+用法:
+    reader = MemmapWavReader("archive.wav")
+    clip = reader.read_seconds(3600, 3630)      # (通道数, 采样点数) 的浮点数组
+    audio = reader.view()                       # 整段视图；32bit 浮点 WAV 不复制
+"""
+import numpy as np
+import scipy.io.wavfile
+
+from effects.precision import float_dtype
+
+
+def window_frames(samplerate, frames, start_s=0.0, end_s=None):
+    """把时间窗口 [start_s, end_s) 秒换算为采样点范围 (start, stop)，并裁剪到 [0, frames] 以内"""
+    start = min(max(int(round(start_s * samplerate)), 0), frames)
+    stop = frames if end_s is None else min(max(int(round(end_s * samplerate)), start), frames)
+    return start, stop
+
+
+class MemmapWavReader:
+    def __init__(self, path):
+        """
+        :param path: WAV 文件路径（8/16/32/64bit 整数或浮点 PCM；24bit 无法内存映射）
+        :raises ValueError: 文件格式不支持内存映射时
+        """
+        self.path = str(path)
+        try:
+            self.samplerate, data = scipy.io.wavfile.read(self.path, mmap=True)
+        except ValueError as e:
+            raise ValueError(f"无法内存映射 {self.path}: {e}")
+        if data.ndim == 1:
+            data = data[:, np.newaxis]
+        # scipy 以写时复制模式映射；标记为只读，避免下游把它当作可写缓冲区而产生整段私有副本
+        data.flags.writeable = False
+        self._data = data  # (采样点数, 通道数)，与文件中的交织布局一致
+
+    @property
+    def num_channels(self):
+        return self._data.shape[1]
+
+    @property
+    def frames(self):
+        return self._data.shape[0]
+
+    @property
+    def duration(self):
+        """时长（秒）"""
+        return self.frames / self.samplerate
+
+    @property
+    def shape(self):
+        """与流水线约定一致的 (通道数, 采样点数)"""
+        return self.num_channels, self.frames
+
+    def raw(self):
+        """原始样本的 (通道数, 采样点数) 视图（文件中的整数/浮点类型，不做任何转换）"""
+        return self._data.T
+
+    def __getitem__(self, key):
+        """按 (通道数, 采样点数) 的下标切片，返回浮点数据，如 reader[:, 1000:2000]"""
+        return self._to_float(self._data.T[key])
+
+    def read(self, start=0, stop=None):
+        """读取 [start, stop) 范围的采样点，shape=(通道数, 采样点数)"""
+        return self[:, start:stop]
+
+    def read_seconds(self, start_s=0.0, end_s=None):
+        """按时间读取 [start_s, end_s) 秒的窗口"""
+        return self.read(*window_frames(self.samplerate, self.frames, start_s, end_s))
+
+    def view(self):
+        """整段的浮点视图：浮点 WAV 且与全局精度一致时直接返回内存映射，不复制"""
+        return self[:, :]
+
+    @staticmethod
+    def _to_float(samples):
+        if samples.dtype.kind == 'f':
+            return np.asarray(samples, dtype=float_dtype())
+        # 整数 PCM 需要换算到 [-1, 1)；8bit WAV 是无符号整数，以 128 为零点
+        audio = np.array(samples, dtype=float_dtype(), order='C')
+        if samples.dtype == np.uint8:
+            audio -= 128
+            audio *= 1.0 / 128
+        else:
+            audio *= 1.0 / (1 << (8 * samples.dtype.itemsize - 1))
+        return audio
@@ -0,0 +1,143 @@
+"""
+可视化播放器的预计算数据（sidecar）：多分辨率波形峰值 + 频谱图
+
+导出时一次性算好，播放器打开页面就能直接画出整首歌的波形和频谱，不必等播放开始，
+也不必让浏览器解码整段音频；一小时的文件 sidecar 也只有几百 KB。
+
+峰值：每个像素列记录 (最小值, 最大值)，量化为 int8；最细一级之上每级合并 4 列。
+频谱图：分帧 + 批量 rFFT（一次矩阵运算完成所有帧），按对数频带取最大能量，量化为 uint8。
+二进制数据以 base64 存进 JSON，前端用 atob 还原为 TypedArray。
+"""
+import base64
+import json
+
+import numpy as np
+
+SIDECAR_VERSION = 1
+
+
+def _b64(array):
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode("ascii")
+
+
+def compute_peaks(audio, max_bins=65536, min_samples_per_pixel=256, min_bins=256):
+    """
+    多分辨率波形峰值
+    :param audio: shape=(通道数, 采样点数)
+    :param max_bins: 最细一级的最多列数（决定 sidecar 大小的上限）
+    :return: [{"samples_per_pixel", "bins", "data"}]，data 为 base64 的 int8 交织 [min0, max0, min1, max1, ...]
+    """
+    if audio.ndim == 1:
+        audio = audio[np.newaxis, :]
+    frames = audio.shape[-1]
+
+    # 每列采样点数取 2 的幂，保证上一级可以由下一级合并得到
+    spp = min_samples_per_pixel
+    while frames / spp > max_bins:
+        spp *= 2
+
+    # 完整的列直接 reshape 成视图做归约（不复制整段数据），最后一个不完整的列单独处理
+    full = frames // spp
+    mins = np.empty(full + (frames % spp > 0), dtype=np.float32)
+    maxs = np.empty_like(mins)
+    if full:
+        view = audio[:, :full * spp].reshape(audio.shape[0], full, spp)
+        mins[:full] = view.min(axis=(0, 2))
+        maxs[:full] = view.max(axis=(0, 2))
+    if frames % spp:
+        mins[full:] = audio[:, full * spp:].min()
+        maxs[full:] = audio[:, full * spp:].max()
+
+    levels = []
+    while True:
+        quantized = np.empty(2 * len(mins), dtype=np.int8)
+        quantized[0::2] = np.clip(np.round(mins * 127), -127, 127)
+        quantized[1::2] = np.clip(np.round(maxs * 127), -127, 127)
+        levels.append({"samples_per_pixel": spp, "bins": len(mins), "data": _b64(quantized)})
+        if len(mins) <= min_bins:
+            break
+        # 下一级：每 4 列合并一列
+        pad = -len(mins) % 4
+        mins = np.concatenate([mins, np.full(pad, mins[-1])]).reshape(-1, 4).min(axis=1)
+        maxs = np.concatenate([maxs, np.full(pad, maxs[-1])]).reshape(-1, 4).max(axis=1)
+        spp *= 4
+    return levels
+
+
+def compute_spectrogram(audio, samplerate, n_fft=2048, max_frames=2048, n_bands=96, min_freq=30.0,
+                        floor_db=-80.0):
+    """
+    频谱图概览：最多 max_frames 帧，每帧 n_bands 个对数频带
+    帧移随长度自动放大（长文件的每一帧只分析一个窗口，相当于均匀抽样），计算量与音频长度基本无关。
+    :return: {"n_fft", "hop", "frames", "bands", "band_edges_hz", "floor_db", "data"}，
+             data 为 base64 的 uint8，按帧优先 (frames, bands) 排列，0 对应 floor_db，255 对应 0 dBFS
+             （固定参考：满幅正弦的峰值频点功率，各声道取平均；静音画成 0，而不是相对自身最大值的满刻度）
+    """
+    if audio.ndim == 1:
+        audio = audio[np.newaxis, :]
+    length = audio.shape[-1]
+    if length < n_fft:
+        audio = np.pad(audio, ((0, 0), (0, n_fft - length)))
+        length = n_fft
+
+    hop = max(n_fft // 4, -(-(length - n_fft) // max(max_frames - 1, 1)))
+    window = np.hanning(n_fft).astype(np.float32)
+
+    # 各声道分别取帧视图（不复制整段），逐声道累加功率谱
+    power = None
+    for channel in audio:
+        frames = np.lib.stride_tricks.sliding_window_view(channel, n_fft)[::hop]
+        spectrum = np.fft.rfft(frames * window, axis=1)
+        channel_power = spectrum.real ** 2 + spectrum.imag ** 2
+        power = channel_power if power is None else power + channel_power
+
+    # 对数间隔的频带，每个频带取最大能量（低频频带窄，也至少包含一个频点）
+    nyquist = samplerate / 2
+    edges_hz = np.geomspace(min_freq, nyquist, n_bands + 1)
+    edge_bins = np.unique(np.clip(np.round(edges_hz / nyquist * (n_fft // 2)).astype(int), 1, n_fft // 2))
+    bands = np.maximum.reduceat(power, edge_bins[:-1], axis=1)
+
+    # 0 dBFS = 满幅正弦 (幅度 1) 加 Hann 窗后峰值频点的功率 (Σw/2)²
+    reference = (float(np.sum(window, dtype=np.float64)) / 2) ** 2 * len(audio)
+    db = 10 * np.log10(bands / reference + 1e-20)
+    quantized = np.round(np.clip((db - floor_db) / -floor_db, 0, 1) * 255).astype(np.uint8)
+    return {
+        "n_fft": n_fft,
+        "hop": int(hop),
+        "frames": int(quantized.shape[0]),
+        "bands": int(quantized.shape[1]),
+        "band_edges_hz": [round(float(f), 1) for f in edge_bins * nyquist / (n_fft // 2)],
+        "floor_db": floor_db,
+        "data": _b64(quantized),
+    }
+
+
+def build_sidecar(audio, samplerate):
+    """波形峰值 + 频谱图 + 基本信息"""
+    if audio.ndim == 1:
+        audio = audio[np.newaxis, :]
+    return {
+        "version": SIDECAR_VERSION,
+        "samplerate": samplerate,
+        "channels": audio.shape[0],
+        "duration": audio.shape[-1] / samplerate,
+        "peaks": compute_peaks(audio),
+        "spectrogram": compute_spectrogram(audio, samplerate),
+    }
+
+
+def sidecar_path_for(audio_path):
+    """song_processed.mp3 → song_processed.peaks.json"""
+    audio_path = str(audio_path)
+    return audio_path.rsplit(".", 1)[0] + ".peaks.json"
+
+
+def write_sidecar(path, sidecar):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(sidecar, f, separators=(",", ":"))
+    return path
+
+
+def read_sidecar(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)